@@ -0,0 +1,289 @@
+from ..validator.validator import validate_message
+from ..replayer.compression import decompress
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from collections import Counter
+import csv
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import logging
+
+CALL_ID_RX = re.compile(rb"<(?:\w+:)?CallId>\s*([^<\s]*)\s*</(?:\w+:)?CallId>")
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'normal')
+
+
+class LatencyModel():
+
+    """
+    Distribution of the time taken to respond to a message.
+    """
+
+    def __init__(self, mean=0, distribution='fixed', jitter=0):
+        """
+        mean            -   mean latency in seconds.
+        distribution    -   'fixed' always waits mean seconds,
+                            'uniform' draws from mean - jitter to mean + jitter,
+                            'exponential' draws exponentially distributed latencies,
+                            'normal' draws normally distributed latencies with a
+                            standard deviation of jitter.
+        jitter          -   spread of the uniform and normal distributions in seconds.
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError("Latency distribution must be one of " +
+                             ", ".join(LATENCY_DISTRIBUTIONS))
+        if mean < 0 or jitter < 0:
+            raise ValueError("Latency must not be negative.")
+        self.mean = mean
+        self.distribution = distribution
+        self.jitter = jitter
+
+    def sample(self, rng):
+        """
+        Returns a latency in seconds drawn with the random.Random rng. Never negative.
+        """
+        if self.distribution == 'uniform':
+            latency = rng.uniform(self.mean - self.jitter, self.mean + self.jitter)
+        elif self.distribution == 'exponential':
+            latency = rng.expovariate(1 / self.mean) if self.mean > 0 else 0
+        elif self.distribution == 'normal':
+            latency = rng.normalvariate(self.mean, self.jitter)
+        else:
+            latency = self.mean
+        return max(latency, 0)
+
+    def __str__(self):
+        return "{0} {1}s (jitter {2}s)".format(self.distribution, self.mean, self.jitter)
+
+
+class Arrival():
+
+    """
+    Record of a message received by the SdnReceiver.
+    """
+
+    __slots__ = ('timestamp_ns', 'size', 'call_id', 'status', 'version', 'errors')
+
+    FIELDS = __slots__
+
+    def __init__(self, timestamp_ns, size, call_id=None, status=None, version=None,
+                 errors=None):
+        self.timestamp_ns = timestamp_ns
+        self.size = size
+        self.call_id = call_id
+        self.status = status
+        self.version = version
+        self.errors = errors
+
+    def torow(self):
+        return [getattr(self, field) for field in Arrival.FIELDS]
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+
+    """
+    Keep-alive handler for the POSTs of the SdnMocker.
+
+    Empty POSTs, which the mocker sends when it opens, are always accepted.
+    Bodies with a gzip or deflate Content-Encoding are decompressed, and answered
+    with a 400 if they cannot be.
+    Every other message is recorded on arrival, then may be answered after the
+    configured latency with a 200, an injected 500 or 503, a 400 if it fails
+    validation, or have its connection reset without a response.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        arrived = time.time_ns()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server.receiver
+        if not body:
+            self.respond(200)
+            return
+        try:
+            body = decompress(body, self.headers.get('Content-Encoding'))
+        except ValueError:
+            self.respond(400)
+            return
+        match = CALL_ID_RX.search(body)
+        arrival = Arrival(arrived, len(body),
+                          call_id=match.group(1).decode("us-ascii", "replace") if match else None)
+        fault, latency = server.draw()
+        if latency:
+            time.sleep(latency)
+        if fault == 'reset':
+            arrival.status = 'reset'
+            server.record(arrival)
+            self.reset()
+            return
+        status = 200
+        if fault == 'error':
+            status = 500
+        elif fault == 'unavailable':
+            status = 503
+        elif server.validate:
+            arrival.version, errors = validate_message(body.strip(), server.default_version)
+            arrival.errors = len(errors)
+            if errors:
+                status = 400
+        arrival.status = status
+        server.record(arrival)
+        self.respond(status, retry_after=fault == 'unavailable')
+
+    def respond(self, status, retry_after=False):
+        self.send_response(status)
+        if retry_after:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def reset(self):
+        """
+        Closes the connection with a TCP reset rather than a graceful close.
+        """
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class SdnReceiver():
+
+    """
+    Local stand-in for a SDN receiver, which accepts the application/xml POSTs
+    of the SdnMocker on any path.
+
+    Responses are delayed by a LatencyModel, and a share of messages can be
+    failed with 500 or 503 responses or connection resets. Messages can be
+    validated against the SDN schema of their Version. The arrival time, size,
+    CallId and response of every message is recorded, and optionally written to
+    a CSV file.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=None, error_rate=0,
+                 unavailable_rate=0, reset_rate=0, validate=False, default_version=None,
+                 seed=None, record_path=None):
+        """
+        host                -   address to listen on.
+        port                -   port to listen on, 0 picks a free port.
+        latency             -   LatencyModel of the responses. Default is no latency.
+        error_rate          -   share of messages answered with 500 (0 to 1).
+        unavailable_rate    -   share of messages answered with 503 (0 to 1).
+        reset_rate          -   share of messages whose connection is reset (0 to 1).
+        validate            -   validate messages against the SDN schemas, and answer
+                                invalid messages with 400.
+        default_version     -   schema version (C or D) of messages without a Version.
+        seed                -   seed of the latencies and faults. [Optional]
+        record_path         -   path of a CSV file the arrivals are written to. [Optional]
+        """
+        for rate in (error_rate, unavailable_rate, reset_rate):
+            if not 0 <= rate <= 1:
+                raise ValueError("Fault rates must be between 0 and 1.")
+        if error_rate + unavailable_rate + reset_rate > 1:
+            raise ValueError("Fault rates must not add up to more than 1.")
+        self.latency = latency if latency is not None else LatencyModel()
+        self.error_rate = error_rate
+        self.unavailable_rate = unavailable_rate
+        self.reset_rate = reset_rate
+        self.validate = validate
+        self.default_version = default_version.upper() if default_version else None
+        self.arrivals = []
+        self.statuses = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._record_file = None
+        self._record_writer = None
+        if record_path is not None:
+            self._record_file = open(record_path, mode="w", newline="")
+            self._record_writer = csv.writer(self._record_file)
+            self._record_writer.writerow(Arrival.FIELDS)
+        self.server = ThreadingHTTPServer((host, port), ReceiverHandler)
+        self.server.daemon_threads = True
+        self.server.receiver = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{0}:{1}/SdnApiReceiver/site".format(host, port)
+
+    def draw(self):
+        """
+        Returns the fault ('error', 'unavailable', 'reset' or None) and the latency
+        in seconds for the next message.
+        """
+        with self._lock:
+            latency = self.latency.sample(self._rng)
+            draw = self._rng.random()
+        if draw < self.error_rate:
+            return 'error', latency
+        draw -= self.error_rate
+        if draw < self.unavailable_rate:
+            return 'unavailable', latency
+        draw -= self.unavailable_rate
+        if draw < self.reset_rate:
+            return 'reset', latency
+        return None, latency
+
+    def record(self, arrival):
+        with self._lock:
+            self.arrivals.append(arrival)
+            self.statuses[arrival.status] += 1
+            if self._record_writer is not None:
+                self._record_writer.writerow(arrival.torow())
+
+    def start(self):
+        """
+        Serves requests on a background thread. Returns the receiver.
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serves requests until interrupted.
+        """
+        logging.info("Sdn Receiver listening on {0}.".format(self.url))
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def stop(self):
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+    def close(self):
+        self.server.server_close()
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = self._record_writer = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exec_type, exec_value, exec_tb):
+        self.stop()
+
+    def __str__(self):
+        with self._lock:
+            count = len(self.arrivals)
+            statuses = sorted(self.statuses.items(), key=lambda x: str(x[0]))
+        template = "Sdn Receiver ::: url - {0} : latency - {1} : messages - {2}".format(
+            self.url, self.latency, count)
+        for status, status_count in statuses:
+            template += " : {0} - {1}".format(status, status_count)
+        return template
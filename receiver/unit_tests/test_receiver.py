@@ -0,0 +1,124 @@
+import csv
+import http.client
+import logging
+import os
+import random
+import tempfile
+import time
+import unittest
+from sfbtools.receiver.receiver import LatencyModel
+from sfbtools.receiver.receiver import SdnReceiver
+from sfbtools.replayer.mocker import SdnMocker
+from sfbtools.replayer.xmlmessage import SdnMessage
+from sfbtools.validator.unit_tests.test_validator import INVALID
+from sfbtools.validator.unit_tests.test_validator import VALID_TEMPLATE
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+VALID = VALID_TEMPLATE.format(' Version="C"').strip()
+
+
+class TestLatencyModel(unittest.TestCase):
+
+    def test_sample(self):
+        rng = random.Random(1)
+        self.assertEqual(0.5, LatencyModel(0.5).sample(rng))
+        samples = [LatencyModel(0.5, 'uniform', 0.1).sample(rng) for _ in range(100)]
+        self.assertTrue(all(0.4 <= sample <= 0.6 for sample in samples))
+        samples = [LatencyModel(0.01, 'normal', 1).sample(rng) for _ in range(100)]
+        self.assertEqual(0, min(samples), "Should never sample negative latencies.")
+        self.assertGreater(LatencyModel(0.5, 'exponential').sample(rng), 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            LatencyModel(1, 'pareto')
+        with self.assertRaises(ValueError):
+            LatencyModel(-1)
+
+
+class TestSdnReceiver(unittest.TestCase):
+
+    def post(self, receiver, body):
+        host, port = receiver.server.server_address[:2]
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        try:
+            conn.request('POST', "/SdnApiReceiver/site", body=body,
+                         headers={'Content-Type': 'application/xml'})
+            response = conn.getresponse()
+            response.read()
+            return response
+        finally:
+            conn.close()
+
+    def test_arrivals(self):
+        with SdnReceiver(latency=LatencyModel(0.05)) as receiver:
+            started = time.time_ns()
+            response = self.post(receiver, VALID.encode())
+            self.assertGreaterEqual(time.time_ns() - started, 50000000,
+                                    "Should respond after the latency.")
+        self.assertEqual(200, response.status)
+        arrival = receiver.arrivals[0]
+        self.assertEqual("6113bbea56224f0db8453ec87260c84e", arrival.call_id)
+        self.assertEqual(len(VALID), arrival.size)
+        self.assertLess(arrival.timestamp_ns - started, 50000000,
+                        "Should record the arrival before the latency.")
+
+    def test_faults(self):
+        with SdnReceiver(error_rate=1) as receiver:
+            self.assertEqual(500, self.post(receiver, VALID.encode()).status)
+            self.assertEqual(200, self.post(receiver, b"").status,
+                             "Should accept the empty request of an opening mocker.")
+        with SdnReceiver(unavailable_rate=1) as receiver:
+            response = self.post(receiver, VALID.encode())
+            self.assertEqual(503, response.status)
+            self.assertEqual('1', response.getheader('Retry-After'))
+        with SdnReceiver(reset_rate=1) as receiver:
+            with self.assertRaises((ConnectionError, http.client.HTTPException)):
+                self.post(receiver, VALID.encode())
+            self.assertEqual({'reset': 1}, dict(receiver.statuses))
+
+    def test_fault_rates(self):
+        with SdnReceiver(error_rate=0.2, unavailable_rate=0.3, seed=3) as receiver:
+            faults = [receiver.draw()[0] for _ in range(1000)]
+        self.assertAlmostEqual(0.2, faults.count('error') / 1000, delta=0.05)
+        self.assertAlmostEqual(0.3, faults.count('unavailable') / 1000, delta=0.05)
+        with self.assertRaises(ValueError):
+            SdnReceiver(error_rate=0.6, reset_rate=0.6)
+
+    def test_validation(self):
+        with SdnReceiver(validate=True) as receiver:
+            self.assertEqual(200, self.post(receiver, VALID.encode()).status)
+            self.assertEqual(400, self.post(receiver, INVALID.strip().encode()).status)
+        self.assertEqual(['C', 'D'], [arrival.version for arrival in receiver.arrivals])
+        self.assertEqual([0, 1], [arrival.errors for arrival in receiver.arrivals])
+
+    def test_record(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as record:
+            pass
+        try:
+            with SdnReceiver(record_path=record.name) as receiver:
+                self.post(receiver, VALID.encode())
+                self.post(receiver, VALID.encode())
+            with open(record.name, newline="") as infile:
+                rows = list(csv.reader(infile))
+            self.assertEqual(['timestamp_ns', 'size', 'call_id', 'status', 'version', 'errors'],
+                             rows[0])
+            self.assertEqual(3, len(rows))
+            self.assertEqual('200', rows[1][3])
+        finally:
+            os.remove(record.name)
+
+    def test_mocker(self):
+        with SdnReceiver(error_rate=1) as receiver:
+            mocker = SdnMocker(receiver=receiver.url, version="2.1.1")
+            mocker.open()
+            mocker.send_message(SdnMessage.fromstring(VALID))
+            mocker.close()
+        self.assertEqual(1, mocker.failures)
+        self.assertEqual({500: 1}, dict(receiver.statuses))
+        self.assertIn("messages - 1 : 500 - 1", str(receiver))
+
+
+if __name__ == '__main__':
+    unittest.main()
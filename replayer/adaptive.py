@@ -0,0 +1,232 @@
+from .scheduler import percentile
+from .scheduler import NS_PER_MILLISECOND
+from .telemetry import is_error
+from .timeline import NS_PER_SECOND
+import logging
+import threading
+
+
+class AdaptiveRate():
+
+    """
+    Finds the highest send rate a receiver sustains, by adjusting the rate of the
+    replay to the response latency of the SDN mockers (additive increase,
+    multiplicative decrease).
+
+    Messages are paced by a token bucket at the current rate. At the end of every
+    control interval the sends completed within it are checked. If any failed, or
+    their latency percentile is above the target latency, the rate is multiplied by
+    decrease. Otherwise, if the replay kept up with the rate, the rate is raised by
+    increase. The sustained maximum rate is the highest rate achieved within an
+    interval which stayed below the latency target without errors. An interval in
+    which no send completed while sends were in flight, e.g. because the receiver
+    stalled, is also a bad interval.
+
+    SQL messages are paced with the SDN messages, but their latency is not used.
+    """
+
+    # Share of the rate which must be achieved before the rate is raised
+    KEEP_UP = 0.9
+
+    def __init__(self, target_latency, rate=10, increase=10, decrease=0.5, min_rate=1,
+                 max_rate=None, interval=5, pct=95, burst=1):
+        """
+        target_latency  -   response latency percentile target in seconds.
+        rate            -   initial rate in messages per second.
+        increase        -   messages per second added to the rate after a good interval.
+        decrease        -   factor the rate is multiplied by after a bad interval.
+        min_rate        -   lowest rate in messages per second.
+        max_rate        -   highest rate in messages per second. [Optional]
+        interval        -   seconds between rate adjustments.
+        pct             -   latency percentile compared with the target, e.g. 95.
+        burst           -   capacity of the token bucket, in messages.
+        """
+        try:
+            self.target_latency = float(target_latency)
+            self.rate = float(rate)
+            self.increase = float(increase)
+            self.decrease = float(decrease)
+            self.min_rate = float(min_rate)
+            self.max_rate = float(max_rate) if max_rate is not None else None
+            self.interval = float(interval)
+            self.pct = float(pct)
+            self.burst = float(burst)
+        except (TypeError, ValueError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid adaptive rate configuration.")
+        if self.target_latency <= 0 or self.interval <= 0:
+            raise ValueError("Adaptive target latency and interval must be greater than 0.")
+        if self.min_rate <= 0 or self.rate < self.min_rate:
+            raise ValueError("Adaptive rates must be greater than 0, and at least min_rate.")
+        if self.max_rate is not None and self.max_rate < self.rate:
+            raise ValueError("Adaptive max_rate must be at least the initial rate.")
+        if not 0 < self.decrease < 1 or self.increase < 0:
+            raise ValueError("Adaptive decrease must be between 0 and 1, and increase positive.")
+        if not 0 < self.pct <= 100 or self.burst < 1:
+            raise ValueError("Adaptive percentile must be between 0 and 100, "
+                             "and burst at least 1.")
+        self.initial_rate = self.rate
+        self.windows = []
+        self._tokens = None
+        self._last = 0.0
+        self._window_start = 0.0
+        self._latencies = []
+        self._errors = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromconfig(cls, config):
+        """
+        Builds an AdaptiveRate from a dictionary of its keyword parameters.
+        Returns None if config is None.
+        """
+        if config is None:
+            return None
+        config = dict(config)
+        try:
+            target_latency = config.pop('target_latency')
+        except KeyError as e:
+            logging.error("KeyError : " + str(e))
+            raise ValueError("target_latency must be given for an adaptive rate.")
+        try:
+            return cls(target_latency, **config)
+        except TypeError as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid adaptive rate configuration.")
+
+    def start(self):
+        """
+        Fills the token bucket and resets the rate at the start of the replay.
+        """
+        self.rate = self.initial_rate
+        self.windows = []
+        self._tokens = self.burst
+        self._last = 0.0
+        self._window_start = 0.0
+        with self._lock:
+            self._latencies = []
+            self._errors = 0
+            self._in_flight = 0
+
+    def add_in_flight(self, value):
+        """
+        Adds value to the number of sends of the SDN mockers in progress. Thread-safe.
+        """
+        with self._lock:
+            self._in_flight += value
+
+    def record(self, status, latency_ns):
+        """
+        Records a completed send of a SDN mocker. Thread-safe.
+        """
+        with self._lock:
+            self._latencies.append(latency_ns)
+            if is_error(status):
+                self._errors += 1
+
+    def reserve(self, elapsed_ns):
+        """
+        Takes a token for the next message, elapsed_ns nanoseconds after the start of
+        the replay, adjusting the rate at the end of each interval. Returns the offset
+        (nanoseconds) at which the message may be sent.
+        """
+        if self._tokens is None:
+            self.start()
+        now = max(elapsed_ns / NS_PER_SECOND, self._last)
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if now - self._window_start >= self.interval:
+            self.adjust(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return int(now * NS_PER_SECOND)
+        send_time = now + (1 - self._tokens) / self.rate
+        self._tokens = 0.0
+        self._last = send_time
+        return int(send_time * NS_PER_SECOND)
+
+    def close_window(self, now):
+        """
+        Ends the current interval at now seconds, and returns its statistics.
+        """
+        with self._lock:
+            latencies, self._latencies = sorted(self._latencies), []
+            errors, self._errors = self._errors, 0
+            in_flight = self._in_flight
+        length = max(now - self._window_start, 1e-9)
+        p = percentile(latencies, self.pct)
+        window = {'start': self._window_start,
+                  'end': now,
+                  'rate': self.rate,
+                  'achieved': len(latencies) / length,
+                  'latency': p / NS_PER_SECOND if p is not None else None,
+                  'errors': errors,
+                  'in_flight': in_flight}
+        if p is None:
+            # Nothing completed, which is only healthy if nothing was being sent
+            window['healthy'] = errors == 0 and in_flight == 0
+        else:
+            window['healthy'] = errors == 0 and window['latency'] <= self.target_latency
+        self._window_start = now
+        self.windows.append(window)
+        return window
+
+    def adjust(self, now):
+        """
+        Ends the current interval at now seconds, and sets the rate of the next.
+        """
+        window = self.close_window(now)
+        if not window['healthy']:
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+        elif window['achieved'] >= self.KEEP_UP * self.rate:
+            self.rate += self.increase
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+        logging.info("Adaptive Rate ::: achieved - {0:.1f} msg/s : errors - {1} : "
+                     "next rate - {2:.1f} msg/s".format(window['achieved'], window['errors'],
+                                                        self.rate))
+
+    def finish(self, elapsed_ns):
+        """
+        Ends the last, partial, interval at the end of the replay, if anything was
+        sent within it.
+        """
+        with self._lock:
+            pending = bool(self._latencies)
+        if pending:
+            self.close_window(max(elapsed_ns / NS_PER_SECOND, self._window_start))
+
+    def sustained_max(self):
+        """
+        Returns the highest rate achieved within a whole interval which stayed below
+        the latency target without errors, or None.
+        """
+        rates = [window['achieved'] for window in self.windows
+                 if window['healthy'] and window['end'] - window['start'] >= self.interval]
+        return max(rates) if rates else None
+
+    def report(self):
+        """
+        Returns a readable table of the intervals of the replay and the sustained
+        maximum rate.
+        """
+        lines = ["Adaptive Rate ::: {0}".format(self)]
+        for window in self.windows:
+            latency = "-" if window['latency'] is None else \
+                "{0:.1f}ms".format(window['latency'] * NS_PER_SECOND / NS_PER_MILLISECOND)
+            lines.append("    {0:>7.1f}s - {1:.1f}s : rate - {2:.1f} msg/s : "
+                         "achieved - {3:.1f} msg/s : p{4:g} - {5} : errors - {6}{7}".format(
+                             window['start'], window['end'], window['rate'],
+                             window['achieved'], self.pct, latency, window['errors'],
+                             "" if window['healthy'] else " : backed off"))
+        sustained = self.sustained_max()
+        lines.append("Sustained maximum rate ::: " +
+                     ("{0:.1f} msg/s".format(sustained) if sustained is not None else
+                      "not found, no whole interval met the latency target"))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return "target p{0:g} - {1:g}ms : start - {2:g} msg/s : +{3:g} / x{4:g} : " \
+            "interval - {5:g}s".format(self.pct, self.target_latency * 1000, self.initial_rate,
+                                       self.increase, self.decrease, self.interval)
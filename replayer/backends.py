@@ -0,0 +1,148 @@
+import abc
+import importlib
+import logging
+
+
+class DatabaseBackend(metaclass=abc.ABCMeta):
+
+    """
+    Connects the OdbcMocker to a database through a DB-API 2.0 module.
+
+    Queries are passed to the module unchanged, so their parameter markers must
+    match the paramstyle of the module (pyodbc and sqlite3 both use '?').
+    """
+
+    name = None
+    # Keys which must be in the ODBC configuration
+    REQUIRED = ()
+
+    def __init__(self, config, module=None):
+        """
+        config  -   ODBC configuration dictionary.
+        module  -   name of the DB-API module. Defaults to the backend name.
+        """
+        missing = [key for key in self.REQUIRED if key not in config]
+        if missing:
+            logging.error("KeyError : " + ", ".join(missing))
+            raise ValueError("{0} must be given as keyword parameters for the {1} "
+                             "backend.".format(", ".join(self.REQUIRED), self.name))
+        self.config = config
+        self.module = self.load_module(module or self.name)
+        self.errors = (self.module.Error,)
+
+    @staticmethod
+    def load_module(module_name):
+        """
+        Imports the DB-API module, which is only required by the backends that use it.
+        Raises ValueError if it is not installed.
+        """
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            logging.error("ImportError : " + str(e))
+            raise ValueError("Database module {0} is not installed.".format(module_name))
+        if not hasattr(module, 'connect') or not hasattr(module, 'Error'):
+            raise ValueError("{0} is not a DB-API 2.0 module.".format(module_name))
+        return module
+
+    @abc.abstractmethod
+    def connect(self):
+        """Returns a new connection to the configured database."""
+
+    def cursor(self, connection):
+        return connection.cursor()
+
+    def is_retryable(self, error):
+        """
+        Returns True if the database error is transient and the transaction should
+        be retried. Operational errors, which include deadlocks, timeouts and lost
+        connections, are retried.
+        """
+        return isinstance(error, getattr(self.module, 'OperationalError', ()))
+
+    def __str__(self):
+        return self.name
+
+
+class PyodbcBackend(DatabaseBackend):
+
+    """
+    Connects through an ODBC driver with pyodbc, e.g. to SQL Server.
+    """
+
+    name = "pyodbc"
+    REQUIRED = ('driver', 'database', 'uid', 'pwd')
+
+    def connect(self):
+        return self.module.connect(driver=self.config['driver'],
+                                   server=self.config.get('server'),
+                                   database=self.config['database'],
+                                   uid=self.config['uid'],
+                                   pwd=self.config['pwd'])
+
+    def cursor(self, connection):
+        cursor = connection.cursor()
+        if self.config.get('fast_executemany'):
+            cursor.fast_executemany = True
+        return cursor
+
+    def is_retryable(self, error):
+        # pyodbc raises OperationalError for timeouts and lost connections
+        return type(error).__name__ == 'OperationalError'
+
+
+class Sqlite3Backend(DatabaseBackend):
+
+    """
+    Connects to a sqlite3 database file, or an in-memory database by default.
+    """
+
+    name = "sqlite3"
+
+    def connect(self):
+        # The async engine sends from worker threads
+        return self.module.connect(self.config.get('database') or ':memory:',
+                                   check_same_thread=False)
+
+    def is_retryable(self, error):
+        # sqlite3 also raises OperationalError for invalid SQL
+        message = str(error).lower()
+        return isinstance(error, self.module.OperationalError) and \
+            ('locked' in message or 'busy' in message)
+
+
+class DbApiBackend(DatabaseBackend):
+
+    """
+    Connects with any DB-API 2.0 module, given by its module name as the backend.
+    The connection is made with module.connect(dsn, **connect_args), where dsn
+    is left out if not configured.
+    """
+
+    def __init__(self, config, module=None):
+        self.name = module
+        super().__init__(config, module)
+        if getattr(self.module, 'paramstyle', 'qmark') != 'qmark':
+            logging.warning("{0} uses the {1} paramstyle, parameterised queries must use "
+                            "its markers.".format(self.name, self.module.paramstyle))
+
+    def connect(self):
+        args = (self.config['dsn'],) if self.config.get('dsn') is not None else ()
+        return self.module.connect(*args, **self.config.get('connect_args', {}))
+
+
+BACKENDS = {PyodbcBackend.name: PyodbcBackend,
+            Sqlite3Backend.name: Sqlite3Backend}
+
+
+def get_backend(config):
+    """
+    Returns the DatabaseBackend selected by the 'backend' key of an ODBC configuration.
+    Defaults to pyodbc. Other module names are used as generic DB-API 2.0 backends.
+    Raises ValueError if the backend cannot be loaded.
+    """
+    name = config.get('backend') or PyodbcBackend.name
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        return DbApiBackend(config, module=name)
+    return backend_class(config)
@@ -0,0 +1,295 @@
+from .replayer import SfbReplayer
+from lxml import etree as ET
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+import contextlib
+import glob
+import json
+import logging
+import os
+import time
+
+
+def find_scenarios(patterns):
+    """
+    Returns the sorted paths of the scenario files matching a list of patterns.
+    A directory matches every .xml file in it, other patterns are globs.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, "*.xml")))
+        else:
+            paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def load_scenario_options(path, options):
+    """
+    Returns the replay options of a scenario. Options in a JSON file beside the
+    scenario, with the same name and a .json extension, override the given options.
+    """
+    options = dict(options)
+    options_path = os.path.splitext(path)[0] + ".json"
+    if os.path.isfile(options_path):
+        with open(options_path, mode="r") as options_file:
+            overrides = json.load(options_file)
+        if not isinstance(overrides, dict):
+            raise ValueError("Invalid scenario options file : " + options_path)
+        options.update(overrides)
+    return options
+
+
+def get_targets(options):
+    """
+    Returns the set of receivers and databases a scenario sends to.
+    """
+    targets = set()
+    for sdn_config in SfbReplayer.get_configs(options.get('sdn_config')):
+        targets.add(('sdn', sdn_config.get('receiver')))
+    for odbc_config in SfbReplayer.get_configs(options.get('odbc_config')):
+        targets.add(('odbc', odbc_config.get('driver'), odbc_config.get('server'),
+                     odbc_config.get('database')))
+    return targets
+
+
+def run_scenario(path, options, engine='sync', log_path=None):
+    """
+    Replays a single scenario and returns its ScenarioResult.
+    The replay output is written to log_path, or discarded if log_path is None.
+    """
+    result = ScenarioResult(path)
+    started = time.monotonic()
+    log_path = log_path or os.devnull
+    try:
+        with open(log_path, mode="w") as log, contextlib.redirect_stdout(log):
+            replayer = SfbReplayer.fromfile(path, **options)
+            if engine == 'async':
+                replayer.run_async()
+            else:
+                replayer.run()
+        stats = replayer.get_stats()
+        result.sent = stats['sent']
+        result.failures = stats['failures']
+        result.scheduled = stats['scheduled']
+        result.delivered = stats['delivered']
+        result.jitter = stats['jitter']
+        result.status = 'passed'
+        if stats['unopened']:
+            result.status = 'failed'
+            result.error = "{0} mocker(s) failed to open".format(stats['unopened'])
+        elif result.failures or result.delivered < result.scheduled:
+            result.status = 'failed'
+    except Exception as e:
+        logging.error("{0} raised : {1}".format(e.__class__.__name__, str(e)))
+        result.status = 'error'
+        result.error = "{0} : {1}".format(e.__class__.__name__, str(e))
+    result.duration = time.monotonic() - started
+    return result
+
+
+class ScenarioResult():
+
+    """
+    Outcome of replaying one scenario of a batch.
+
+    status is 'passed', 'failed' if any mocker failed to open or any message was
+    not delivered, or 'error' if the scenario could not be replayed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.status = None
+        self.duration = 0
+        self.sent = 0
+        self.failures = 0
+        self.scheduled = 0
+        self.delivered = 0
+        self.jitter = None
+        self.error = None
+
+    @classmethod
+    def fromerror(cls, path, error):
+        """
+        Returns the result of a scenario which could not be replayed because of error.
+        """
+        result = cls(path)
+        result.status = 'error'
+        result.error = "{0} : {1}".format(error.__class__.__name__, str(error))
+        return result
+
+    def todict(self):
+        return {'scenario': self.path,
+                'status': self.status,
+                'duration': self.duration,
+                'sent': self.sent,
+                'failures': self.failures,
+                'scheduled': self.scheduled,
+                'delivered': self.delivered,
+                'jitter': self.jitter,
+                'error': self.error}
+
+    def __str__(self):
+        template = "{0} ::: {1} : {2:.3f}s : sent - {3} : delivered - {4}/{5} : " \
+            "failures - {6}".format(self.path, self.status.upper(), self.duration, self.sent,
+                                    self.delivered, self.scheduled, self.failures)
+        if self.jitter and self.jitter['count']:
+            template += " : p99 - {0:.3f}ms".format(self.jitter['p99'])
+        if self.error is not None:
+            template += " : " + self.error
+        return template
+
+
+class BatchReport():
+
+    """
+    Aggregated results of a batch of scenarios, in the order they were given.
+    """
+
+    def __init__(self, results, duration=0):
+        self.results = results
+        self.duration = duration
+
+    def count(self, status):
+        return sum(1 for result in self.results if result.status == status)
+
+    @property
+    def passed(self):
+        return self.count('passed') == len(self.results)
+
+    def todict(self):
+        return {'scenarios': len(self.results),
+                'passed': self.count('passed'),
+                'failed': self.count('failed'),
+                'errors': self.count('error'),
+                'duration': self.duration,
+                'sent': sum(result.sent for result in self.results),
+                'failures': sum(result.failures for result in self.results),
+                'results': [result.todict() for result in self.results]}
+
+    def write_json(self, path):
+        with open(path, mode="w") as outfile:
+            json.dump(self.todict(), outfile, indent=2)
+
+    def tojunit(self):
+        """
+        Returns the report as a JUnit XML testsuite element, with a testcase per scenario.
+        """
+        suite = ET.Element("testsuite", name="sfbreplay",
+                           tests=str(len(self.results)),
+                           failures=str(self.count('failed')),
+                           errors=str(self.count('error')),
+                           time="{0:.3f}".format(self.duration))
+        for result in self.results:
+            case = ET.SubElement(suite, "testcase", classname="sfbreplay",
+                                 name=result.path, time="{0:.3f}".format(result.duration))
+            if result.status == 'failed':
+                message = result.error or "{0} of {1} messages undelivered".format(
+                    result.scheduled - result.delivered, result.scheduled)
+                ET.SubElement(case, "failure", message=message).text = str(result)
+            elif result.status == 'error':
+                ET.SubElement(case, "error", message=result.error).text = str(result)
+            ET.SubElement(case, "system-out").text = json.dumps(result.todict())
+        return suite
+
+    def write_junit(self, path):
+        ET.ElementTree(self.tojunit()).write(path, encoding="utf-8", xml_declaration=True,
+                                             pretty_print=True)
+
+    def __str__(self):
+        lines = [str(result) for result in self.results]
+        summary = self.todict()
+        lines.append("Batch Summary ::: scenarios - {scenarios} : passed - {passed} : "
+                     "failed - {failed} : errors - {errors} : sent - {sent} : "
+                     "failures - {failures} : {duration:.3f}s".format(**summary))
+        return '\n'.join(lines)
+
+
+class BatchRunner():
+
+    """
+    Replays a batch of scenarios in a bounded pool of worker processes.
+
+    With serialise_targets, scenarios which send to the same SDN receiver or
+    database are never replayed at the same time, while scenarios with other
+    targets still run in parallel.
+    """
+
+    def __init__(self, jobs=None, engine='sync', serialise_targets=False, log_dir=None):
+        """
+        jobs                -   Number of scenarios replayed at once. Defaults to the
+                                number of CPUs.
+        engine              -   Replay engine, 'sync' or 'async'.
+        serialise_targets   -   Replay scenarios with a common target one at a time.
+        log_dir             -   Directory the output of each replay is written to.
+                                Output is discarded if not given. [Optional]
+        """
+        self.jobs = jobs or os.cpu_count() or 1
+        if self.jobs < 1:
+            raise ValueError("Number of jobs must be at least 1.")
+        self.engine = engine
+        self.serialise_targets = serialise_targets
+        self.log_dir = log_dir
+
+    def get_log_path(self, index, path):
+        if self.log_dir is None:
+            return None
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.log_dir, "{0:04d}_{1}.log".format(index, name))
+
+    def run(self, paths, **options):
+        """
+        Replays every scenario with the given SfbReplayer keyword options, and
+        returns a BatchReport.
+        """
+        started = time.monotonic()
+        if self.log_dir is not None:
+            os.makedirs(self.log_dir, exist_ok=True)
+        results = [None] * len(paths)
+        # Queue of (index, path, options, targets) waiting to be replayed
+        pending = []
+        for index, path in enumerate(paths):
+            try:
+                scenario_options = load_scenario_options(path, options)
+            except (OSError, ValueError) as e:
+                results[index] = ScenarioResult.fromerror(path, e)
+                continue
+            targets = get_targets(scenario_options) if self.serialise_targets else set()
+            pending.append((index, path, scenario_options, targets))
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            running = {}
+            busy = set()
+            while pending or running:
+                # Start the first waiting scenarios whose targets are free
+                for entry in list(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    index, path, scenario_options, targets = entry
+                    if targets & busy:
+                        continue
+                    pending.remove(entry)
+                    try:
+                        future = pool.submit(run_scenario, path, scenario_options, self.engine,
+                                             self.get_log_path(index, path))
+                    except Exception as e:
+                        # The pool is broken once a worker process has crashed
+                        results[index] = ScenarioResult.fromerror(path, e)
+                        continue
+                    busy.update(targets)
+                    running[future] = entry
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, path, _, targets = running.pop(future)
+                    busy.difference_update(targets)
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        # BrokenProcessPool if a worker process crashed
+                        logging.error("{0} raised : {1}".format(e.__class__.__name__, str(e)))
+                        results[index] = ScenarioResult.fromerror(path, e)
+                    logging.info(str(results[index]))
+        return BatchReport(results, duration=time.monotonic() - started)
@@ -0,0 +1,102 @@
+import gzip
+import logging
+import threading
+import zlib
+
+COMPRESSION_ENCODINGS = ('gzip', 'deflate')
+
+
+class PayloadCompressor():
+
+    """
+    Compresses request bodies for a Content-Encoding of gzip or deflate.
+
+    Every body is compressed as it is sent. Bodies are not cached, as the
+    timestamps and ids of replayed messages are rewritten for every send.
+    Thread-safe.
+    """
+
+    def __init__(self, encoding='gzip', threshold=1024, level=6):
+        """
+        encoding    -   'gzip' or 'deflate' (zlib format, as HTTP defines it).
+        threshold   -   bodies smaller than this number of bytes are sent uncompressed.
+        level       -   compression level, 1 (fastest) to 9 (smallest).
+        """
+        if encoding not in COMPRESSION_ENCODINGS:
+            raise ValueError("Compression must be one of " + ", ".join(COMPRESSION_ENCODINGS))
+        try:
+            self.threshold = int(threshold)
+            self.level = int(level)
+        except (TypeError, ValueError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid compression configuration.")
+        if not 1 <= self.level <= 9:
+            raise ValueError("Compression level must be between 1 and 9.")
+        self.encoding = encoding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromconfig(cls, config):
+        """
+        Builds a PayloadCompressor from a SDN mocker configuration dictionary.
+        Returns None if compression is not configured.
+
+        Supported keys :
+        compression             -   'gzip' or 'deflate'. Default is no compression.
+        compression_threshold   -   Minimum body size compressed in bytes. Default 1024.
+        compression_level       -   Compression level from 1 to 9. Default 6.
+        """
+        encoding = config.get('compression')
+        if not encoding:
+            return None
+        return cls(encoding,
+                   threshold=config.get('compression_threshold', 1024),
+                   level=config.get('compression_level', 6))
+
+    def compress(self, data):
+        """
+        Returns the compressed data, or None if data is below the threshold.
+        """
+        if len(data) < self.threshold:
+            return None
+        if self.encoding == 'gzip':
+            # A fixed mtime keeps the output identical for identical bodies
+            compressed = gzip.compress(data, compresslevel=self.level, mtime=0)
+        else:
+            compressed = zlib.compress(data, self.level)
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return compressed
+
+    def ratio(self):
+        """
+        Returns the compressed size as a share of the uncompressed size, or None if
+        nothing was compressed.
+        """
+        return self.bytes_out / self.bytes_in if self.bytes_in else None
+
+    def __str__(self):
+        return "{0} (level {1}, threshold {2} bytes)".format(self.encoding, self.level,
+                                                             self.threshold)
+
+
+def decompress(data, encoding):
+    """
+    Returns the data decoded from the given Content-Encoding.
+    Raises ValueError for unsupported encodings or corrupt data.
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    try:
+        if encoding == 'identity':
+            return data
+        if encoding == 'gzip':
+            return gzip.decompress(data)
+        if encoding == 'deflate':
+            return zlib.decompress(data)
+    except (OSError, EOFError, zlib.error) as e:
+        logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+        raise ValueError("Corrupt {0} body.".format(encoding))
+    raise ValueError("Unsupported Content-Encoding : " + encoding)
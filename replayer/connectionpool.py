@@ -0,0 +1,200 @@
+import http.client
+import logging
+import queue
+import socket
+import ssl
+import threading
+from urllib.error import HTTPError
+from urllib.error import URLError
+from urllib.parse import urlsplit
+
+# Errors raised when a pooled keep-alive connection was closed by the server
+# while it was idle. The request is retried once on a fresh connection.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+                           http.client.BadStatusLine,
+                           ConnectionResetError,
+                           ConnectionAbortedError,
+                           BrokenPipeError)
+
+
+class TLSSessionCache():
+
+    """
+    Holds the most recent TLS session to a receiver so new connections can resume it
+    instead of performing a full handshake.
+    """
+
+    def __init__(self):
+        self.session = None
+
+
+class ResumableHTTPSConnection(http.client.HTTPSConnection):
+
+    """
+    HTTPSConnection which resumes the TLS session held in a shared TLSSessionCache.
+    """
+
+    def __init__(self, host, port=None, session_cache=None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self._session_cache = session_cache if session_cache is not None else TLSSessionCache()
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host if self._tunnel_host else self.host
+        session = self._session_cache.session
+        try:
+            self.sock = self._context.wrap_socket(self.sock,
+                                                  server_hostname=server_hostname,
+                                                  session=session)
+        except ValueError:
+            # Session does not belong to this context, fall back to a full handshake
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)
+        if session is not None and self.sock.session_reused:
+            logging.debug("Resumed TLS session with {0}.".format(self.host))
+
+    def remember_session(self):
+        """
+        Stores the current TLS session for the next connection. TLS 1.3 servers send
+        their session tickets after the handshake, so this is called after a response.
+        """
+        if self.sock is not None and self.sock.session is not None:
+            self._session_cache.session = self.sock.session
+
+
+class HTTPConnectionPool():
+
+    """
+    Pool of persistent (keep-alive) HTTP or HTTPS connections to a single URL.
+
+    Connections are reused for consecutive requests and TLS sessions are resumed
+    when new connections are made. A request on a pooled connection that the
+    server closed while idle is retried transparently on a fresh connection.
+    Thread-safe, at most `size` requests are in progress at the same time.
+    """
+
+    def __init__(self, url, size=1, timeout=None, context=None):
+        """
+        url     -   Target http or https URL.
+        size    -   Maximum number of open connections.
+        timeout -   Socket timeout in seconds. [Optional]
+        context -   ssl.SSLContext used for https connections. [Optional]
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError("Receiver must be an http or https URL.")
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.size = size
+        self.timeout = timeout
+        self._context = context
+        if self.scheme == 'https' and self._context is None:
+            self._context = ssl.create_default_context()
+        self._session_cache = TLSSessionCache()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.connections_made = 0
+
+    def _new_connection(self):
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        with self._lock:
+            self.connections_made += 1
+        if self.scheme == 'https':
+            return ResumableHTTPSConnection(self.host, self.port,
+                                            session_cache=self._session_cache,
+                                            context=self._context, **kwargs)
+        return http.client.HTTPConnection(self.host, self.port, **kwargs)
+
+    def _get_connection(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, conn):
+        if isinstance(conn, ResumableHTTPSConnection):
+            conn.remember_session()
+        self._idle.put(conn)
+
+    def request(self, method, body=None, headers=None, timeout=None):
+        """
+        Sends a request to the pool URL and reads the whole response.
+        Returns a tuple (status, reason, response headers, response body).
+
+        timeout -   Socket timeout in seconds of this request, instead of the pool
+                    timeout. [Optional]
+        Raises URLError if the receiver cannot be reached.
+        """
+        self._slots.acquire()
+        try:
+            conn, reused = self._get_connection()
+            try:
+                response = self._send(conn, method, body, headers, timeout)
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                logging.debug("Stale connection to {0}, reconnecting.".format(self.url))
+                conn = self._new_connection()
+                response = self._send(conn, method, body, headers, timeout)
+            self._release(conn)
+            return response
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise URLError(e)
+        finally:
+            self._slots.release()
+
+    def _send(self, conn, method, body, headers, timeout=None):
+        if timeout is not None:
+            self._set_timeout(conn, timeout)
+        try:
+            conn.request(method, self.path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return (response.status, response.reason, response.headers, response.read())
+        finally:
+            if timeout is not None:
+                self._set_timeout(conn, self.timeout)
+
+    @staticmethod
+    def _set_timeout(conn, timeout):
+        # The timeout of a connection applies when it connects, and to its socket after
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def post(self, data, headers=None):
+        """
+        POSTs data to the pool URL.
+        Returns the response status.
+
+        Raises HTTPError for error responses and URLError if the receiver cannot be reached.
+        """
+        status, reason, response_headers, _ = self.request('POST', data, headers)
+        if status >= 400:
+            raise HTTPError(self.url, status, reason, response_headers, None)
+        return status
+
+    def close(self):
+        """
+        Closes every idle connection in the pool.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __str__(self):
+        return "HTTPConnectionPool ::: url - {0} : size - {1}".format(self.url, self.size)
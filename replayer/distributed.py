@@ -0,0 +1,473 @@
+from .replayer import SfbReplayer
+from .backends import PyodbcBackend
+from .scheduler import percentile
+from .scheduler import NS_PER_MILLISECOND
+from array import array
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import struct
+import time
+
+# Every frame is the length of a JSON header and of a binary payload, followed by both
+FRAME_LENGTHS = struct.Struct("!II")
+PROTOCOL_VERSION = 1
+
+# Seconds between all workers being ready and the shared start of the replay
+DEFAULT_START_DELAY = 1
+
+# SfbReplayer keyword parameters a worker accepts from a coordinator. Options which
+# name files or modules on the worker (e.g. telemetry, dead_letter, validation_cache)
+# are never accepted from the network.
+WORKER_OPTIONS = ('sdn_config', 'odbc_config', 'validate', 'speed', 'max_rate', 'load_shape',
+                  'load_burst', 'load_interval', 'incremental_validation', 'clones', 'arrival',
+                  'arrival_interval', 'seed', 'loop', 'duration', 'stats_interval')
+
+# pyodbc connection keywords, which are joined into an ODBC connection string
+ODBC_CONNECTION_KEYS = ('driver', 'server', 'database', 'uid', 'pwd')
+# Suffixes of driver libraries, which unixODBC loads when given as the driver
+DRIVER_LIBRARY_SUFFIXES = ('.so', '.dll', '.dylib')
+
+# Environment variable holding the token shared by a coordinator and its workers
+TOKEN_ENVIRONMENT_VARIABLE = "SFB_WORKER_TOKEN"
+
+
+def parse_address(address):
+    """
+    Returns the socket family and address of a worker address, which is either
+    'host:port' for TCP or 'unix:path' for a Unix socket.
+    Raises ValueError for invalid addresses.
+    """
+    if address.startswith("unix:"):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix sockets are not supported on this platform.")
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError("Invalid worker address : " + address)
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def is_loopback(address):
+    """
+    Returns True if a worker address is a Unix socket or a TCP address on localhost.
+    """
+    family, sockaddr = parse_address(address)
+    return family != socket.AF_INET or sockaddr[0] in ("127.0.0.1", "localhost")
+
+
+def get_token():
+    """
+    Returns the worker token from the environment, or None if it is not set.
+    """
+    return os.environ.get(TOKEN_ENVIRONMENT_VARIABLE) or None
+
+
+def check_token(header, token):
+    """
+    Returns True if token is None, or the frame header carries the same token.
+    """
+    if token is None:
+        return True
+    return hmac.compare_digest(str(header.get('token', '')).encode("utf-8"),
+                               token.encode("utf-8"))
+
+
+def check_driver(driver):
+    """
+    Raises ValueError unless an ODBC driver is given by the name it is installed
+    under, e.g. 'ODBC Driver 17 for SQL Server', rather than the path of a library.
+    """
+    if not isinstance(driver, str) or '/' in driver or '\\' in driver or \
+            driver.strip('{} ').lower().endswith(DRIVER_LIBRARY_SUFFIXES):
+        raise ValueError("ODBC drivers must be given by name with workers.")
+
+
+def send_frame(sock, header, payload=b""):
+    """
+    Sends a dictionary header and a bytes payload as a single frame.
+    """
+    header_bytes = json.dumps(header).encode("utf-8")
+    sock.sendall(FRAME_LENGTHS.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exactly(sock, length):
+    chunks = []
+    while length:
+        chunk = sock.recv(min(length, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed mid frame.")
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """
+    Returns the (header, payload) of the next frame.
+    Raises ConnectionError if the connection is closed.
+    """
+    header_length, payload_length = FRAME_LENGTHS.unpack(
+        _recv_exactly(sock, FRAME_LENGTHS.size))
+    header = json.loads(_recv_exactly(sock, header_length).decode("utf-8"))
+    return header, _recv_exactly(sock, payload_length)
+
+
+def get_worker_options(options):
+    """
+    Returns the replay options of a job as SfbReplayer keyword parameters.
+    Raises ValueError for options which are not in WORKER_OPTIONS, and for mocker
+    configurations which write files or load modules on the worker: recording
+    mockers, 'path' keys, database backends other than pyodbc, ODBC drivers given
+    as a library path and connection keywords which would add attributes to the
+    connection string.
+    """
+    if not isinstance(options, dict):
+        raise ValueError("Replay options must be a dictionary.")
+    unsupported = sorted(set(options) - set(WORKER_OPTIONS))
+    if unsupported:
+        raise ValueError("Replay options not accepted by workers : " + ", ".join(unsupported))
+    for key in ('sdn_config', 'odbc_config'):
+        configs = options.get(key) or []
+        for config in configs if isinstance(configs, list) else [configs]:
+            if not isinstance(config, dict):
+                raise ValueError("Invalid {0} for a worker.".format(key))
+            if config.get('mocker') == 'record' or 'path' in config:
+                raise ValueError("Recording mockers are not supported with workers.")
+            if config.get('backend', PyodbcBackend.name) != PyodbcBackend.name:
+                raise ValueError("Only the {0} backend is supported with workers.".format(
+                    PyodbcBackend.name))
+            if key == 'odbc_config':
+                if 'driver' in config:
+                    check_driver(config['driver'])
+                if any(';' in str(config[name]) for name in ODBC_CONNECTION_KEYS
+                       if config.get(name) is not None):
+                    raise ValueError("ODBC connection keywords must not contain ';'.")
+    return dict(options)
+
+
+class ReplayWorker():
+
+    """
+    Replays one partition of a scenario for a ReplayCoordinator.
+
+    A worker listens on a TCP or Unix socket. For each job the coordinator sends
+    the scenario, the replay options and the partition of the worker. The worker
+    builds and validates its replayer and reports it is ready, then waits for the
+    shared start time, replays the messages of its partition and reports its
+    send statistics.
+
+    Anyone who can reach the worker can make it send messages to any receiver or
+    database, so workers listen on localhost unless another address is given, and
+    with a token only serve coordinators which send the same token. Only the replay
+    options in WORKER_OPTIONS are accepted (see get_worker_options).
+    """
+
+    def __init__(self, address="127.0.0.1:0", token=None):
+        """
+        address     -   'host:port' or 'unix:path' to listen on. Port 0 picks a free port.
+                        Defaults to a free port on localhost.
+        token       -   secret shared with the coordinators. [Optional]
+        """
+        self.token = token
+        family, sockaddr = parse_address(address)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(sockaddr)
+        self.socket.listen()
+        if family == socket.AF_INET:
+            self.address = "{0}:{1}".format(*self.socket.getsockname()[:2])
+        else:
+            self.address = address
+
+    def serve_forever(self):
+        """
+        Handles coordinator connections one at a time until a shutdown is received.
+        """
+        logging.info("Replay worker listening on {0}.".format(self.address))
+        try:
+            while True:
+                conn, _ = self.socket.accept()
+                with conn:
+                    if not self.handle(conn):
+                        return
+        finally:
+            self.close()
+
+    def handle(self, conn):
+        """
+        Handles the frames of a coordinator connection.
+        Returns False if the worker was asked to shut down.
+        """
+        try:
+            header, payload = recv_frame(conn)
+            if not check_token(header, self.token):
+                raise ValueError("Invalid worker token.")
+            if header.get('type') == 'shutdown':
+                return False
+            if header.get('version') != PROTOCOL_VERSION:
+                raise ValueError("Unsupported protocol version : {0}".format(
+                    header.get('version')))
+            if header.get('type') != 'replay':
+                raise ValueError("Unexpected frame type : {0}".format(header.get('type')))
+            replayer = self.create_replayer(header, payload)
+            send_frame(conn, {'type': 'ready'})
+            start, _ = recv_frame(conn)
+            if start.get('type') != 'start':
+                return True
+            stats, lateness = self.replay(replayer, start['start_time'], header.get('engine'))
+            send_frame(conn, dict(stats, type='result'), lateness.tobytes())
+        except Exception as e:
+            logging.error("{0} raised : {1}".format(e.__class__.__name__, str(e)))
+            try:
+                send_frame(conn, {'type': 'error',
+                                  'error': "{0} : {1}".format(e.__class__.__name__, str(e))})
+            except OSError:
+                pass
+        return True
+
+    def create_replayer(self, job, scenario):
+        options = get_worker_options(job.get('options', {}))
+        options['partition'] = tuple(job['partition'])
+        return SfbReplayer.fromstring(scenario, **options)
+
+    def replay(self, replayer, start_time, engine=None):
+        """
+        Replays the partition from the wall clock start_time (seconds since the epoch).
+        Returns a tuple of a dictionary of send statistics and an array of the lateness
+        of every send in nanoseconds, which is empty in MaxRate mode.
+        """
+        if engine == 'async':
+            replayer.run_async(start_time=start_time)
+        else:
+            replayer.run(start_time=start_time)
+        lateness = replayer.scheduler.lateness if replayer.measures_jitter() else array('q')
+        stats = dict(replayer.get_stats(), partition=list(replayer.partition))
+        return stats, lateness
+
+    def close(self):
+        self.socket.close()
+
+
+def run_worker(address, ready=None, token=None):
+    """
+    Runs a ReplayWorker until it is shut down. Used as the target of local worker
+    processes, which put their bound address on the ready queue.
+    """
+    worker = ReplayWorker(address, token=token)
+    if ready is not None:
+        ready.put(worker.address)
+    worker.serve_forever()
+
+
+def shutdown_worker(address, token=None):
+    """
+    Asks the ReplayWorker at address to stop serving.
+    """
+    family, sockaddr = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(sockaddr)
+        send_frame(sock, {'type': 'shutdown', 'token': token})
+
+
+class LocalWorkers():
+
+    """
+    Context manager running a number of ReplayWorker processes on this machine.
+    The addresses attribute lists the address of every worker.
+    """
+
+    def __init__(self, count, host="127.0.0.1", token=None):
+        if count < 1:
+            raise ValueError("Number of workers must be at least 1.")
+        self.count = count
+        self.host = host
+        self.token = token
+        self.addresses = []
+        self.processes = []
+
+    def start(self):
+        ready = multiprocessing.Queue()
+        for i in range(self.count):
+            process = multiprocessing.Process(target=run_worker,
+                                              args=("{0}:0".format(self.host), ready,
+                                                    self.token),
+                                              daemon=True)
+            process.start()
+            self.processes.append(process)
+        self.addresses = [ready.get(timeout=30) for _ in self.processes]
+        return self
+
+    def stop(self):
+        for address in self.addresses:
+            try:
+                shutdown_worker(address, self.token)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.addresses = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exec_type, exec_value, exec_tb):
+        self.stop()
+
+
+class DistributedReport():
+
+    """
+    Aggregated send statistics of the workers of a distributed replay.
+    """
+
+    def __init__(self):
+        # List of (address, stats) of every worker which completed its partition
+        self.results = []
+        # List of (address, error) of every worker which failed
+        self.errors = []
+        self.lateness = array('q')
+
+    def add(self, address, stats, lateness):
+        self.results.append((address, stats))
+        self.lateness.extend(lateness)
+
+    @property
+    def sent(self):
+        return sum(stats['sent'] for _, stats in self.results)
+
+    @property
+    def failures(self):
+        return sum(stats['failures'] for _, stats in self.results)
+
+    def jitter_summary(self):
+        """
+        Returns the send lateness statistics in milliseconds across every worker,
+        with the same keys as ReplayScheduler.jitter_summary.
+        """
+        ordered = sorted(self.lateness)
+        summary = {'count': len(ordered)}
+        for key, pct in (('p50', 50), ('p99', 99), ('max', 100)):
+            value = percentile(ordered, pct)
+            summary[key] = value / NS_PER_MILLISECOND if value is not None else None
+        return summary
+
+    def __str__(self):
+        lines = []
+        for address, stats in self.results:
+            lines.append("Worker {0} ::: partition - {1} : sent - {2} : failures - {3}".format(
+                address, stats['partition'][0], stats['sent'], stats['failures']))
+        for address, error in self.errors:
+            lines.append("Worker {0} ::: failed - {1}".format(address, error))
+        summary = self.jitter_summary()
+        template = "Distributed Replay ::: workers - {0} : sent - {1} : failures - {2}".format(
+            len(self.results), self.sent, self.failures)
+        if summary['count']:
+            template += " : p50 - {p50:.3f}ms : p99 - {p99:.3f}ms : " \
+                "max - {max:.3f}ms".format(**summary)
+        lines.append(template)
+        return '\n'.join(lines)
+
+
+class ReplayCoordinator():
+
+    """
+    Replays a scenario across a number of ReplayWorkers, which may be local
+    processes or run on other hosts.
+
+    The messages are partitioned by ConferenceId, or CallId, so every message of
+    a call or conference is sent by one worker in order (see partition.get_partition). Load
+    generation clones are partitioned by clone instead. Every worker is sent the
+    whole scenario, so they share the timeline, and replays its own partition.
+    Once every worker is ready the coordinator sends a shared wall clock start
+    time, then collects the send statistics of every worker into a
+    DistributedReport.
+
+    ReplayBarriers only order the messages within each worker.
+    """
+
+    def __init__(self, workers, start_delay=DEFAULT_START_DELAY, engine='sync', timeout=None,
+                 token=None):
+        """
+        workers     -   list of worker addresses, 'host:port' or 'unix:path'.
+        start_delay -   seconds between every worker being ready and the start.
+        engine      -   replay engine of the workers, 'sync' or 'async'.
+        timeout     -   socket timeout in seconds while the workers prepare. [Optional]
+        token       -   secret shared with the workers. [Optional]
+        """
+        if not workers:
+            raise ValueError("At least one worker address is required.")
+        for address in workers:
+            parse_address(address)
+        self.workers = list(workers)
+        self.start_delay = start_delay
+        self.engine = engine
+        self.timeout = timeout
+        self.token = token
+
+    def connect(self, address):
+        family, sockaddr = parse_address(address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(sockaddr)
+        return sock
+
+    def run(self, scenario, **options):
+        """
+        Replays the scenario across the workers, and returns a DistributedReport.
+
+        scenario    -   SfbReplay scenario XML as bytes.
+        options     -   SfbReplayer keyword parameters, which must be JSON serialisable
+                        and accepted by the workers (see get_worker_options).
+        Raises ValueError for options the workers do not accept.
+        """
+        get_worker_options(options)
+        report = DistributedReport()
+        connections = []
+        try:
+            count = len(self.workers)
+            for index, address in enumerate(self.workers):
+                conn = self.connect(address)
+                connections.append((address, conn))
+                send_frame(conn, {'type': 'replay',
+                                  'version': PROTOCOL_VERSION,
+                                  'partition': [index, count],
+                                  'engine': self.engine,
+                                  'token': self.token,
+                                  'options': options}, scenario)
+            ready = []
+            for address, conn in connections:
+                header, _ = recv_frame(conn)
+                if header.get('type') != 'ready':
+                    report.errors.append((address, header.get('error')))
+                    continue
+                ready.append((address, conn))
+            if report.errors:
+                logging.error("Replay workers failed to prepare, aborting the replay.")
+                return report
+
+            start_time = time.time() + self.start_delay
+            logging.info("Starting {0} replay workers at {1}.".format(len(ready), start_time))
+            for address, conn in ready:
+                send_frame(conn, {'type': 'start', 'start_time': start_time})
+            for address, conn in ready:
+                # The replay may run for any length of time
+                conn.settimeout(None)
+                header, payload = recv_frame(conn)
+                if header.get('type') != 'result':
+                    report.errors.append((address, header.get('error')))
+                    continue
+                report.add(address, header, array('q', payload))
+        finally:
+            for _, conn in connections:
+                conn.close()
+        return report
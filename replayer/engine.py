@@ -0,0 +1,243 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import logging
+from .timeline import NS_PER_SECOND
+from .metrics import QUEUE_DEPTH
+from .xmlmessage import SerialisedMessage
+
+
+class ReplayLane():
+
+    """
+    Sends replay messages to a single mocker on dedicated worker threads.
+    Lanes run independently, so a slow mocker only delays its own messages.
+
+    Up to the mocker's max_in_flight messages are sent concurrently. Messages with
+    the same ordering key are always sent one at a time, in the order they were
+    submitted. When the window is full, messages wait in the lane until a send
+    completes, so a slow receiver is not flooded.
+
+    At most max_queued messages are held by the lane. When it is full, submit waits
+    for a send to complete, so the memory of a replay which falls behind stays flat.
+    """
+
+    # Most messages held by a lane, by default
+    MAX_QUEUED = 1024
+
+    def __init__(self, mocker, name=None, on_sent=None, max_queued=None):
+        """
+        mocker      -   mocker instance which sends the lane's messages.
+        name        -   name of the lane in the metrics, e.g. 'sdn'. [Optional]
+        on_sent     -   function called with the mocker after each message is sent,
+                        on the worker thread. [Optional]
+        max_queued  -   most messages held by the lane, queued or in flight.
+                        Defaults to MAX_QUEUED. [Optional]
+        """
+        self.mocker = mocker
+        self.name = name
+        self.on_sent = on_sent
+        self.max_in_flight = max(int(mocker.max_in_flight), 1)
+        if max_queued is None:
+            max_queued = self.MAX_QUEUED
+        self.max_queued = max(int(max_queued), self.max_in_flight)
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                            thread_name_prefix=mocker.__class__.__name__)
+        self._window = asyncio.Semaphore(self.max_in_flight)
+        self._queue = asyncio.Semaphore(self.max_queued)
+        self._tails = {}
+        self._pending = set()
+        self._errors = []
+
+    @staticmethod
+    def get_key(msg):
+        """
+        Returns the ordering key of the message. Messages without a key are ordered
+        with each other.
+        """
+        get_ordering_key = getattr(msg, 'get_ordering_key', None)
+        return get_ordering_key() if get_ordering_key is not None else None
+
+    async def submit(self, msg, scheduled_ns=None):
+        """
+        Queues the message to be sent by the lane's mocker. Waits while the lane
+        holds max_queued messages.
+
+        scheduled_ns    -   scheduled send offset of the message, recorded in the
+                            telemetry. [Optional]
+        """
+        await self._submit(self.get_key(msg), self._send_message, msg, scheduled_ns)
+
+    def _send_message(self, msg, scheduled_ns):
+        self.mocker.send_message(msg, scheduled_ns=scheduled_ns)
+        if self.on_sent is not None:
+            self.on_sent(self.mocker)
+
+    async def idle(self, seconds):
+        """
+        Queues a call to the mocker's idle method behind the messages without a key.
+        """
+        await self._submit(None, self.mocker.idle, seconds)
+
+    async def flush(self):
+        """
+        Queues a call to the mocker's flush method behind the messages without a key.
+        """
+        await self._submit(None, self.mocker.flush)
+
+    async def _submit(self, key, func, *args):
+        await self._queue.acquire()
+        task = asyncio.ensure_future(self._send(self._tails.get(key), func, *args))
+        self._tails[key] = task
+        self._pending.add(task)
+        task.add_done_callback(functools.partial(self._on_done, key))
+
+    async def _send(self, previous, func, *args):
+        if previous is not None:
+            # Wait for the previous message with this key, whatever its outcome
+            await asyncio.wait([previous])
+        async with self._window:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executor, func, *args)
+            finally:
+                self.in_flight -= 1
+
+    def _on_done(self, key, task):
+        self._pending.discard(task)
+        self._queue.release()
+        if self._tails.get(key) is task:
+            del self._tails[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._errors.append(task.exception())
+
+    async def drain(self):
+        """
+        Waits until every queued message has been sent.
+        Re-raises the first error raised by the mocker.
+        """
+        if self._pending:
+            await asyncio.wait(set(self._pending))
+        if self._errors:
+            raise self._errors[0]
+
+    @property
+    def queued(self):
+        """
+        Number of submitted messages waiting for a free send slot or an earlier
+        message with the same ordering key.
+        """
+        return max(len(self._pending) - self.in_flight, 0)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __str__(self):
+        return "ReplayLane ::: {0} : pending - {1} : in flight - {2}/{3}".format(
+            self.mocker.__class__.__name__, len(self._pending),
+            self.in_flight, self.max_in_flight)
+
+
+class AsyncReplayEngine():
+
+    """
+    Replays the messages of a SfbReplayer on an asyncio event loop.
+
+    Messages are dispatched at their scheduled offsets onto one lane per mocker.
+    The dispatcher only waits for a send to complete when a lane holds max_queued
+    messages, so timing fidelity holds even when one backend is slow. Mirrored
+    messages are serialised once and dispatched to the lane of every mocker, so a
+    slow target does not delay the others. Before a message preceded by a
+    ReplayBarrier is dispatched, every lane is drained and the open batches of
+    batching mockers are committed.
+    """
+
+    def __init__(self, replayer):
+        """
+        replayer    -   SfbReplayer instance with open mockers.
+        """
+        self.replayer = replayer
+        self.lanes = {}
+
+    def run(self, start_ns=None):
+        """
+        Runs the replay to completion. Blocks the calling thread.
+
+        start_ns    -   time.monotonic_ns value the replay starts at. Defaults to now.
+        """
+        return asyncio.run(self._run(start_ns))
+
+    def get_lanes(self, msg):
+        """
+        Returns the lanes of every mocker the message is sent to.
+        """
+        lanes = []
+        for mocker in self.replayer.get_mockers(msg):
+            lane = self.lanes.get(mocker)
+            if lane is None:
+                lane = self.lanes[mocker] = ReplayLane(mocker, name=mocker.name,
+                                                       on_sent=self.replayer.record_sent)
+            lanes.append(lane)
+        return lanes
+
+    def get_queue_depths(self):
+        """
+        Returns a dictionary of the number of queued messages of each lane.
+        """
+        return {lane.name: lane.queued for lane in list(self.lanes.values())}
+
+    async def idle_lanes(self, wait_ns):
+        """
+        Lets the mockers of batching lanes flush before a wait of wait_ns nanoseconds.
+        """
+        if wait_ns <= 0:
+            return
+        for lane in list(self.lanes.values()):
+            if lane.mocker.batching:
+                await lane.idle(wait_ns / NS_PER_SECOND)
+
+    async def drain(self):
+        """
+        Waits until every lane has sent all of its queued messages.
+        """
+        await asyncio.gather(*(lane.drain() for lane in self.lanes.values()))
+
+    async def barrier(self):
+        """
+        Waits until every lane has sent all of its queued messages, and batching
+        mockers have committed their open batches.
+        """
+        await self.drain()
+        for lane in list(self.lanes.values()):
+            if lane.mocker.batching:
+                await lane.flush()
+        await self.drain()
+
+    async def _run(self, start_ns=None):
+        replayer = self.replayer
+        scheduler = replayer.scheduler
+        try:
+            schedule = replayer.schedule()
+            scheduler.start(start_ns)
+            replayer.start_telemetry()
+            if replayer.metrics is not None:
+                replayer.metrics.add_collector(QUEUE_DEPTH, self.get_queue_depths)
+            for index, msg, offset in schedule:
+                lanes = self.get_lanes(msg)
+                if index in replayer.replay_barriers:
+                    logging.debug("Replay barrier before message {0}.".format(index))
+                    await self.barrier()
+                await self.idle_lanes(offset - scheduler.elapsed())
+                replayer.record_lateness(await scheduler.wait_until_async(offset))
+                replayer.write_timestamp(index, msg)
+                if len(lanes) > 1:
+                    msg = SerialisedMessage(msg)
+                replayer.scheduled += len(lanes)
+                for lane in lanes:
+                    await lane.submit(msg, offset)
+            await self.drain()
+        finally:
+            for lane in self.lanes.values():
+                lane.close()
@@ -0,0 +1,197 @@
+from .timeline import NS_PER_SECOND
+from .timeline import ns_to_datetime
+import copy
+import hashlib
+import heapq
+import random
+import string
+
+# Elements whose values identify a call, conference or dialog, and are rewritten
+# in each clone. Endpoint Id elements hold the SIP dialog tags.
+ID_TAGS = ("CallId", "ConferenceId", "ConversationId", "CorrelationId", "Id")
+# Elements which may contain the identifiers, e.g. conference URIs
+ID_REFERENCE_TAGS = ("URI",)
+# Shorter identifiers are only rewritten where they are a whole element value
+MIN_REFERENCE_LENGTH = 6
+
+
+def derive_id(original, seed, clone):
+    """
+    Returns a deterministic identifier for a clone, with the same length and
+    character classes as the original, so it is accepted wherever the original is.
+    The same original always gives the same identifier for a seed and clone,
+    ignoring case.
+    """
+    key = "{0}:{1}:{2}".format(seed, clone, original.lower()).encode("utf-8")
+    rng = random.Random(hashlib.sha256(key).digest())
+    if any(c.isalpha() for c in original) and all(c in string.hexdigits for c in original):
+        letters = "ABCDEF" if any(c.isupper() for c in original) else "abcdef"
+        return ''.join(rng.choice(string.digits + letters) for _ in original)
+    new_id = []
+    for c in original:
+        if c in string.digits:
+            new_id.append(rng.choice(string.digits))
+        elif c in string.ascii_lowercase:
+            new_id.append(rng.choice(string.ascii_lowercase))
+        elif c in string.ascii_uppercase:
+            new_id.append(rng.choice(string.ascii_uppercase))
+        else:
+            new_id.append(c)
+    return ''.join(new_id)
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class LoadGenerator():
+
+    """
+    Fans a scenario out into a number of synthetic concurrent clones.
+
+    Each clone replays every message of the scenario, with its call, conference
+    and dialog identifiers rewritten to deterministic seeded values, and its
+    timestamps shifted by the arrival time of the clone. Clone arrivals are spaced
+    by the configured distribution.
+
+    Iterating the generator yields the messages of every clone merged in timestamp
+    order. Clone messages are only created as they are yielded, and a clone is only
+    tracked between its first and last message, so memory grows with the number of
+    active clones rather than with the number of clones.
+    """
+
+    ARRIVALS = ('fixed', 'uniform', 'poisson')
+
+    def __init__(self, messages, timestamps_ns, clones, interval=1, arrival='fixed', seed=0):
+        """
+        messages        -   list of replay messages of the scenario.
+        timestamps_ns   -   sequence of the message timestamps in nanoseconds.
+        clones          -   number of clones.
+        interval        -   mean time between clone arrivals in seconds.
+        arrival         -   'fixed' spaces arrivals exactly interval apart,
+                            'uniform' draws the gaps uniformly from 0 to 2 * interval,
+                            'poisson' draws exponentially distributed gaps.
+        seed            -   seed of the clone identifiers and arrival gaps.
+        """
+        if clones < 1:
+            raise ValueError("Number of clones must be at least 1.")
+        if interval < 0:
+            raise ValueError("Arrival interval must not be negative.")
+        if arrival not in LoadGenerator.ARRIVALS:
+            raise ValueError("Arrival must be one of " + ", ".join(LoadGenerator.ARRIVALS))
+        if len(messages) != len(timestamps_ns):
+            raise ValueError("Every message must have a timestamp.")
+        self.messages = messages
+        self.timestamps = timestamps_ns
+        self.clones = clones
+        self.interval = interval
+        self.arrival = arrival
+        self.seed = seed
+        self.active = 0
+        self.peak_active = 0
+        # (index, count) to only generate the clones whose number modulo count is index
+        self.partition = None
+        # Identifiers of the scenario, which are also rewritten in SQL queries
+        self._ids = set()
+        for msg in messages:
+            root = getattr(msg, 'root', None)
+            if root is not None and msg.lane == 'sdn':
+                for elem in root.iter():
+                    if (isinstance(elem.tag, str) and _localname(elem.tag) in ID_TAGS
+                            and elem.text):
+                        self._ids.add(elem.text.strip())
+
+    def arrivals(self):
+        """
+        Yields the arrival offset of each clone in nanoseconds, in ascending order.
+        """
+        rng = random.Random(self.seed)
+        offset = 0.0
+        for clone in range(self.clones):
+            yield int(offset * NS_PER_SECOND)
+            if self.arrival == 'fixed':
+                offset += self.interval
+            elif self.arrival == 'uniform':
+                offset += rng.uniform(0, 2 * self.interval)
+            elif self.interval > 0:
+                offset += rng.expovariate(1 / self.interval)
+
+    def get_clones(self):
+        """
+        Returns the range of the clone numbers generated, in the partition if one is set.
+        """
+        if self.partition is None:
+            return range(self.clones)
+        index, count = self.partition
+        return range(index, self.clones, count)
+
+    def __len__(self):
+        return len(self.get_clones()) * len(self.messages)
+
+    def __iter__(self):
+        if not self.messages:
+            return
+        first = self.timestamps[0]
+        last_index = len(self.messages) - 1
+        clones = self.get_clones()
+        arrivals = ((clone, arrival) for clone, arrival in enumerate(self.arrivals())
+                    if clone in clones)
+        next_clone = next(arrivals, None)
+        # Heap of (timestamp, clone, message index, arrival) of the next message of
+        # every active clone
+        heap = []
+        self.active = self.peak_active = 0
+        while heap or next_clone is not None:
+            # Start every clone which arrives before the next message is due
+            while next_clone is not None and (not heap or first + next_clone[1] <= heap[0][0]):
+                clone, arrival = next_clone
+                heapq.heappush(heap, (first + arrival, clone, 0, arrival))
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                next_clone = next(arrivals, None)
+            timestamp, clone, index, arrival = heapq.heappop(heap)
+            if index < last_index:
+                heapq.heappush(heap, (self.timestamps[index + 1] + arrival, clone,
+                                      index + 1, arrival))
+            else:
+                self.active -= 1
+            yield self.clone_message(clone, index, timestamp)
+
+    def get_id(self, clone, original):
+        """
+        Returns the identifier used in place of the original in the given clone.
+        """
+        return derive_id(original, self.seed, clone)
+
+    def clone_message(self, clone, index, timestamp_ns):
+        """
+        Returns a copy of the message at index for the clone, with its identifiers
+        rewritten and its timestamp set to timestamp_ns.
+        """
+        template = self.messages[index]
+        msg = template.__class__(copy.deepcopy(template.root))
+        for elem in msg.root.iter():
+            if not isinstance(elem.tag, str) or not elem.text:
+                continue
+            tag = _localname(elem.tag)
+            if tag in ID_TAGS or tag in ID_REFERENCE_TAGS or template.lane == 'sql':
+                elem.text = self.rewrite_ids(clone, elem.text)
+        msg.set_timestamp(ns_to_datetime(timestamp_ns))
+        return msg
+
+    def rewrite_ids(self, clone, text):
+        """
+        Replaces every identifier of the scenario found in text with its clone value.
+        """
+        stripped = text.strip()
+        if stripped in self._ids:
+            return text.replace(stripped, self.get_id(clone, stripped))
+        for original in self._ids:
+            if len(original) >= MIN_REFERENCE_LENGTH and original in text:
+                text = text.replace(original, self.get_id(clone, original))
+        return text
+
+    def __str__(self):
+        return "LoadGenerator ::: clones - {0} : arrival - {1} : interval - {2}s : " \
+            "seed - {3}".format(self.clones, self.arrival, self.interval, self.seed)
+
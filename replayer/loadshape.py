@@ -0,0 +1,308 @@
+from .timeline import NS_PER_SECOND
+from bisect import bisect_right
+from collections import Counter
+import logging
+import math
+import threading
+
+# Positional parameters of each stage kind, as given to LoadShape.parse
+STAGE_PARAMS = {'ramp': ('duration', 'from', 'to'),
+                'plateau': ('duration', 'rate'),
+                'step': ('duration', 'from', 'to', 'steps'),
+                'spike': ('duration', 'rate', 'peak', 'width')}
+
+
+def get_segments(stage):
+    """
+    Returns the stage as a list of (duration, start rate, end rate) segments, over
+    which the rate changes linearly. Rates are in messages per second.
+    Raises ValueError for invalid stages.
+
+    Stage keys - values
+
+    kind        -   'ramp', 'plateau', 'step' or 'spike'.
+    duration    -   seconds, for every kind.
+    from, to    -   ramp : rate at the start and end of a linear ramp.
+                    step : rates of the first and last of steps equal levels.
+    steps       -   step : number of levels, at least 2. Default is 2.
+    rate        -   plateau : constant rate. spike : rate after the peak.
+    peak, width -   spike : rate held for the first width seconds of the stage.
+    """
+    kind = stage.get('kind')
+    if kind not in STAGE_PARAMS:
+        raise ValueError("Load stage must be one of " + ", ".join(STAGE_PARAMS))
+    try:
+        duration = float(stage['duration'])
+        if kind == 'ramp':
+            segments = [(duration, float(stage['from']), float(stage['to']))]
+        elif kind == 'plateau':
+            rate = float(stage['rate'])
+            segments = [(duration, rate, rate)]
+        elif kind == 'step':
+            start, end = float(stage['from']), float(stage['to'])
+            steps = int(stage.get('steps', 2))
+            if steps < 2:
+                raise ValueError("A step stage must have at least 2 steps.")
+            levels = [start + (end - start) * i / (steps - 1) for i in range(steps)]
+            segments = [(duration / steps, level, level) for level in levels]
+        else:
+            rate, peak = float(stage['rate']), float(stage['peak'])
+            width = min(float(stage['width']), duration)
+            segments = [(width, peak, peak), (duration - width, rate, rate)]
+    except (KeyError, TypeError) as e:
+        logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+        raise ValueError("Invalid {0} load stage : {1}".format(kind, stage))
+    if duration <= 0:
+        raise ValueError("Load stage duration must be greater than 0.")
+    if any(rate < 0 for segment in segments for rate in segment[1:]):
+        raise ValueError("Load stage rates must not be negative.")
+    return [segment for segment in segments if segment[0] > 0]
+
+
+class LoadShape():
+
+    """
+    Shapes the offered load of a replay over time, instead of the timing of the
+    scenario. The load shape is a sequence of stages (ramp, plateau, step, spike),
+    which give the target send rate over the course of the replay.
+
+    Messages are paced by a token bucket. Tokens accrue at the target rate, up to
+    burst tokens, and every send takes one, so a replay which falls behind only
+    catches up by at most burst messages. Messages are sent in scenario order, and
+    the replay ends when the last stage ends or the messages run out.
+
+    Completed sends are counted per target, and the achieved rate is reported
+    against the target rate for every interval of the replay. The last interval
+    ends with the load shape, or the replay if it ended first.
+    """
+
+    def __init__(self, stages, burst=1, interval=10):
+        """
+        stages      -   list of stage dictionaries, see get_segments.
+        burst       -   capacity of the token bucket, in messages.
+        interval    -   seconds covered by each line of the rate report.
+        """
+        if not stages:
+            raise ValueError("A load shape must have at least one stage.")
+        try:
+            self.burst = float(burst)
+            self.interval = float(interval)
+        except (TypeError, ValueError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid load shape configuration.")
+        if self.burst < 1:
+            raise ValueError("Load shape burst must be at least 1.")
+        if self.interval <= 0:
+            raise ValueError("Load shape interval must be greater than 0.")
+        try:
+            self.stages = [{key: value if key == 'kind' else float(value)
+                            for key, value in stage.items()} for stage in stages]
+        except (AttributeError, TypeError, ValueError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid load shape stages.")
+        self.segments = [segment for stage in self.stages for segment in get_segments(stage)]
+        # Start time and cumulative tokens at the start of each segment
+        self._starts = [0.0]
+        self._totals = [0.0]
+        for duration, start, end in self.segments:
+            self._starts.append(self._starts[-1] + duration)
+            self._totals.append(self._totals[-1] + (start + end) / 2 * duration)
+        self.duration = self._starts[-1]
+        self._tokens = None
+        self._last = 0.0
+        self.elapsed = None
+        self._completed = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromconfig(cls, config):
+        """
+        Builds a LoadShape from the load_shape replay configuration, a dictionary
+        of stages, burst and interval. Returns None if config is None.
+        """
+        if config is None:
+            return None
+        return cls(config.get('stages'), burst=config.get('burst', 1),
+                   interval=config.get('interval', 10))
+
+    @staticmethod
+    def parse(spec):
+        """
+        Returns the list of stage dictionaries of a comma separated load shape, where
+        each stage is its kind followed by its parameters, separated by colons.
+        Raises ValueError if the load shape cannot be parsed.
+
+        e.g. "ramp:600:10:2000,plateau:300:2000,step:300:2000:4000:3,spike:60:2000:8000:5"
+        """
+        stages = []
+        for item in spec.split(','):
+            values = [value.strip() for value in item.split(':')]
+            kind = values[0].lower()
+            params = STAGE_PARAMS.get(kind)
+            if params is None or not 2 <= len(values) <= len(params) + 1:
+                raise ValueError("Invalid load stage : " + item.strip())
+            stage = {'kind': kind}
+            try:
+                stage.update((key, float(value)) for key, value in zip(params, values[1:]))
+            except ValueError as e:
+                logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+                raise ValueError("Invalid load stage : " + item.strip())
+            get_segments(stage)
+            stages.append(stage)
+        return stages
+
+    def scaled(self, factor):
+        """
+        Returns a copy of the load shape with every rate multiplied by factor.
+        """
+        stages = [{key: value * factor if key in ('from', 'to', 'rate', 'peak') else value
+                   for key, value in stage.items()} for stage in self.stages]
+        return LoadShape(stages, burst=self.burst, interval=self.interval)
+
+    def rate(self, t):
+        """
+        Returns the target rate in messages per second at t seconds, 0 after the end.
+        """
+        index = bisect_right(self._starts, t) - 1
+        if index < 0 or index >= len(self.segments):
+            return 0.0
+        duration, start, end = self.segments[index]
+        return start + (end - start) * (t - self._starts[index]) / duration
+
+    def tokens(self, t):
+        """
+        Returns the number of messages the target rate allows in the first t seconds.
+        """
+        index = bisect_right(self._starts, t) - 1
+        if index < 0:
+            return 0.0
+        if index >= len(self.segments):
+            return self._totals[-1]
+        elapsed = t - self._starts[index]
+        return self._totals[index] + (self.rate(self._starts[index]) + self.rate(t)) / 2 * elapsed
+
+    def time_at(self, tokens):
+        """
+        Returns the time in seconds at which the target rate has allowed the given
+        number of messages, or None if the load shape ends first.
+        """
+        if tokens <= 0:
+            return 0.0
+        index = bisect_right(self._totals, tokens) - 1
+        while index < len(self.segments):
+            duration, start, end = self.segments[index]
+            remaining = tokens - self._totals[index]
+            if remaining <= 0:
+                return self._starts[index]
+            if remaining <= self._totals[index + 1] - self._totals[index]:
+                # Solve start * t + slope / 2 * t^2 = remaining, in a form which is
+                # stable for flat segments
+                half_slope = (end - start) / duration / 2
+                root = math.sqrt(max(start * start + 4 * half_slope * remaining, 0.0))
+                if start + root > 0:
+                    return self._starts[index] + min(2 * remaining / (start + root), duration)
+            index += 1
+        return None
+
+    def start(self):
+        """
+        Fills the token bucket at the start of the replay.
+        """
+        self._tokens = self.burst
+        self._last = 0.0
+        self.elapsed = None
+        with self._lock:
+            self._completed = Counter()
+
+    def reserve(self, elapsed_ns):
+        """
+        Takes a token for the next message, elapsed_ns nanoseconds after the start of
+        the replay. Returns the offset (nanoseconds) at which the message may be sent,
+        or None if the load shape has ended.
+        """
+        if self._tokens is None:
+            self.start()
+        now = max(elapsed_ns / NS_PER_SECOND, self._last)
+        if now >= self.duration:
+            return None
+        self._tokens = min(self.burst,
+                           self._tokens + self.tokens(now) - self.tokens(self._last))
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return int(now * NS_PER_SECOND)
+        send_time = self.time_at(self.tokens(now) + 1 - self._tokens)
+        if send_time is None or send_time >= self.duration:
+            return None
+        self._tokens = 0.0
+        self._last = send_time
+        return int(send_time * NS_PER_SECOND)
+
+    def record(self, target, elapsed_ns):
+        """
+        Counts a send to target which completed elapsed_ns nanoseconds after the start
+        of the replay. Thread-safe.
+        """
+        index = int(elapsed_ns / NS_PER_SECOND // self.interval)
+        with self._lock:
+            self._completed[(target, index)] += 1
+
+    def finish(self, elapsed_ns):
+        """
+        Sets the length of the replay, elapsed_ns nanoseconds, which ends the last
+        interval of the summary if the replay ended before the load shape.
+        """
+        self.elapsed = elapsed_ns / NS_PER_SECOND
+
+    def summary(self):
+        """
+        Returns a list with a dictionary for every interval of the replay.
+
+        Returned keys - values (types)
+
+        start       -   start of the interval in seconds (float)
+        end         -   end of the interval in seconds, clipped to the end of the load
+                        shape or of the replay. Sends which completed after the
+                        end are counted in the last interval (float)
+        target      -   mean target rate in messages per second (float)
+        achieved    -   dictionary of the completed sends per second of each target (dict)
+        """
+        stop = self.duration if self.elapsed is None else min(self.duration, self.elapsed)
+        count = max(math.ceil(stop / self.interval), 1)
+        completed = Counter()
+        with self._lock:
+            for (target, index), sent in self._completed.items():
+                completed[(target, min(index, count - 1))] += sent
+        targets = sorted(set(target for target, _ in completed), key=str)
+        rows = []
+        for index in range(count):
+            start = index * self.interval
+            end = min(start + self.interval, stop)
+            length = max(end - start, 1e-9)
+            rows.append({'start': start,
+                         'end': end,
+                         'target': (self.tokens(end) - self.tokens(start)) / length,
+                         'achieved': {target: completed.get((target, index), 0) / length
+                                      for target in targets}})
+        return rows
+
+    def report(self):
+        """
+        Returns a readable table of the achieved against the target rate.
+        """
+        lines = ["Load Shape ::: {0} : burst - {1:g} : interval - {2:g}s".format(
+            self, self.burst, self.interval)]
+        for row in self.summary():
+            line = "    {start:>7g}s - {end:g}s : target - {target:.1f} msg/s".format(**row)
+            for target, achieved in row['achieved'].items():
+                line += " : {0} - {1:.1f} msg/s".format(target, achieved)
+                if row['target'] > 0:
+                    line += " ({0:.0%})".format(achieved / row['target'])
+            lines.append(line)
+        return "\n".join(lines)
+
+    def __str__(self):
+        return ",".join(":".join([stage['kind']] + ["{0:g}".format(stage[key])
+                                                    for key in STAGE_PARAMS[stage['kind']]
+                                                    if key in stage])
+                        for stage in self.stages)
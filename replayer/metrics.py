@@ -0,0 +1,257 @@
+from .telemetry import is_error
+from .timeline import NS_PER_SECOND
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import bisect
+import logging
+import threading
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Upper bounds of the latency and lateness histogram buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+SENT = 'sfbreplay_messages_sent'
+ERRORS = 'sfbreplay_send_errors'
+RETRIES = 'sfbreplay_send_retries'
+IN_FLIGHT = 'sfbreplay_in_flight'
+QUEUE_DEPTH = 'sfbreplay_queue_depth'
+LATENCY = 'sfbreplay_send_latency_seconds'
+LATENESS = 'sfbreplay_schedule_lateness_seconds'
+
+# name : (type, help)
+FAMILIES = {SENT: ('counter', "Messages sent."),
+            ERRORS: ('counter', "Sends which failed or received an error response."),
+            RETRIES: ('counter', "Retries of failed sends."),
+            IN_FLIGHT: ('gauge', "Sends in progress."),
+            QUEUE_DEPTH: ('gauge', "Messages due to be sent, waiting for a free send slot."),
+            LATENCY: ('histogram', "Time taken by a send, including retries."),
+            LATENESS: ('histogram', "Time a message was sent after its scheduled time.")}
+
+
+class _Shard():
+
+    """
+    Counters and histograms updated by a single thread.
+    """
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        # (name, lane) : value
+        self.counters = {}
+        # (name, lane) : [bucket counts..., +Inf count, sum in ns]
+        self.histograms = {}
+
+
+class ReplayMetrics():
+
+    """
+    Live counters, gauges and histograms of a replay, rendered in the OpenMetrics
+    text format.
+
+    Every thread updates its own shard of the metrics, so the send path never takes
+    a lock. The shards are only summed when the metrics are scraped, which may
+    then miss the updates in progress.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        buckets -   upper bounds of the histogram buckets in seconds.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._bounds_ns = [int(bound * NS_PER_SECOND) for bound in self.buckets]
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        # name : function returning a dictionary of lane : value
+        self._collectors = {}
+
+    def _get_shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, lane=None, value=1):
+        """
+        Adds value to the counter or gauge name of the lane.
+        """
+        counters = self._get_shard().counters
+        key = (name, lane)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value_ns, lane=None):
+        """
+        Adds a value in nanoseconds to the histogram name of the lane.
+        """
+        histograms = self._get_shard().histograms
+        key = (name, lane)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self._bounds_ns) + 2)
+        histogram[bisect.bisect_left(self._bounds_ns, value_ns)] += 1
+        histogram[-1] += value_ns
+
+    def record_send(self, lane, status, latency_ns):
+        """
+        Records a completed send with its response status, see TelemetrySink.record.
+        """
+        self.inc(SENT, lane)
+        if is_error(status):
+            self.inc(ERRORS, lane)
+        self.observe(LATENCY, latency_ns, lane)
+
+    def add_collector(self, name, func):
+        """
+        Reports the values returned by func(), a dictionary of lane : value, as the
+        metric name when scraped. Replaces any collector of the same name.
+        """
+        with self._lock:
+            self._collectors[name] = func
+
+    def collect(self):
+        """
+        Returns the summed counters { (name, lane) : value } and histograms
+        { (name, lane) : [cumulative bucket counts..., count, sum in ns] } of every shard.
+        """
+        with self._lock:
+            shards = list(self._shards)
+            collectors = list(self._collectors.items())
+        counters = {}
+        histograms = {}
+        for shard in shards:
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, histogram in dict(shard.histograms).items():
+                total = histograms.get(key)
+                if total is None:
+                    total = histograms[key] = [0] * len(histogram)
+                for i, value in enumerate(list(histogram)):
+                    total[i] += value
+        for name, func in collectors:
+            try:
+                for lane, value in func().items():
+                    counters[(name, lane)] = value
+            except Exception as e:
+                logging.error("{0} : {1}".format(e.__class__.__name__, str(e)))
+        for histogram in histograms.values():
+            for i in range(1, len(histogram) - 1):
+                histogram[i] += histogram[i - 1]
+        return counters, histograms
+
+    def render(self):
+        """
+        Returns the metrics in the OpenMetrics text format.
+        """
+        counters, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help) in FAMILIES.items():
+            lines.append("# TYPE {0} {1}".format(name, metric_type))
+            lines.append("# HELP {0} {1}".format(name, help))
+            if metric_type == 'histogram':
+                for (key, lane), histogram in sorted(histograms.items(), key=_sort_key):
+                    if key != name:
+                        continue
+                    for bound, count in zip(self.buckets, histogram):
+                        lines.append("{0}_bucket{1} {2}".format(
+                            name, _labels(lane, le=_format_number(bound)), count))
+                    lines.append("{0}_bucket{1} {2}".format(
+                        name, _labels(lane, le="+Inf"), histogram[-2]))
+                    lines.append("{0}_count{1} {2}".format(name, _labels(lane), histogram[-2]))
+                    lines.append("{0}_sum{1} {2}".format(
+                        name, _labels(lane), _format_number(histogram[-1] / NS_PER_SECOND)))
+                continue
+            suffix = "_total" if metric_type == 'counter' else ""
+            for (key, lane), value in sorted(counters.items(), key=_sort_key):
+                if key == name:
+                    lines.append("{0}{1}{2} {3}".format(name, suffix, _labels(lane), value))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(item):
+    name, lane = item[0]
+    return name, lane or ""
+
+
+def _format_number(value):
+    return repr(float(value))
+
+
+def _labels(lane, **labels):
+    if lane is not None:
+        labels = dict(lane=lane, **labels)
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(key, value) for key, value in labels.items()) + "}"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    """
+    Serves the metrics of the server's ReplayMetrics on GET /metrics.
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class MetricsServer():
+
+    """
+    Embedded HTTP endpoint for Prometheus/OpenMetrics scrapes of a ReplayMetrics,
+    served on a background thread.
+    """
+
+    def __init__(self, metrics, host="0.0.0.0", port=9464):
+        """
+        metrics -   ReplayMetrics instance to serve.
+        host    -   address to listen on.
+        port    -   port to listen on, 0 picks a free port.
+        """
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = metrics
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{0}:{1}/metrics".format(host, port)
+
+    def start(self):
+        """
+        Serves scrapes on a background thread. Returns the server.
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exec_type, exec_value, exec_tb):
+        self.stop()
@@ -1,11 +1,19 @@
 import logging
 import http.client
-from urllib.request import urlopen
-from urllib.request import Request
+from urllib.error import HTTPError
 from urllib.error import URLError
 import time
-import pyodbc
 import abc
+import itertools
+from .connectionpool import HTTPConnectionPool
+from .compression import PayloadCompressor
+from .resilience import SendGuard
+from .backends import get_backend
+from .telemetry import STATUS_ERROR
+from .telemetry import STATUS_PENDING
+from .metrics import IN_FLIGHT
+from .recording import MessageRecorder
+import threading
 
 
 class MockerInterface(metaclass=abc.ABCMeta):
@@ -14,8 +22,26 @@ class MockerInterface(metaclass=abc.ABCMeta):
     Interface for Mockers
     """
 
+    # Number of messages the mocker can send concurrently in the async engine
+    max_in_flight = 1
+    # True if the mocker buffers data which should be flushed when idle
+    batching = False
+    # Errors which mean a message could not be delivered
+    SEND_ERRORS = ()
+
     def __init__(self, **config_dict):
+        # Name of the target in the telemetry and metrics, defaults to the lane
+        self.name = config_dict.get('name')
         self._closed = True
+        self.guard = SendGuard.fromconfig(config_dict, is_retryable=self.is_retryable)
+        self.dead_letter = None
+        self.telemetry = None
+        self.metrics = None
+        # AdaptiveRate controller fed with the latency of every send
+        self.adaptive = None
+        self.failures = 0
+        self.delivered = 0
+        self._counts_lock = threading.Lock()
 
     @abc.abstractmethod
     def __str__(self):
@@ -33,23 +59,100 @@ class MockerInterface(metaclass=abc.ABCMeta):
     def send(self, data):
         """Sends the data to the configured end point. Mocker must be open."""
 
-    def send_message(self, msg, delay):
+    def idle(self, seconds):
+        """
+        Called when nothing will be sent for the given number of seconds.
+        Mockers which buffer data flush it here.
+        """
+
+    def flush(self):
+        """
+        Sends any buffered data, e.g. at a ReplayBarrier.
+        Mockers which buffer data override it.
+        """
+
+    def is_retryable(self, error):
+        """
+        Returns True if the send error is transient and the send should be retried.
+        """
+        return True
+
+    def undelivered(self, *msgs):
+        """
+        Records messages which could not be delivered, in the dead-letter file if
+        one is configured.
+        """
+        with self._counts_lock:
+            self.failures += len(msgs)
+        if self.dead_letter is not None:
+            for msg in msgs:
+                if msg is not None:
+                    self.dead_letter.write(msg)
+
+    def count_delivered(self, count=1):
+        """
+        Counts messages which were delivered. Thread-safe.
+        """
+        with self._counts_lock:
+            self.delivered += count
+
+    def record(self, msg, scheduled_ns, started_ns, status, size):
+        """
+        Records a send in the telemetry sink, the live metrics and the adaptive rate
+        controller, if configured.
+        status is the response status, or the number of rows for SQL messages.
+        """
+        if self.telemetry is None and self.metrics is None and self.adaptive is None:
+            return
+        if status is None or isinstance(status, bool):
+            status = STATUS_ERROR
+        latency_ns = time.monotonic_ns() - started_ns
+        if self.telemetry is not None:
+            self.telemetry.record(msg.lane, scheduled_ns, started_ns, status, latency_ns, size,
+                                  target=self.name)
+        if self.metrics is not None:
+            self.metrics.record_send(self.name or msg.lane, status, latency_ns)
+        if self.adaptive is not None:
+            self.adaptive.record(status, latency_ns)
+
+    def set_in_flight(self, msg, value):
+        if self.metrics is not None:
+            self.metrics.inc(IN_FLIGHT, self.name or msg.lane, value)
+        if self.adaptive is not None:
+            self.adaptive.add_in_flight(value)
+
+    def send_message(self, msg, delay=0, scheduled_ns=None):
         """
         Sends the given Message to the configured endpoint using the mocker send method.
         The delay is applied before the message is sent.
+        Failed sends are retried as configured, and then written to the dead-letter file.
 
-        msg     -   an instance of xmlmessage
-        delay   -   number of seconds to delay the send request.
+        msg             -   an instance of xmlmessage
+        delay           -   number of seconds to delay the send request. [Optional]
+        scheduled_ns    -   scheduled send offset of the message from the start of the
+                            replay, recorded in the telemetry. [Optional]
         """
+        data = msg.tobytes()
+        started = time.monotonic_ns()
+        self.set_in_flight(msg, 1)
         try:
-            print('{0} Sleeping for {1}s.'.format(self.__class__.__name__, delay))
-            time.sleep(delay)
+            if delay:
+                print('{0} Sleeping for {1}s.'.format(self.__class__.__name__, delay))
+                time.sleep(delay)
+                started = time.monotonic_ns()
             print("Sending : " + str(msg))
-            if self.send(msg.tostring(encoding="us-ascii").encode("us-ascii")):
+            status = self.guard.call(self.send, data, errors=self.SEND_ERRORS)
+            if status:
                 print("Message sent successfully.")
-        except URLError as e:
-            logging.error("URLError : " + str(e))
+                self.count_delivered()
+            self.record(msg, scheduled_ns, started, status, len(data))
+        except self.SEND_ERRORS as e:
+            logging.error("{0} : {1}".format(e.__class__.__name__, str(e)))
             print("Connection Error! Check the End point in the Mocker configuration.")
+            self.record(msg, scheduled_ns, started, getattr(e, 'code', STATUS_ERROR), len(data))
+            self.undelivered(msg)
+        finally:
+            self.set_in_flight(msg, -1)
 
 
 class SdnMocker(MockerInterface):
@@ -59,10 +162,26 @@ class SdnMocker(MockerInterface):
     Uses the Mocker interface.
     """
 
+    HEADERS = {'Content-Type': 'application/xml'}
+    SEND_ERRORS = (URLError,)
+    # Socket timeout of the probe in seconds, so an unresponsive receiver cannot block open
+    PROBE_TIMEOUT = 1
+
     def __init__(self, **kwargs):
         try:
             self.receiver = kwargs['receiver']
             self.version = kwargs['version']
+            self.max_in_flight = int(kwargs.get('max_in_flight', 1))
+            self.pool_size = int(kwargs.get('pool_size', self.max_in_flight))
+            if self.max_in_flight < 1:
+                raise ValueError("max_in_flight must be at least 1.")
+            self.timeout = kwargs.get('timeout')
+            # Content-Encoding of large request bodies, see PayloadCompressor.fromconfig
+            self.compressor = PayloadCompressor.fromconfig(kwargs)
+            if self.compressor is not None:
+                self.compressed_headers = dict(self.HEADERS,
+                                               **{'Content-Encoding': self.compressor.encoding})
+            self._pool = None
             super().__init__(**kwargs)
         except KeyError as e:
             logging.error("KeyError : " + str(e))
@@ -70,50 +189,96 @@ class SdnMocker(MockerInterface):
 
     def open(self):
         """
+        Opens the connection pool to the receiver.
         Returns true if the receiver is responsive to POST requests.
+        The probe is retried and counted by the circuit breaker like a send, and the
+        probe connection is kept alive and reused by the first send.
+        If the receiver is down, the mocker stays closed and every send probes it again.
         """
-        if self._closed:
-            try:
-                response = urlopen(self.receiver, data="".encode("us-ascii"), timeout=1)
-                if response.status == http.client.OK:
-                    self._closed = False
-                    return True
-            except URLError:
-                print("Failed to Open Connection!")
-                return False
-        else:
+        if not self._closed:
             return True
+        if self._pool is None:
+            self._pool = HTTPConnectionPool(self.receiver,
+                                            size=self.pool_size,
+                                            timeout=self.timeout)
+        try:
+            self.guard.call(self._probe, errors=self.SEND_ERRORS)
+            return True
+        except self.SEND_ERRORS as e:
+            logging.error("{0} : {1}".format(e.__class__.__name__, str(e)))
+            print("Failed to Open Connection!")
+            return False
+
+    def _probe(self):
+        """
+        POSTs an empty request to the receiver, and opens the mocker if it responds.
+        Raises URLError if the receiver cannot be reached, and HTTPError otherwise
+        unless it responds with 200.
+        """
+        status, reason, headers, _ = self._pool.request('POST', "".encode("us-ascii"),
+                                                        timeout=self.PROBE_TIMEOUT)
+        if status != http.client.OK:
+            raise HTTPError(self.receiver, status, reason, headers, None)
+        self._closed = False
+        return status
 
     def close(self):
         """
-        Closes the Sdn Mocker Connection.
+        Closes the Sdn Mocker Connection and every pooled connection.
         """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
         self._closed = True
         return True
 
     def send(self, data):
         """
-        Sends a http POST request to the configured Target Url.
-        Raises URLError on errors.
-
-        Returns True if client received a
+        Sends a http POST request to the configured Target Url over a pooled
+        keep-alive connection. The body is compressed if compression is configured
+        and it is larger than the threshold.
+        If the receiver was down when the mocker was opened, it is probed again first.
+        Raises URLError on errors, or if the mocker is closed, and HTTPError for
+        error responses.
+
+        Returns the response status if client received a
         response from the server, False otherwise.
 
         data    -   String in byte code format (e.g. us-ascii or utf-8 encoded)
         """
         if self._closed:
-            print("Sdn Mocker is closed. Ignoring send request.")
-            return False
+            if self._pool is None:
+                raise URLError("Sdn Mocker is closed.")
+            self._probe()
+
+        headers = self.HEADERS
+        if self.compressor is not None:
+            compressed = self.compressor.compress(data)
+            if compressed is not None:
+                data, headers = compressed, self.compressed_headers
+        status = self._pool.post(data, headers=headers)
 
-        post_request = Request(self.receiver,
-                               data=data,
-                               headers={'Content-Type': 'application/xml'})
-        response = urlopen(post_request)
+        return status if status is not None else False
 
-        return True if response is not None else False
+    def is_retryable(self, error):
+        """
+        Connection errors, 5xx and 429 responses are retried. Other error responses
+        would be rejected again.
+        """
+        if isinstance(error, HTTPError):
+            return error.code >= 500 or error.code == 429
+        return True
 
     def __str__(self):
-        return "SdnMocker ::: receiver - {0} : version - {1}".format(self.receiver, self.version)
+        template = "SdnMocker ::: receiver - {0} : version - {1} : pool size - {2} : " \
+            "max in flight - {3}".format(self.receiver, self.version,
+                                         self.pool_size, self.max_in_flight)
+        if self.compressor is not None:
+            template += " : compression - {0}".format(self.compressor)
+            ratio = self.compressor.ratio()
+            if ratio is not None:
+                template += " : compressed to {0:.1%}".format(ratio)
+        return template
 
 
 class OdbcMocker(MockerInterface):
@@ -121,21 +286,38 @@ class OdbcMocker(MockerInterface):
     """
     Generates a configurable instance of an ODBC mocker.
     Uses the Mocker interface.
+
+    The database is reached through the DatabaseBackend selected by the 'backend'
+    configuration, pyodbc by default (see backends.get_backend).
     """
 
     def __init__(self, **kwargs):
-        try:
-            self.driver = kwargs['driver']
-            self.server = kwargs.get('server')
-            self.database = kwargs['database']
-            self.uid = kwargs['uid']
-            self.pwd = kwargs['pwd']
-            self._connection = None
-            super().__init__(**kwargs)
-        except KeyError as e:
-            logging.error("KeyError : " + str(e))
-            raise ValueError(
-                "driver, server, database, uid, pwd must be given as keyword parameters.")
+        self.backend = get_backend(kwargs)
+        # Errors of the backend's DB-API module
+        self.SEND_ERRORS = self.backend.errors
+        self.driver = kwargs.get('driver')
+        self.server = kwargs.get('server')
+        self.database = kwargs.get('database')
+        self.uid = kwargs.get('uid')
+        self.pwd = kwargs.get('pwd')
+        self.batch_size = int(kwargs.get('batch_size', 1))
+        self.batch_window = kwargs.get('batch_window')
+        self.batch_interval = kwargs.get('batch_interval')
+        self._connection = None
+        self._cursor = None
+        # Messages of the open batch, when and at what message timestamp it began,
+        # and the scheduled send offset of its first message
+        self._batch = []
+        self._batch_started = None
+        self._batch_timestamp = None
+        self._batch_scheduled_ns = None
+        super().__init__(**kwargs)
+        if self.batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        self.batching = self.batch_size > 1
+
+    # SQLSTATEs of deadlocks, timeouts and lost connections, which are worth retrying
+    RETRY_SQLSTATES = ('40001', '40P01', '08S01', '08001', '08004', 'HYT00', 'HYT01')
 
     def open(self):
         """
@@ -143,45 +325,306 @@ class OdbcMocker(MockerInterface):
         """
         try:
             if self._closed:
-                self._connection = pyodbc.connect(driver=self.driver,
-                                                  server=self.server,
-                                                  database=self.database,
-                                                  uid=self.uid,
-                                                  pwd=self.pwd)
+                self._connection = self.backend.connect()
+                self._cursor = self.backend.cursor(self._connection)
                 self._closed = False
-        except:
-            print("POKEMON EXCEPTION!!")
+        except self.SEND_ERRORS as e:
+            logging.error("{0} : {1}".format(e.__class__.__name__, str(e)))
+            print("Failed to Open Database Connection!")
             raise
 
     def close(self):
         """
-        Closes the odbc connection.
+        Commits any open batch and closes the odbc connection.
         """
         if not self._closed and self._connection is not None:
-            self._connection.close()
+            try:
+                self.flush()
+            finally:
+                self._connection.close()
+        self._cursor = None
         self._closed = True
 
-    def send(self, data):
+    def send(self, data, parameters=None, msg=None, scheduled_ns=None):
         """
-        Executes and Commits the given query using an existing connection.
+        Adds the given query to the open batch, using an existing connection and cursor.
+
+        With the default batch_size of 1 every query is executed and committed straight
+        away. Otherwise the batch is executed and committed in one transaction once
+        batch_size queries have been sent, the batch is older than batch_interval
+        seconds, or the batch is flushed.
+
+        data        -   SQL query string.
+        parameters  -   Sequence of query parameters. [Optional]
+                        Consecutive queries with the same text and parameters are
+                        executed together with executemany.
+        msg         -   SqlQueryMessage the query belongs to, written to the
+                        dead-letter file if the batch cannot be committed. [Optional]
+        scheduled_ns    -   scheduled send offset of the message, recorded in the
+                            telemetry of its batch. [Optional]
+
+        Returns the number of rows committed if the batch was flushed, STATUS_PENDING
+        if the query is waiting in the batch, or None if the connection is closed.
         """
         if self._closed:
             logging.debug("Connection is Closed. Ignoring Send Command.")
-            return
-
-        cursor = self._connection.cursor()
-        cursor.execute(data)
+            return None
+
+        if not self._batch:
+            self._batch_started = time.monotonic()
+            self._batch_scheduled_ns = scheduled_ns
+        self._batch.append((msg, data, parameters))
+        if (len(self._batch) >= self.batch_size
+                or (self.batch_interval is not None
+                    and time.monotonic() - self._batch_started >= self.batch_interval)):
+            return self.flush()
+        return STATUS_PENDING
+
+    def _execute_batch(self, batch):
+        """
+        Executes every query of the batch and commits the transaction.
+        Returns the number of rows affected, as far as the driver reports them.
+        """
+        def group_key(entry):
+            return (entry[1], entry[2] is not None)
+
+        row_count = 0
+        for (query, parameterised), entries in itertools.groupby(batch, key=group_key):
+            if not parameterised:
+                for _ in entries:
+                    self._cursor.execute(query)
+                    row_count += self._get_row_count()
+                continue
+            rows = [tuple(parameters) for _, _, parameters in entries]
+            if len(rows) == 1:
+                self._cursor.execute(query, rows[0])
+            else:
+                self._cursor.executemany(query, rows)
+            row_count += self._get_row_count()
         self._connection.commit()
+        return row_count
+
+    def _recover(self, error):
+        """
+        Rolls back the failed transaction before it is retried. Reconnects if the
+        connection was lost.
+        """
+        try:
+            self._connection.rollback()
+        except self.SEND_ERRORS as e:
+            logging.warning("Rollback failed ({0}), reconnecting.".format(str(e)))
+            try:
+                self._connection.close()
+            except self.SEND_ERRORS:
+                pass
+            self._closed = True
+            self.open()
+
+    def _get_row_count(self):
+        # rowcount is -1, or None for some drivers, when the rows are not known
+        rowcount = getattr(self._cursor, 'rowcount', None)
+        return rowcount if isinstance(rowcount, int) and rowcount > 0 else 0
+
+    def flush(self):
+        """
+        Executes and commits the open batch, retrying as configured.
+        If the batch cannot be committed, its messages are written to the dead-letter file.
+        The commit is recorded as one send in the telemetry and metrics, with the number
+        of rows committed and the commit latency.
+        Returns the number of rows committed, or STATUS_ERROR if the batch failed.
+        """
+        if self._closed or not self._batch:
+            return 0
+        batch, self._batch = self._batch, []
+        scheduled_ns, self._batch_scheduled_ns = self._batch_scheduled_ns, None
+        self._batch_timestamp = None
+        started = time.monotonic_ns()
+        try:
+            rows = self.guard.call(self._execute_batch, batch,
+                                   errors=self.SEND_ERRORS, on_retry=self._recover)
+            self.count_delivered(len(batch))
+        except self.SEND_ERRORS as e:
+            logging.error("{0} : {1}".format(e.__class__.__name__, str(e)))
+            print("Database Error! {0} queries were not committed.".format(len(batch)))
+            try:
+                self._connection.rollback()
+            except self.SEND_ERRORS:
+                pass
+            self.undelivered(*(msg for msg, _, _ in batch))
+            rows = STATUS_ERROR
+        msgs = [msg for msg, _, _ in batch if msg is not None]
+        if msgs:
+            self.record(msgs[0], scheduled_ns, started, rows,
+                        sum(len(data.encode("utf-8")) for _, data, _ in batch))
+        return rows
+
+    def is_retryable(self, error):
+        """
+        Deadlocks, timeouts and connection errors are retried.
+        """
+        if self.backend.is_retryable(error):
+            return True
+        return bool(error.args) and str(error.args[0]) in self.RETRY_SQLSTATES
+
+    def idle(self, seconds):
+        """
+        Commits the open batch if the idle time is longer than the batch window.
+        """
+        if seconds > (self.batch_window or 0):
+            self.flush()
 
-    def send_message(self, sql_msg, delay):
+    def send_message(self, sql_msg, delay=0, scheduled_ns=None):
         """
+        Sends the query of the given SqlQueryMessage, after the optional delay.
+        A new batch is started if the message timestamp is more than batch_window
+        seconds after the first message of the open batch.
+        The telemetry records each committed batch, see flush.
         """
-        print('Odbc Mocker Sleeping for {0}s.'.format(delay))
-        time.sleep(delay)
+        if delay:
+            print('Odbc Mocker Sleeping for {0}s.'.format(delay))
+            time.sleep(delay)
         print("Sending Sql Query Message : " + str(sql_msg))
-        self.send(sql_msg.get_query())
+        if self.batching and self.batch_window is not None:
+            timestamp = sql_msg.get_timestamp()
+            if (self._batch_timestamp is not None and
+                    (timestamp - self._batch_timestamp).total_seconds() > self.batch_window):
+                self.flush()
+            if self._batch_timestamp is None:
+                self._batch_timestamp = timestamp
+        self.set_in_flight(sql_msg, 1)
+        try:
+            self.send(sql_msg.get_query(), sql_msg.get_parameters(), msg=sql_msg,
+                      scheduled_ns=scheduled_ns)
+        finally:
+            self.set_in_flight(sql_msg, -1)
+
+    def __str__(self):
+        template = "ODBC Mocker ::: backend - {0} : driver - {1} : server - {2} : " + \
+            " database - {3} : uid - {4} : pwd- {5} : batch size - {6}"
+        return template.format(self.backend, self.driver, self.server, self.database, self.uid,
+                               self.pwd, self.batch_size)
+
+
+class SinkMocker(MockerInterface):
+
+    """
+    Base class of mockers which accept every message without a backend, to measure
+    the cost of the replay itself: parsing, scheduling, timestamp rewriting and
+    serialising the messages.
+    Sends are not printed, and recorded in the telemetry with a status of 0.
+    """
+
+    def __init__(self, **kwargs):
+        self.max_in_flight = int(kwargs.get('max_in_flight', 1))
+        if self.max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.count = 0
+        self.bytes = 0
+        self._opened_ns = None
+        self._lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def open(self):
+        if self._closed:
+            self._opened_ns = time.monotonic_ns()
+            self._closed = False
+        return True
+
+    def close(self):
+        self._closed = True
+
+    def send(self, data, lane=None, scheduled_ns=None):
+        """
+        Accepts the data. Returns False if the mocker is closed.
+        """
+        if self._closed:
+            return False
+        with self._lock:
+            self.count += 1
+            self.bytes += len(data)
+        return True
+
+    def send_message(self, msg, delay=0, scheduled_ns=None):
+        """
+        Serialises the given Message and passes it to send, after the optional delay.
+        """
+        if delay:
+            time.sleep(delay)
+        data = msg.tobytes()
+        started = time.monotonic_ns()
+        if scheduled_ns is None:
+            scheduled_ns = started - self._opened_ns if self._opened_ns is not None else 0
+        self.set_in_flight(msg, 1)
+        try:
+            sent = self.send(data, lane=msg.lane, scheduled_ns=scheduled_ns)
+        finally:
+            self.set_in_flight(msg, -1)
+        if sent:
+            self.count_delivered()
+        self.record(msg, scheduled_ns, started, 0 if sent else STATUS_ERROR, len(data))
+
+
+class NullMocker(SinkMocker):
+
+    """
+    Discards every message, only counting them. Replaying to null mockers measures
+    the throughput of the replay engine alone.
+    """
+
+    def __str__(self):
+        return "Null Mocker ::: messages - {0} : bytes - {1}".format(self.count, self.bytes)
+
+
+class RecordingMocker(SinkMocker):
+
+    """
+    Appends every message, with its scheduled send offset, to a recording file
+    (see recording.MessageRecorder). SfbReplayer.fromfile replays recordings.
+    """
+
+    def __init__(self, **kwargs):
+        try:
+            self.path = kwargs['path']
+        except KeyError as e:
+            logging.error("KeyError : " + str(e))
+            raise ValueError("path must be given as a keyword parameter.")
+        self.recorder = MessageRecorder(self.path, max_delay=kwargs.get('max_delay'))
+        super().__init__(**kwargs)
+
+    def send(self, data, lane=None, scheduled_ns=None):
+        """
+        Appends the data to the recording. Returns False if the mocker is closed.
+        """
+        if not super().send(data):
+            return False
+        self.recorder.write(lane, scheduled_ns if scheduled_ns is not None else 0, data)
+        return True
+
+    def close(self):
+        super().close()
+        self.recorder.close()
 
     def __str__(self):
-        template = "ODBC Mocker ::: driver - {0} : server - {1} : " + \
-            " database - {2} : uid - {3} : pwd- {4}"
-        return template.format(self.driver, self.server, self.database, self.uid, self.pwd)
+        return "Recording Mocker ::: path - {0} : messages - {1} : bytes - {2}".format(
+            self.path, self.count, self.bytes)
+
+
+# Mockers selected by the 'mocker' key of a mocker configuration
+MOCKERS = {'http': SdnMocker,
+           'odbc': OdbcMocker,
+           'null': NullMocker,
+           'record': RecordingMocker}
+
+
+def create_mocker(config, default):
+    """
+    Returns the mocker selected by the 'mocker' key of the configuration, or an
+    instance of the default mocker class if there is none.
+    Raises ValueError for unknown mockers.
+    """
+    name = config.get('mocker')
+    if name is None:
+        return default(**config)
+    if name not in MOCKERS:
+        raise ValueError("mocker must be one of " + ", ".join(sorted(MOCKERS)))
+    return MOCKERS[name](**config)
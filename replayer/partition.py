@@ -0,0 +1,24 @@
+import zlib
+
+
+def get_partition_key(msg):
+    """
+    Returns the ordering key of a SDN message (see SdnMessage.get_ordering_key), so
+    every message a lane keeps in order, e.g. of a conference, is sent by the same
+    worker. Returns None for messages without a key, such as SQL messages.
+    """
+    if msg.lane != 'sdn':
+        return None
+    get_ordering_key = getattr(msg, 'get_ordering_key', None)
+    return get_ordering_key() if get_ordering_key is not None else None
+
+
+def get_partition(msg, count):
+    """
+    Returns the partition (0 to count - 1) of a replay message.
+    Messages without a partition key are all in partition 0, so they keep their order.
+    """
+    key = get_partition_key(msg)
+    if key is None:
+        return 0
+    return zlib.crc32(key.encode("utf-8")) % count
@@ -0,0 +1,279 @@
+from .timeline import ReplayTimeline
+from .timeline import datetime_to_ns
+from .timeline import ns_to_datetime
+from .xmlmessage import XmlMessage
+from array import array
+import datetime as DT
+import json
+import logging
+import mmap
+import struct
+import sys
+
+PLAN_MAGIC = b"SFBPLAN\x01"
+
+# Lane of each message, stored as its index in this tuple
+PLAN_LANES = ("sdn", "sql")
+
+# Placeholder timestamp used to find the TimeStamp field in a serialised message.
+# Every timestamp in a plan is written in the same fixed width UTC format.
+_MARKER_DT = DT.datetime(1111, 11, 11, 11, 11, 11, 111111, tzinfo=DT.timezone.utc)
+_MARKER = XmlMessage.convert_datetime(_MARKER_DT).encode("us-ascii")
+
+_HEADER_LENGTH = struct.Struct("<I")
+# payload offset, payload length, timestamp offset within the payload,
+# length of the JSON message details following the payload, lane
+_RECORD = struct.Struct("<QIIIB")
+
+
+class ReplayPlan():
+
+    """
+    Compiled replay plan of a SfbReplay scenario.
+
+    A plan file holds everything the replayer needs, prepared once by compile :
+    the replay configuration and barriers, the original message timestamps as
+    int64 nanoseconds, and every message pre-serialised to the exact bytes that
+    are sent, with the byte offset of its TimeStamp field.
+
+    File layout :
+        magic | header length (uint32) | JSON header | timestamps (int64 * count)
+        | records | payloads
+
+    Plans are memory mapped when loaded, so loading does not depend on the size
+    of the scenario, and sending only copies the payload and patches the
+    timestamp bytes when the timestamps are updated.
+    """
+
+    def __init__(self, path):
+        """
+        Memory maps the plan file at path.
+        Raises ValueError if the file is not a replay plan.
+        """
+        self.path = path
+        self._file = open(path, mode="rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Replay plan {0} is empty.".format(path))
+        try:
+            if self._mmap[:len(PLAN_MAGIC)] != PLAN_MAGIC:
+                raise ValueError("{0} is not a replay plan.".format(path))
+            pos = len(PLAN_MAGIC)
+            (header_length,) = _HEADER_LENGTH.unpack_from(self._mmap, pos)
+            pos += _HEADER_LENGTH.size
+            header = json.loads(self._mmap[pos:pos + header_length].decode("utf-8"))
+            pos += header_length
+        except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+            self.close()
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Replay plan {0} is corrupt.".format(path))
+        except ValueError:
+            self.close()
+            raise
+
+        self.version = header['version']
+        self.replay_config = header['replay_config']
+        self.barriers = set(header['barriers'])
+        self.count = header['count']
+        self._timestamps_pos = pos
+        self._records_pos = pos + 8 * self.count
+
+    @staticmethod
+    def isplan(path):
+        """
+        Returns True if the file at path is a compiled replay plan.
+        """
+        with open(path, mode="rb") as plan_file:
+            return plan_file.read(len(PLAN_MAGIC)) == PLAN_MAGIC
+
+    @staticmethod
+    def compile(replayer, path):
+        """
+        Writes the messages, configuration and barriers of a SfbReplayer to a
+        replay plan file at path. Returns the number of messages written.
+
+        Message timestamps are normalised to UTC. The messages of the replayer are
+        not modified.
+        """
+        messages = replayer.replay_messages
+        timeline = replayer.timeline
+        header = json.dumps({'version': replayer.sdn_config['version']
+                             if replayer.sdn_config is not None else None,
+                             'replay_config': replayer.replay_config,
+                             'barriers': sorted(replayer.replay_barriers),
+                             'count': len(messages)}).encode("utf-8")
+
+        records = bytearray()
+        payloads = []
+        payload_pos = (len(PLAN_MAGIC) + _HEADER_LENGTH.size + len(header)
+                       + 8 * len(messages) + _RECORD.size * len(messages))
+        for index, msg in enumerate(messages):
+            payload, timestamp_pos = ReplayPlan.serialise(msg)
+            stamp = XmlMessage.convert_datetime(ns_to_datetime(timeline.timestamps[index]))
+            payload[timestamp_pos:timestamp_pos + len(_MARKER)] = stamp.encode("us-ascii")
+            details = json.dumps(ReplayPlan.get_details(msg)).encode("utf-8")
+            records += _RECORD.pack(payload_pos, len(payload), timestamp_pos, len(details),
+                                    PLAN_LANES.index(msg.lane))
+            payloads.append(payload)
+            payloads.append(details)
+            payload_pos += len(payload) + len(details)
+
+        timestamps = array('q', timeline.timestamps)
+        if sys.byteorder != "little":
+            timestamps.byteswap()
+        with open(path, mode="wb") as plan_file:
+            plan_file.write(PLAN_MAGIC)
+            plan_file.write(_HEADER_LENGTH.pack(len(header)))
+            plan_file.write(header)
+            plan_file.write(timestamps.tobytes())
+            plan_file.write(records)
+            for payload in payloads:
+                plan_file.write(payload)
+        return len(messages)
+
+    @staticmethod
+    def serialise(msg):
+        """
+        Returns the serialised message as a bytearray, and the byte offset of its
+        TimeStamp field. The message timestamp is left unchanged.
+        Raises ValueError if the TimeStamp field cannot be located.
+        """
+        timestamp = msg.get_timestamp()
+        msg.set_timestamp(_MARKER_DT)
+        try:
+            payload = bytearray(msg.tobytes())
+        finally:
+            msg.set_timestamp(timestamp)
+        timestamp_pos = payload.find(_MARKER)
+        if timestamp_pos < 0 or payload.find(_MARKER, timestamp_pos + 1) >= 0:
+            raise ValueError("Could not locate the TimeStamp of message : " + str(msg))
+        return payload, timestamp_pos
+
+    @staticmethod
+    def get_details(msg):
+        """
+        Returns a dictionary of the message details the mockers need besides the
+        payload, so they are not extracted from the XML at send time.
+        """
+        if msg.lane == "sql":
+            parameters = msg.get_parameters()
+            return {'query': msg.get_query(),
+                    'parameters': list(parameters) if parameters is not None else None}
+        return {'key': msg.get_ordering_key()}
+
+    def get_timeline(self):
+        """
+        Returns a ReplayTimeline of the original message timestamps.
+        """
+        timestamps = array('q')
+        timestamps.frombytes(self._mmap[self._timestamps_pos:self._records_pos])
+        if sys.byteorder != "little":
+            timestamps.byteswap()
+        return ReplayTimeline(timestamps)
+
+    def get_messages(self):
+        """
+        Returns a list of PlanMessages for every message in the plan.
+        """
+        return [PlanMessage(self, index) for index in range(self.count)]
+
+    def get_record(self, index):
+        """
+        Returns the tuple (payload offset, payload length, timestamp offset,
+        details length, lane) of the message at index.
+        """
+        return _RECORD.unpack_from(self._mmap, self._records_pos + index * _RECORD.size)
+
+    def get_timestamp_ns(self, index):
+        return struct.unpack_from("<q", self._mmap, self._timestamps_pos + 8 * index)[0]
+
+    def read(self, pos, length):
+        return self._mmap[pos:pos + length]
+
+    def close(self):
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exec_type, exec_value, exec_tb):
+        self.close()
+        return False
+
+    def __str__(self):
+        return "ReplayPlan ::: path - {0} : messages - {1} : barriers - {2}".format(
+            self.path, self.count, len(self.barriers))
+
+
+class PlanMessage():
+
+    """
+    Replay message read from a ReplayPlan.
+
+    Provides the message interface the mockers and replayer use, without parsing
+    any XML. The payload is only copied when a new timestamp has been set.
+    """
+
+    __slots__ = ('plan', 'index', 'lane', '_payload_pos', '_payload_length',
+                 '_timestamp_pos', '_details_length', '_details', '_timestamp')
+
+    def __init__(self, plan, index):
+        self.plan = plan
+        self.index = index
+        (self._payload_pos, self._payload_length, self._timestamp_pos,
+         self._details_length, lane) = plan.get_record(index)
+        self.lane = PLAN_LANES[lane]
+        self._details = None
+        self._timestamp = None
+
+    def get_timestamp(self):
+        if self._timestamp is not None:
+            return self._timestamp
+        return ns_to_datetime(self.plan.get_timestamp_ns(self.index))
+
+    def set_timestamp(self, timestamp_dt):
+        """
+        Sets the timestamp sent with the message. Must be a datetime with a utcoffset.
+        """
+        # Validates the offset, and keeps the plan timestamps fixed width
+        self._timestamp = ns_to_datetime(datetime_to_ns(timestamp_dt))
+
+    def tobytes(self):
+        """
+        Returns the serialised message, with the timestamp patched in if one was set.
+        """
+        payload = self.plan.read(self._payload_pos, self._payload_length)
+        if self._timestamp is None:
+            return payload
+        payload = bytearray(payload)
+        pos = self._timestamp_pos
+        payload[pos:pos + len(_MARKER)] = XmlMessage.convert_datetime(
+            self._timestamp).encode("us-ascii")
+        return bytes(payload)
+
+    def tostring(self, encoding="us-ascii"):
+        return self.tobytes().decode(encoding)
+
+    def get_details(self):
+        if self._details is None:
+            self._details = json.loads(self.plan.read(
+                self._payload_pos + self._payload_length, self._details_length).decode("utf-8"))
+        return self._details
+
+    def get_ordering_key(self):
+        return self.get_details().get('key')
+
+    def get_query(self):
+        return self.get_details().get('query')
+
+    def get_parameters(self):
+        parameters = self.get_details().get('parameters')
+        return tuple(parameters) if parameters is not None else None
+
+    def __str__(self):
+        return "<PlanMessage object : Lane - {0} : Timestamp - {1}>".format(
+            self.lane, str(self.get_timestamp()))
@@ -0,0 +1,141 @@
+from .resilience import DEAD_LETTER_NS
+from .telemetry import LANES
+import json
+import logging
+import struct
+import threading
+
+RECORDING_MAGIC = b"SFBREC\x01\x00"
+
+_HEADER_LENGTH = struct.Struct("<I")
+# scheduled send offset (ns), lane, payload length
+_RECORD = struct.Struct("<qBI")
+
+
+class MessageRecorder():
+
+    """
+    Appends the payloads of sent messages to a recording file.
+
+    File layout :
+        magic | header length (uint32) | JSON header | records
+    where every record is the scheduled send offset (int64 nanoseconds), the lane
+    and the payload length (uint32), followed by the payload.
+
+    The file is only created when the first message is written, so the recorder can
+    be shared by the mockers of both lanes. Thread-safe.
+    """
+
+    def __init__(self, path, max_delay=None):
+        """
+        path        -   Path of the recording file.
+        max_delay   -   MaxDelay of the scenario the recording is replayed as.
+        """
+        self.path = path
+        self.max_delay = max_delay
+        self.count = 0
+        self.bytes = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, lane, scheduled_ns, payload):
+        """
+        Appends the payload of a message sent at scheduled_ns nanoseconds from the
+        start of the replay.
+        """
+        record = _RECORD.pack(scheduled_ns, LANES.index(lane), len(payload))
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, mode="wb")
+                header = json.dumps({'max_delay': self.max_delay}).encode("utf-8")
+                self._file.write(RECORDING_MAGIC)
+                self._file.write(_HEADER_LENGTH.pack(len(header)))
+                self._file.write(header)
+            self._file.write(record)
+            self._file.write(payload)
+            self.count += 1
+            self.bytes += len(payload)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __str__(self):
+        return "MessageRecorder ::: path - {0} : messages - {1}".format(self.path, self.count)
+
+
+class MessageRecording():
+
+    """
+    Reads a recording written by a MessageRecorder.
+    """
+
+    def __init__(self, path):
+        """
+        Reads the header of the recording at path.
+        Raises ValueError if the file is not a recording.
+        """
+        self.path = path
+        with open(path, mode="rb") as infile:
+            if infile.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise ValueError("{0} is not a message recording.".format(path))
+            try:
+                (header_length,) = _HEADER_LENGTH.unpack(infile.read(_HEADER_LENGTH.size))
+                header = json.loads(infile.read(header_length).decode("utf-8"))
+            except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+                logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+                raise ValueError("Message recording {0} is corrupt.".format(path))
+            self._records_pos = infile.tell()
+        self.max_delay = header.get('max_delay')
+
+    @staticmethod
+    def isrecording(path):
+        """
+        Returns True if the file at path is a message recording.
+        """
+        with open(path, mode="rb") as infile:
+            return infile.read(len(RECORDING_MAGIC)) == RECORDING_MAGIC
+
+    def records(self):
+        """
+        Yields a (scheduled_ns, lane, payload) tuple for every recorded message,
+        in the order they were written.
+        Raises ValueError if the recording is truncated.
+        """
+        with open(self.path, mode="rb") as infile:
+            infile.seek(self._records_pos)
+            while True:
+                data = infile.read(_RECORD.size)
+                if not data:
+                    return
+                if len(data) < _RECORD.size:
+                    raise ValueError("Message recording {0} is truncated.".format(self.path))
+                scheduled_ns, lane, length = _RECORD.unpack(data)
+                payload = infile.read(length)
+                if len(payload) < length:
+                    raise ValueError("Message recording {0} is truncated.".format(self.path))
+                yield scheduled_ns, LANES[lane], payload
+
+    def toscenario(self):
+        """
+        Returns the recorded messages as the bytes of a SfbReplay scenario, in the
+        order they were scheduled. The scenario is replayed in real time.
+        """
+        records = sorted(self.records(), key=lambda record: record[0])
+        parts = [('<?xml version="1.0" encoding="utf-8"?>\n'
+                  '<SfbReplay xmlns="{0}">\n'
+                  '<Description>Recorded messages.</Description>\n'
+                  '<ReplayConfiguration>\n'
+                  '    <MaxDelay>{1}</MaxDelay>\n'
+                  '    <RealTime>true</RealTime>\n'
+                  '    <CurrentTime>false</CurrentTime>\n'
+                  '</ReplayConfiguration>\n'
+                  '<ReplayMessages>\n').format(DEAD_LETTER_NS,
+                                               self.max_delay or 0).encode("utf-8")]
+        # Payloads end with the whitespace which followed the element, so are
+        # serialised unchanged when replayed
+        parts.extend(payload for _, _, payload in records)
+        parts.append(b"</ReplayMessages>\n</SfbReplay>\n")
+        return b"".join(parts)
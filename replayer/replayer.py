@@ -1,12 +1,43 @@
 from .mocker import SdnMocker
 from .mocker import OdbcMocker
+from .mocker import RecordingMocker
+from .mocker import create_mocker
 from .xmlmessage import SdnMessage
 from .xmlmessage import SqlQueryMessage
+from .xmlmessage import SerialisedMessage
+from .timeline import ReplayTimeline
+from .timeline import StreamingTimeline
+from .stream import ScenarioStream
+from .loadgen import LoadGenerator
+from .loadshape import LoadShape
+from .adaptive import AdaptiveRate
+from .soak import SoakMonitor
+from .telemetry import TelemetrySink
+from .metrics import LATENESS
+from .metrics import RETRIES
+from .partition import get_partition
+from .plan import ReplayPlan
+from .recording import MessageRecording
+from .timeline import datetime_to_ns
+from .timeline import NS_PER_SECOND
+from .timeline import scale_delay
+from .scheduler import ReplayScheduler
+from .engine import AsyncReplayEngine
+from .resilience import DeadLetterWriter
+from .validation import IncrementalValidator
+from .validation import ValidationCache
+from .validation import get_file_digest
+from .validation import get_schema
+from .validation import get_schema_version
 from lxml import etree as ET
+from array import array
 import logging
 import logging.config
 import datetime as DT
-import os
+import functools
+import hashlib
+import itertools
+import time
 
 
 class SfbReplayer():
@@ -17,11 +48,20 @@ class SfbReplayer():
 
     REPLAY_CONFIG_TAG = "ReplayConfiguration"
     REPLAY_MSGS_TAG = "ReplayMessages"
+    REPLAY_BARRIER_TAG = "ReplayBarrier"
 
     def __init__(self, **kwargs):
-        self.replay_scenario = kwargs['etree']
+        # A scenario is given as an etree, a compiled ReplayPlan or a ScenarioStream
+        self.plan = kwargs.get('plan')
+        self.stream = kwargs.get('stream')
+        if self.stream is not None:
+            self.replay_scenario = self.stream.read_configuration()
+        else:
+            self.replay_scenario = kwargs['etree'] if self.plan is None else None
         # Set the default namespace for the replay scenario xml
-        self.default_ns = self.replay_scenario.getroot().nsmap.get(None, '')
+        self.default_ns = ''
+        if self.replay_scenario is not None:
+            self.default_ns = self.replay_scenario.getroot().nsmap.get(None, '')
         if self.default_ns != '':
             self.default_ns = "{{{0}}}".format(self.default_ns)
         # CSet the configuration for the mockers and create them
@@ -29,11 +69,77 @@ class SfbReplayer():
         self.odbc_config = kwargs.get('odbc_config', None)
         self.configure_mockers()
         # Validate Mock Test against the XML Schema
+        # Plans were validated when they were compiled, against the schema of their SDN version
+        self.validator = None
+        self.incremental_validation = kwargs.get('incremental_validation', False)
+        self.validation_cache = kwargs.get('validation_cache')
+        if isinstance(self.validation_cache, str):
+            self.validation_cache = ValidationCache(self.validation_cache)
         if kwargs.get('validate', True):
-            self.validate()
+            if self.plan is None:
+                self.validate()
+            elif get_schema_version(self.plan.version) != self.get_schema_version():
+                raise ValueError("Replay plan {0} was compiled for SDN version {1}, and cannot "
+                                 "be replayed with SDN version {2}.".format(
+                                     self.plan.path, self.plan.version,
+                                     self.sdn_config['version'] if self.sdn_config else None))
 
-        self.replay_config = self.extract_replay_config()
-        self.replay_messages = self.extract_replay_messages()
+        if self.plan is not None:
+            self.replay_config = dict(self.plan.replay_config)
+        else:
+            self.replay_config = self.extract_replay_config()
+        # Timing modes given as keyword parameters override the scenario
+        if kwargs.get('speed') is not None:
+            self.replay_config['speed'] = kwargs['speed']
+        if kwargs.get('max_rate') is not None:
+            self.replay_config['max_rate'] = kwargs['max_rate']
+        if self.replay_config['speed'] is not None and self.replay_config['speed'] <= 0:
+            raise ValueError("Speed must be greater than 0.")
+        self.configure_load_shape(kwargs.get('load_shape'), burst=kwargs.get('load_burst'),
+                                  interval=kwargs.get('load_interval'))
+        self.configure_adaptive(kwargs.get('adaptive'))
+        if self.plan is not None:
+            self.replay_messages = self.plan.get_messages()
+            self.replay_barriers = self.plan.barriers
+            self.timeline = self.plan.get_timeline()
+        elif self.stream is not None:
+            # Messages, barriers and timing are read as the replay advances
+            self.replay_messages = self.stream
+            self.replay_barriers = self.stream.barriers
+            self.timeline = StreamingTimeline(max_delay=self.replay_config['max_delay'],
+                                              realtime=self.replay_config['realtime'],
+                                              speed=self.replay_config['speed'] or 1)
+        else:
+            self.replay_messages = self.extract_replay_messages()
+            self.replay_barriers = self.extract_replay_barriers()
+            self.timeline = ReplayTimeline.frommessages(self.replay_messages)
+        self.load_generator = None
+        if kwargs.get('clones'):
+            self.configure_load_generator(kwargs['clones'],
+                                          interval=kwargs.get('arrival_interval', 1),
+                                          arrival=kwargs.get('arrival', 'fixed'),
+                                          seed=kwargs.get('seed', 0))
+        # (index, count) to only replay one of count partitions, see ReplayCoordinator
+        self.partition = kwargs.get('partition')
+        if self.partition is not None:
+            self.configure_partition(*self.partition)
+        self.scheduler = ReplayScheduler()
+        # Messages given to the mockers, one per mocker, and the mockers which
+        # failed to open, in the last replay
+        self.scheduled = 0
+        self.unopened = []
+        self.soak_monitor = None
+        if kwargs.get('loop') or kwargs.get('duration') is not None:
+            self.configure_soak(duration=kwargs.get('duration'),
+                                stats_interval=kwargs.get('stats_interval', 60),
+                                seed=kwargs.get('seed', 0))
+        self.configure_dead_letter(kwargs.get('dead_letter'))
+        for mocker in self.mockers:
+            if isinstance(mocker, RecordingMocker) and mocker.recorder.max_delay is None:
+                mocker.recorder.max_delay = self.replay_config['max_delay']
+        self.configure_telemetry(kwargs.get('telemetry'),
+                                 format=kwargs.get('telemetry_format', 'csv'))
+        self.configure_metrics(kwargs.get('metrics'))
 
         if self.replay_config['currenttime']:
             self.update_timestamps()
@@ -55,8 +161,29 @@ class SfbReplayer():
     def fromfile(cls, replay_scenario_path, **kwargs):
         """
         Parses the replay scenario as a string.
+        Compiled replay plans (see compile) are memory mapped instead of parsed, until
+        the mockers are closed at the end of the replay.
+        Recordings of a RecordingMocker are replayed as a real time scenario.
         Raises ParseError if invalid XML is encountered.
+
+        lazy    -   Stream the replay messages from the file as the replay advances,
+                    instead of loading the whole scenario. [Optional]
+                    The scenario is validated as it is read.
         """
+        if ReplayPlan.isplan(replay_scenario_path):
+            kwargs.pop('lazy', None)
+            plan = ReplayPlan(replay_scenario_path)
+            try:
+                return cls(plan=plan, **kwargs)
+            except Exception:
+                plan.close()
+                raise
+        if MessageRecording.isrecording(replay_scenario_path):
+            kwargs.pop('lazy', None)
+            recording = MessageRecording(replay_scenario_path)
+            return cls.fromstring(recording.toscenario(), **kwargs)
+        if kwargs.pop('lazy', False):
+            return cls(stream=ScenarioStream(replay_scenario_path), **kwargs)
         try:
             return cls(etree=ET.parse(replay_scenario_path), **kwargs)
         except ET.ParseError as e:
@@ -64,59 +191,491 @@ class SfbReplayer():
             raise ValueError("Invalid Sfb Replay Test XML Format.")
 
     def configure_mockers(self):
+        """
+        Creates a mocker for the SDN and ODBC configurations. Either configuration
+        may be a list, to mirror every message of the lane to several receivers or
+        databases. sdn_mocker and odbc_mocker are the first mocker of each lane.
+        """
+        self.sdn_configs = self.get_configs(self.sdn_config)
+        self.odbc_configs = self.get_configs(self.odbc_config)
         # default to SDN version 2.1.1 if not defined
-        if self.sdn_config is not None:
-            self.sdn_config['version'] = self.sdn_config.get('version', '2.1.1')
+        for config in self.sdn_configs:
+            config['version'] = config.get('version', '2.1.1')
+        self.sdn_config = self.sdn_configs[0] if self.sdn_configs else None
+        self.odbc_config = self.odbc_configs[0] if self.odbc_configs else None
+
+        # Configure the Mockers, selected by the 'mocker' key of their configuration
+        self.sdn_mockers = self.create_mockers(self.sdn_configs, SdnMocker, SdnMessage.lane)
+        self.odbc_mockers = self.create_mockers(self.odbc_configs, OdbcMocker,
+                                                SqlQueryMessage.lane)
+        names = [mocker.name for mocker in self.mockers]
+        if len(set(names)) != len(names):
+            raise ValueError("Mocker names must be unique.")
+        # Mockers recording to the same file share it
+        recorders = {}
+        for mocker in self.mockers:
+            if isinstance(mocker, RecordingMocker):
+                mocker.recorder = recorders.setdefault(mocker.path, mocker.recorder)
+
+    @property
+    def sdn_mocker(self):
+        """
+        The first mocker of the SDN messages, or None.
+        """
+        return self.sdn_mockers[0] if self.sdn_mockers else None
+
+    @sdn_mocker.setter
+    def sdn_mocker(self, mocker):
+        self.sdn_mockers = [mocker] if mocker is not None else []
+
+    @property
+    def odbc_mocker(self):
+        """
+        The first mocker of the SQL messages, or None.
+        """
+        return self.odbc_mockers[0] if self.odbc_mockers else None
+
+    @odbc_mocker.setter
+    def odbc_mocker(self, mocker):
+        self.odbc_mockers = [mocker] if mocker is not None else []
+
+    @property
+    def mockers(self):
+        """
+        List of every mocker, SDN mockers first.
+        """
+        return self.sdn_mockers + self.odbc_mockers
+
+    @staticmethod
+    def get_configs(config):
+        """
+        Returns the list of mocker configurations of a configuration or list of them.
+        """
+        if not config:
+            return []
+        if isinstance(config, dict):
+            return [config]
+        return [item for item in config if item]
+
+    @staticmethod
+    def create_mockers(configs, default, lane):
+        """
+        Returns a mocker for each configuration. Mockers without a name are named
+        after the lane, numbered if there are several.
+        """
+        mockers = []
+        for index, config in enumerate(configs):
+            mocker = create_mocker(config, default)
+            if mocker.name is None:
+                mocker.name = lane if len(configs) == 1 else "{0}-{1}".format(lane, index + 1)
+            mockers.append(mocker)
+        return mockers
+
+    def get_mocker(self, msg):
+        """
+        Returns the first mocker that sends the given replay message.
+        Raises ValueError for unknown message types.
+        """
+        mockers = self.get_mockers(msg)
+        return mockers[0] if mockers else None
+
+    def get_mockers(self, msg):
+        """
+        Returns the list of mockers that the given replay message is mirrored to.
+        Raises ValueError for unknown message types.
+        """
+        lane = getattr(msg, 'lane', None)
+        if lane == SdnMessage.lane:
+            return self.sdn_mockers
+        elif lane == SqlQueryMessage.lane:
+            return self.odbc_mockers
+        raise ValueError("Unrecognised Replay Message instance.")
+
+    def compile(self, plan_path):
+        """
+        Writes the scenario to a compiled replay plan at plan_path, which fromfile
+        loads without parsing or validating any XML.
+        Returns the number of messages written.
+        """
+        if isinstance(self.timeline, StreamingTimeline):
+            raise ValueError("Streamed or generated scenarios cannot be compiled.")
+        return ReplayPlan.compile(self, plan_path)
+
+    def open_mockers(self):
+        """
+        Opens every mocker at the start of a replay. Mockers which fail to open are
+        kept in unopened, see get_stats.
+        """
+        self.scheduled = 0
+        self.unopened = []
+        for mocker in self.mockers:
+            if mocker.open() is False:
+                logging.error("Failed to open {0}.".format(mocker.__class__.__name__))
+                self.unopened.append(mocker)
+
+    def idle_mockers(self, wait_ns):
+        """
+        Lets batching mockers flush before a wait of wait_ns nanoseconds.
+        """
+        if wait_ns <= 0:
+            return
+        for mocker in self.mockers:
+            if mocker.batching:
+                mocker.idle(wait_ns / NS_PER_SECOND)
+
+    def flush_mockers(self):
+        """
+        Commits the open batches of batching mockers, e.g. at a ReplayBarrier.
+        """
+        for mocker in self.mockers:
+            if mocker.batching:
+                mocker.flush()
+
+    def configure_load_generator(self, clones, interval=1, arrival='fixed', seed=0):
+        """
+        Replaces the replay messages with the messages of a number of clones of the
+        scenario, which are generated as the replay advances. See LoadGenerator.
+        Replay barriers are ignored in load generation.
+        """
+        if self.plan is not None or self.stream is not None:
+            raise ValueError("Load generation requires a scenario loaded from XML.")
+        self.load_generator = LoadGenerator(self.replay_messages, self.timeline.timestamps,
+                                            clones, interval=interval, arrival=arrival,
+                                            seed=seed)
+        self.replay_messages = self.load_generator
+        self.replay_barriers = set()
+        self.timeline = StreamingTimeline(max_delay=self.replay_config['max_delay'],
+                                          realtime=self.replay_config['realtime'],
+                                          speed=self.replay_config['speed'] or 1)
+
+    def configure_soak(self, duration=None, stats_interval=60, seed=0):
+        """
+        Replays the scenario in a loop, until duration seconds have passed or the
+        replay is interrupted if duration is None.
+
+        Each iteration follows straight on from the last. Its timestamps are updated
+        to the current time, and its call, conference and dialog ids are rewritten
+        to new values (see LoadGenerator), so every iteration is seen as new calls.
+        Messages of each iteration are copied from the scenario as they are sent, so
+        memory does not grow with the number of iterations.
+        Rolling throughput and error statistics are printed every stats_interval seconds.
+        """
+        if self.plan is not None or self.stream is not None or self.load_generator is not None:
+            raise ValueError("Soak mode requires a scenario loaded from XML, without clones.")
+        if duration is not None and duration <= 0:
+            raise ValueError("Soak duration must be greater than 0.")
+        self.soak_duration = duration
+        self.soak_ids = LoadGenerator(self.replay_messages, self.timeline.timestamps, 1,
+                                      seed=seed)
+        self.soak_monitor = SoakMonitor(self.scheduler, self.mockers,
+                                        interval=stats_interval,
+                                        jitter=self.measures_jitter())
+
+    def configure_partition(self, index, count):
+        """
+        Only replays the messages in partition index of count (see get_partition),
+        with the timing of the whole scenario. Load generation clones are
+        partitioned by clone number instead.
+        """
+        if count < 1 or not 0 <= index < count:
+            raise ValueError("Invalid partition {0} of {1}.".format(index, count))
+        self.partition = (index, count)
+        if self.load_shape is not None and count > 1:
+            # Every partition carries its share of the target rate
+            self.load_shape = self.load_shape.scaled(1 / count)
+        if self.load_generator is not None:
+            self.load_generator.partition = self.partition
+
+    def configure_load_shape(self, load_shape=None, burst=None, interval=None):
+        """
+        Paces the replay by a load shape (see LoadShape) instead of the timing of the
+        scenario. load_shape is a load shape string (see LoadShape.parse) or a
+        load_shape configuration dictionary, and overrides the LoadShape element
+        of the scenario. burst and interval override those of the load shape.
+        """
+        if isinstance(load_shape, str):
+            load_shape = {'stages': LoadShape.parse(load_shape)}
+        if load_shape is not None:
+            self.replay_config['load_shape'] = dict(load_shape)
+        config = self.replay_config.get('load_shape')
+        if config is not None:
+            if burst is not None:
+                config['burst'] = burst
+            if interval is not None:
+                config['interval'] = interval
+        self.load_shape = LoadShape.fromconfig(config)
+
+    def configure_adaptive(self, config=None):
+        """
+        Paces the replay by an AdaptiveRate controller, fed with the latency of the
+        SDN mockers, to find the highest rate the receiver sustains. config is a
+        dictionary of the AdaptiveRate keyword parameters, including target_latency.
+        No controller is used if config is None.
+        """
+        self.adaptive = AdaptiveRate.fromconfig(config)
+        if self.adaptive is not None and self.load_shape is not None:
+            raise ValueError("A replay cannot have both a load shape and an adaptive rate.")
+        for mocker in self.sdn_mockers:
+            mocker.adaptive = self.adaptive
 
-        # Configure the Mockers
-        self.sdn_mocker = SdnMocker(**self.sdn_config) if self.sdn_config else None
-        self.odbc_mocker = OdbcMocker(**self.odbc_config) if self.odbc_config else None
+    def get_pacer(self):
+        """
+        Returns the LoadShape or AdaptiveRate pacing the replay, or None if the replay
+        follows the timing of the scenario.
+        """
+        return self.load_shape if self.load_shape is not None else self.adaptive
+
+    def measures_jitter(self):
+        """
+        Returns False in MaxRate mode, where every message is due at the start of the
+        replay and the lateness of a send is only the time elapsed. Paced replays are
+        measured against the send times given by the load shape or adaptive rate.
+        """
+        return not self.replay_config['max_rate'] or self.get_pacer() is not None
+
+    def configure_dead_letter(self, path):
+        """
+        Writes undelivered messages from every mocker to a SfbReplay scenario at path.
+        No dead-letter file is written if path is None.
+        """
+        self.dead_letter = None
+        if path is not None:
+            self.dead_letter = DeadLetterWriter(path, max_delay=self.replay_config['max_delay'])
+        for mocker in self.mockers:
+            mocker.dead_letter = self.dead_letter
+
+    def configure_telemetry(self, path=None, format='csv'):
+        """
+        Records the timing, status and size of every send. The records are written to
+        a telemetry log at path in the given format ('csv', 'jsonl' or 'binary'), and
+        a latency summary of each mocker is printed after the replay.
+        No telemetry is recorded if path is None.
+        """
+        self.telemetry = None
+        if path is not None:
+            self.telemetry = TelemetrySink(path, format=format,
+                                           targets=[mocker.name for mocker in self.mockers])
+        for mocker in self.mockers:
+            mocker.telemetry = self.telemetry
+
+    def configure_metrics(self, metrics=None):
+        """
+        Updates the given ReplayMetrics instance as messages are sent, e.g. to be
+        served by a MetricsServer. No metrics are kept if None.
+        """
+        self.metrics = metrics
+        for mocker in self.mockers:
+            mocker.metrics = metrics
+        if metrics is not None:
+            metrics.add_collector(RETRIES, self.get_retries)
+
+    def get_retries(self):
+        """
+        Returns a dictionary of the number of send retries of each mocker.
+        """
+        return {mocker.name: mocker.guard.retries for mocker in self.mockers}
+
+    def record_lateness(self, lateness):
+        if self.metrics is not None:
+            self.metrics.observe(LATENESS, lateness)
 
-    def run(self):
+    def record_sent(self, mocker):
+        """
+        Counts a completed send of the mocker towards the achieved load shape rate.
+        """
+        if self.load_shape is not None:
+            self.load_shape.record(mocker.name, self.scheduler.elapsed())
+
+    def start_telemetry(self):
+        """
+        Starts the telemetry clock at the start of the schedule.
+        """
+        if self.telemetry is not None:
+            self.telemetry.start(self.scheduler.start_ns)
+
+    def close_mockers(self):
+        try:
+            for mocker in self.mockers:
+                mocker.close()
+        finally:
+            if self.dead_letter is not None:
+                self.dead_letter.close()
+            if self.telemetry is not None:
+                self.telemetry.close()
+            if self.plan is not None:
+                self.plan.close()
+
+    def get_start_ns(self, start_time=None):
+        """
+        Returns the time.monotonic_ns value of a wall clock start_time (seconds since
+        the epoch), or None to start now. Rebases the timestamps to start_time if
+        the scenario uses the current time.
+        """
+        if start_time is None:
+            return None
+        start_ns = int(start_time * NS_PER_SECOND)
+        if self.replay_config['currenttime'] and self.soak_monitor is None:
+            self.update_timestamps(start_ns)
+        return time.monotonic_ns() + start_ns - time.time_ns()
+
+    def run(self, start_time=None):
+        """
+        Replays the scenario.
+
+        start_time  -   wall clock time (seconds since the epoch) the replay starts at,
+                        e.g. shared by several workers. Defaults to now. [Optional]
+        """
         try:
-            if self.sdn_mocker is not None:
-                self.sdn_mocker.open()
-            if self.odbc_config is not None:
-                self.odbc_mocker.open()
-
-            # Send the messages using appropriate mocker and intervals
-            prev_timestamp = None
-            for msg in self.replay_messages:
-                mocker = None
-                if isinstance(msg, SdnMessage):
-                    mocker = self.sdn_mocker
-                elif isinstance(msg, SqlQueryMessage):
-                    mocker = self.odbc_mocker
-                else:
-                    raise ValueError("Unrecognised Replay Message instance.")
-
-                delay = self.calculate_delay(msg.get_timestamp(),
-                                             prev_timestamp)
-                mocker.send_message(msg, delay)
-                prev_timestamp = msg.get_timestamp()
+            self.open_mockers()
+
+            # Send the messages at their absolute offsets from the start of the replay
+            schedule = self.schedule()
+            self.scheduler.start(self.get_start_ns(start_time))
+            self.start_telemetry()
+            for index, msg, offset in schedule:
+                mockers = self.get_mockers(msg)
+                if index in self.replay_barriers:
+                    logging.debug("Replay barrier before message {0}.".format(index))
+                    self.flush_mockers()
+                self.idle_mockers(offset - self.scheduler.elapsed())
+                self.record_lateness(self.scheduler.wait_until(offset))
+                self.write_timestamp(index, msg)
+                if len(mockers) > 1:
+                    msg = SerialisedMessage(msg)
+                self.scheduled += len(mockers)
+                for mocker in mockers:
+                    mocker.send_message(msg, scheduled_ns=offset)
+                    self.record_sent(mocker)
+
+            self.print_reports()
+        finally:
+            self.close_mockers()
 
+    def run_async(self, start_time=None):
+        """
+        Replays the scenario with the asyncio engine. SDN and ODBC messages share the
+        timeline but are sent in independent lanes, so a slow backend does not delay
+        the other. ReplayBarrier elements in the scenario synchronise the lanes.
+        Takes the same start_time as run.
+        """
+        try:
+            self.open_mockers()
+            AsyncReplayEngine(self).run(start_ns=self.get_start_ns(start_time))
+            self.print_reports()
         finally:
-            if self.sdn_mocker is not None:
-                self.sdn_mocker.close()
-            if self.odbc_mocker is not None:
-                self.odbc_mocker.close()
+            self.close_mockers()
+
+    def print_reports(self):
+        if self.soak_monitor is None:
+            if self.measures_jitter():
+                print(self.scheduler.report())
+        else:
+            print(self.soak_monitor.report())
+            if self.soak_monitor.jitter:
+                print(self.scheduler.report(self.soak_monitor.jitter_summary()))
+        if self.load_shape is not None:
+            self.load_shape.finish(self.scheduler.elapsed())
+            print(self.load_shape.report())
+        if self.adaptive is not None:
+            self.adaptive.finish(self.scheduler.elapsed())
+            print(self.adaptive.report())
+        if self.telemetry is not None:
+            print(self.telemetry.report())
+        for mocker in self.sdn_mockers:
+            compressor = getattr(mocker, 'compressor', None)
+            if compressor is not None and compressor.ratio() is not None:
+                print("Compression {0} ::: {1} : bytes - {2} : compressed - {3} "
+                      "({4:.1%})".format(mocker.name, compressor, compressor.bytes_in,
+                                         compressor.bytes_out, compressor.ratio()))
+
+    def get_stats(self):
+        """
+        Returns a dictionary of the send statistics of the last replay.
+
+        Returned keys - values (types)
+
+        sent        -   number of messages sent (int)
+        failures    -   number of messages which could not be delivered (int)
+        scheduled   -   number of messages given to the mockers, counted once for
+                        every mocker a message is sent to (int)
+        delivered   -   number of messages the mockers delivered (int)
+        unopened    -   number of mockers which failed to open (int)
+        jitter      -   send lateness summary, see ReplayScheduler.jitter_summary, or
+                        None in MaxRate mode (dict)
+        """
+        sent = len(self.scheduler.lateness)
+        jitter = self.scheduler.jitter_summary()
+        if self.soak_monitor is not None:
+            sent = self.soak_monitor.sent
+            jitter = self.soak_monitor.jitter_summary()
+        if not self.measures_jitter():
+            jitter = None
+        return {'sent': sent,
+                'failures': sum(mocker.failures for mocker in self.mockers),
+                'scheduled': self.scheduled,
+                'delivered': sum(mocker.delivered for mocker in self.mockers),
+                'unopened': len(self.unopened),
+                'jitter': jitter}
+
+    def get_schema_version(self):
+        """
+        Returns the schema version (C or D) for the configured SDN version.
+        """
+        return get_schema_version(self.sdn_config['version']
+                                  if self.sdn_config is not None else None)
+
+    def get_schema(self):
+        """
+        Returns the XMLSchema for the configured SDN version.
+        The schema is only compiled once per process.
+        """
+        return get_schema(self.get_schema_version())
+
+    def get_scenario_digest(self):
+        """
+        Returns a sha256 hex digest of the replay scenario.
+        """
+        if self.stream is not None:
+            return get_file_digest(self.stream.path)
+        return hashlib.sha256(ET.tostring(self.replay_scenario)).hexdigest()
 
     def validate(self):
-        # Use correct schema for SDN version
-        # no SDN or SDN version 2.1.1 use schema C
-        schema_file = "SfbReplay.Schema.C.xsd"
-        if (self.sdn_config is not None
-                and self.sdn_config['version'] == '2.2'):
-            schema_file = "SfbReplay.Schema.D.xsd"
-        schema_path = os.path.join(os.path.dirname(__file__), 'schemas/' + schema_file)
-        schema_doc = ET.parse(schema_path)
-        schema = ET.XMLSchema(schema_doc)
+        """
+        Validates the scenario against the schema of the configured SDN version.
+        Raises ValueError if the scenario is invalid.
+
+        Scenarios found in the validation cache are not validated again.
+        Streamed scenarios are validated as they are read, and with incremental
+        validation the messages are validated as the replay reaches them.
+        """
+        on_valid = None
+        if self.validation_cache is not None:
+            key = ValidationCache.get_key(self.get_scenario_digest(), self.get_schema_version())
+            if key in self.validation_cache:
+                logging.info("Scenario found in the validation cache, skipping validation.")
+                return
+            on_valid = functools.partial(self.validation_cache.add, key)
+
+        schema = self.get_schema()
+
+        if self.stream is not None:
+            self.stream.schema = schema
+            self.stream.on_valid = on_valid
+            return
+        if self.incremental_validation:
+            self.validator = IncrementalValidator(
+                schema, self.replay_scenario,
+                "{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_MSGS_TAG))
+            self.validator.on_valid = on_valid
+            return
         try:
             schema.assertValid(self.replay_scenario)
         except ET.DocumentInvalid as e:
             logging.error("Document Invalid Error: " + str(e))
             raise ValueError(
                 "Failed SfbReplayer Test Validation. Check the SDN Version or error log.")
+        if on_valid is not None:
+            on_valid()
 
     def extract_replay_config(self):
         """
@@ -128,6 +687,9 @@ class SfbReplayer():
         max_delay   -   (int)
         realtime    -   (bool)
         currenttime -   (bool)
+        speed       -   (float)
+        max_rate    -   (bool)
+        load_shape  -   stages, burst and interval, see LoadShape.fromconfig (dict)
         """
         def str_to_bool(s):
             try:
@@ -144,23 +706,61 @@ class SfbReplayer():
                 logging.error(
                     "ValueError: String to int conversion failed.")
                 raise
+
+        def str_to_float(s):
+            try:
+                return float(s) if s is not None else None
+            except ValueError:
+                logging.error(
+                    "ValueError: String to float conversion failed.")
+                raise
         replay_config_elem = self.replay_scenario.find(
             "./{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_CONFIG_TAG))
 
         (max_delay, realtime, currenttime) = (None, None, None)
+        (speed, max_rate, load_shape) = (None, None, None)
         if replay_config_elem is not None:
             max_delay = replay_config_elem.findtext("./{0}MaxDelay".format(self.default_ns))
             realtime = replay_config_elem.findtext("./{0}RealTime".format(self.default_ns))
             currenttime = replay_config_elem.findtext("./{0}CurrentTime".format(self.default_ns))
+            speed = replay_config_elem.findtext("./{0}Speed".format(self.default_ns))
+            max_rate = replay_config_elem.findtext("./{0}MaxRate".format(self.default_ns))
+            load_shape = replay_config_elem.find("./{0}LoadShape".format(self.default_ns))
 
         return {'max_delay': str_to_int(max_delay),
                 'realtime': str_to_bool(realtime),
-                'currenttime': str_to_bool(currenttime)}
+                'currenttime': str_to_bool(currenttime),
+                'speed': str_to_float(speed),
+                'max_rate': str_to_bool(max_rate),
+                'load_shape': self.extract_load_shape(load_shape)}
+
+    @staticmethod
+    def extract_load_shape(load_shape_elem):
+        """
+        Returns the load_shape configuration of a LoadShape element, or None.
+        Stages are named after their element and keyed by their lower case attributes.
+        """
+        if load_shape_elem is None:
+            return None
+        stages = []
+        for elem in load_shape_elem:
+            if not isinstance(elem.tag, str):
+                # Skip comments and processing instructions
+                continue
+            stage = {key.lower(): float(value) for key, value in elem.attrib.items()}
+            stage['kind'] = ET.QName(elem).localname.lower()
+            stages.append(stage)
+        config = {'stages': stages}
+        for key in ('Burst', 'Interval'):
+            if load_shape_elem.get(key) is not None:
+                config[key.lower()] = float(load_shape_elem.get(key))
+        return config
 
     def extract_replay_messages(self):
         replay_messages_tag = "./{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_MSGS_TAG)
         sdn_message_tag = "{0}{1}".format(self.default_ns, SdnMessage.get_root_tag())
         sql_query_tag = "{0}{1}".format(self.default_ns, SqlQueryMessage.get_root_tag())
+        barrier_tag = "{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_BARRIER_TAG)
         replay_messages = []
 
         replay_messages_elem = self.replay_scenario.find(replay_messages_tag)
@@ -172,37 +772,164 @@ class SfbReplayer():
                 msg = SdnMessage(msg)
             elif (msg.tag == sql_query_tag):
                 msg = SqlQueryMessage(msg)
+            elif (msg.tag == barrier_tag):
+                continue
             else:
                 raise ValueError("Unrecognised Replay Message : " + str(msg.tag))
             replay_messages.append(msg)
         return replay_messages
 
-    def calculate_delay(self, curr_timestamp, prev_timestamp):
-        # Find the wait delay
-        delay = 0
-        if self.replay_config['realtime']:
-            if prev_timestamp is not None:
-                time_diff = curr_timestamp - prev_timestamp
-                delay = int(time_diff.total_seconds())
-        else:
-            delay = self.replay_config['max_delay']
-        # Delay must be non-negative and less than max_delay.
-        delay = min(self.replay_config['max_delay'], delay)
-        delay = max(delay, 0)
-        return delay
-
-    def update_timestamps(self):
-        old_timestamp = None
-        for msg in self.replay_messages:
-            if old_timestamp is None:
-                # This is the first message
-                old_timestamp = msg.get_timestamp()
-                new_timestamp = DT.datetime.now(DT.timezone.utc)
+    def extract_replay_barriers(self):
+        """
+        Returns a set of the message indexes which are preceded by a ReplayBarrier.
+        Every message before a barrier, in every lane, is sent before any message after it.
+        """
+        replay_messages_tag = "./{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_MSGS_TAG)
+        barrier_tag = "{0}{1}".format(self.default_ns, SfbReplayer.REPLAY_BARRIER_TAG)
+        replay_barriers = set()
+
+        replay_messages_elem = self.replay_scenario.find(replay_messages_tag)
+        if replay_messages_elem is None:
+            return replay_barriers
+
+        index = 0
+        for elem in replay_messages_elem:
+            if not isinstance(elem.tag, str):
+                # Skip comments and processing instructions
+                continue
+            if elem.tag == barrier_tag:
+                replay_barriers.add(index)
             else:
-                # Calculate the time differential
-                delta = msg.get_timestamp() - old_timestamp
-                old_timestamp = msg.get_timestamp()
-                new_timestamp = new_timestamp + delta
+                index += 1
+        return replay_barriers
+
+    def calculate_offsets(self):
+        """
+        Returns an array of the send times of each message (nanoseconds) relative to the
+        start of the replay, for the configured timing mode.
+        In MaxRate mode every offset is 0, so messages are sent as fast as the
+        receiver accepts them. Offsets are also 0 when a load shape or adaptive rate
+        paces the replay instead.
+        """
+        if self.replay_config['max_rate'] or self.get_pacer() is not None:
+            return array('q', [0]) * len(self.timeline)
+        return self.timeline.offsets(max_delay=self.replay_config['max_delay'],
+                                     realtime=self.replay_config['realtime'],
+                                     speed=self.replay_config['speed'] or 1)
+
+    def schedule(self):
+        """
+        Returns an iterator of (index, message, send offset) tuples in send order.
+        Offsets are nanoseconds relative to the start of the replay.
+
+        Streamed and generated scenarios are scheduled one message at a time as
+        they are read, as are the iterations of a soak.
+        With incremental validation, messages are validated as they are scheduled.
+        """
+        if self.soak_monitor is not None:
+            schedule = self._schedule_soak()
+        elif not isinstance(self.timeline, StreamingTimeline):
+            schedule = zip(itertools.count(), self.replay_messages, self.calculate_offsets())
+        else:
+            schedule = self._schedule_stream()
+        if self.partition is not None and self.load_generator is None:
+            index, count = self.partition
+            schedule = (item for item in schedule if get_partition(item[1], count) == index)
+        if self.validator is not None:
+            schedule = self.validator.check(schedule)
+        pacer = self.get_pacer()
+        if pacer is not None:
+            return self._schedule_paced(schedule, pacer)
+        return schedule
+
+    def _schedule_paced(self, schedule, pacer):
+        # Offsets are taken from the token bucket as each message is reached, so
+        # they follow the progress of the replay
+        pacer.start()
+        for index, msg, _ in schedule:
+            offset = pacer.reserve(self.scheduler.elapsed())
+            if offset is None:
+                return
+            yield index, msg, offset
+
+    def _schedule_stream(self):
+        # Only the current message's rebased timestamp is held by the timeline, so it
+        # is written as the message is scheduled, before a validator reads ahead
+        for index, msg in enumerate(self.replay_messages):
+            offset = self.timeline.advance(datetime_to_ns(msg.get_timestamp()))
+            new_timestamp = self.timeline.get_rebased_timestamp(index)
+            if new_timestamp is not None:
+                msg.set_timestamp(new_timestamp)
+            yield index, msg, 0 if self.replay_config['max_rate'] else offset
+
+    def get_iteration_gap(self, offsets):
+        """
+        Returns the delay (nanoseconds) between the last message of a soak iteration
+        and the first message of the next, the mean delay between the messages of
+        the scenario, or MaxDelay for a single message. 0 in MaxRate mode.
+        """
+        if len(offsets) > 1:
+            return offsets[-1] // (len(offsets) - 1)
+        max_delay = self.replay_config['max_delay']
+        if self.replay_config['max_rate'] or not max_delay:
+            return 0
+        max_ns = max_delay * NS_PER_SECOND
+        return scale_delay(max_ns, max_ns, self.replay_config['speed'] or 1)
+
+    def _schedule_soak(self):
+        offsets = self.calculate_offsets()
+        gap = self.get_iteration_gap(offsets)
+        duration_ns = None
+        if self.soak_duration is not None:
+            duration_ns = int(self.soak_duration * NS_PER_SECOND)
+        monitor = self.soak_monitor
+        monitor.start()
+        base = 0
+        for iteration in itertools.count():
+            if not offsets:
+                return
+            monitor.iteration = iteration
+            self.update_timestamps()
+            for index, offset in enumerate(offsets):
+                # Offsets do not advance in MaxRate mode, so the clock is checked too
+                if duration_ns is not None and \
+                        max(base + offset, self.scheduler.elapsed()) >= duration_ns:
+                    return
+                msg = self.soak_ids.clone_message(iteration, index,
+                                                  self.timeline.timestamps[index])
+                monitor.record()
+                yield index, msg, base + offset
+            base += offsets[-1] + gap
+
+    def update_timestamps(self, start_ns=None):
+        """
+        Rebases the message timestamps so the first message is stamped with the current
+        UTC time, or start_ns nanoseconds since the epoch if given, keeping the original
+        intervals between messages divided by Speed.
+
+        Only the timeline is updated here, the new timestamps are written into
+        each message just before it is sent (see write_timestamp).
+        """
+        if start_ns is None:
+            start_ns = datetime_to_ns(DT.datetime.now(DT.timezone.utc))
+        self.timeline.rebase(start_ns, speed=self.replay_config['speed'] or 1)
+
+    def write_timestamp(self, index, msg):
+        """
+        Writes the rebased timestamp for the message at index into the message.
+        In MaxRate mode, or when paced by a load shape or adaptive rate, the message is
+        stamped with the actual send time instead.
+        Does nothing if the timestamps have not been updated, or if the message was
+        stamped as it was scheduled (see _schedule_stream).
+        """
+        if (self.replay_config['max_rate'] or self.get_pacer() is not None) and \
+                self.timeline.rebased is not None:
+            msg.set_timestamp(DT.datetime.now(DT.timezone.utc))
+            return
+        if isinstance(self.timeline, StreamingTimeline):
+            return
+        new_timestamp = self.timeline.get_rebased_timestamp(index)
+        if new_timestamp is not None:
             msg.set_timestamp(new_timestamp)
 
     def __str__(self):
@@ -210,6 +937,15 @@ class SfbReplayer():
         Readable representation of the SfbReplayer instance, shows the mocker configurations within
         """
         template = "SfbReplayer Configurations :\n"
-        template += str(self.sdn_mocker) + '\n' if self.sdn_mocker else ''
-        template += str(self.odbc_mocker) + '\n' if self.odbc_mocker else ''
+        for mocker in self.mockers:
+            template += str(mocker) + '\n'
+        template += str(self.load_generator) + '\n' if self.load_generator else ''
+        if self.load_shape is not None:
+            template += "Load Shape ::: {0}\n".format(self.load_shape)
+        if self.adaptive is not None:
+            template += "Adaptive Rate ::: {0}\n".format(self.adaptive)
+        if self.soak_monitor is not None:
+            template += "Soak ::: duration - {0} : stats interval - {1}s\n".format(
+                "{0}s".format(self.soak_duration) if self.soak_duration is not None
+                else "until interrupted", self.soak_monitor.interval_ns // NS_PER_SECOND)
         return template
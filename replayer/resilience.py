@@ -0,0 +1,235 @@
+import logging
+import random
+import threading
+import time
+
+DEAD_LETTER_NS = "http://www.ir.com/SfbReplay"
+
+
+class RetryPolicy():
+
+    """
+    Exponential backoff with jitter between retries of a failed send.
+
+    The delay before retry n (starting at 0) is backoff * 2^n seconds, capped at
+    max_backoff, of which a random half is jitter so that retries from
+    concurrent senders do not arrive at the receiver together.
+    """
+
+    def __init__(self, retries=0, backoff=0.5, max_backoff=30, rng=None):
+        """
+        retries     -   Number of retries after the first attempt.
+        backoff     -   Delay before the first retry in seconds.
+        max_backoff -   Maximum delay between retries in seconds.
+        rng         -   random.Random instance used for the jitter. [Optional]
+        """
+        if retries < 0 or backoff < 0 or max_backoff < 0:
+            raise ValueError("retries, backoff and max_backoff must not be negative.")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._rng = rng if rng is not None else random.Random()
+
+    def get_delay(self, attempt):
+        """
+        Returns the delay in seconds before the given retry (0 is the first retry),
+        or None if no more retries are allowed.
+        """
+        if attempt >= self.retries:
+            return None
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay / 2 + self._rng.uniform(0, delay / 2)
+
+
+class CircuitBreaker():
+
+    """
+    Pauses sending to an endpoint which appears to be down.
+
+    After `threshold` consecutive failures the breaker opens, and every send waits
+    until `reset_timeout` seconds have passed. The next send is then let through
+    as a trial: success closes the breaker, failure opens it again.
+    A threshold of None disables the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold=None, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_send(self):
+        """
+        Blocks while the breaker is open.
+        """
+        while True:
+            with self._lock:
+                if self.state != CircuitBreaker.OPEN:
+                    return
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0:
+                    logging.info("Circuit breaker half-open, sending a trial message.")
+                    self.state = CircuitBreaker.HALF_OPEN
+                    return
+            time.sleep(remaining)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CircuitBreaker.CLOSED:
+                logging.info("Circuit breaker closed.")
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.threshold is None:
+                return
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != CircuitBreaker.OPEN:
+                    logging.warning("Circuit breaker open for {0}s after {1} failures.".format(
+                        self.reset_timeout, self.failures))
+                    self.trips += 1
+                self.state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+
+class SendGuard():
+
+    """
+    Calls a send function with retries and a circuit breaker.
+    """
+
+    def __init__(self, retry_policy=None, breaker=None, is_retryable=None):
+        """
+        retry_policy    -   RetryPolicy instance. Defaults to no retries.
+        breaker         -   CircuitBreaker instance. Defaults to a disabled breaker.
+        is_retryable    -   function returning True if an error is worth retrying.
+                            Defaults to retrying every error.
+        """
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.is_retryable = is_retryable if is_retryable is not None else (lambda e: True)
+        self.retries = 0
+
+    @classmethod
+    def fromconfig(cls, config, is_retryable=None):
+        """
+        Builds a SendGuard from a mocker configuration dictionary.
+
+        Supported keys :
+        retries             -   Number of retries of a failed send. Default 0.
+        backoff             -   Delay before the first retry in seconds. Default 0.5.
+        max_backoff         -   Maximum delay between retries in seconds. Default 30.
+        breaker_threshold   -   Consecutive failures which open the circuit breaker.
+                                Default is no circuit breaker.
+        breaker_reset       -   Seconds the circuit breaker stays open. Default 30.
+        """
+        try:
+            retry_policy = RetryPolicy(retries=int(config.get('retries', 0)),
+                                       backoff=float(config.get('backoff', 0.5)),
+                                       max_backoff=float(config.get('max_backoff', 30)))
+            threshold = config.get('breaker_threshold')
+            breaker = CircuitBreaker(threshold=int(threshold) if threshold is not None else None,
+                                     reset_timeout=float(config.get('breaker_reset', 30)))
+        except (TypeError, ValueError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Invalid retry or circuit breaker configuration.")
+        return cls(retry_policy, breaker, is_retryable)
+
+    def call(self, func, *args, errors=(Exception,), on_retry=None):
+        """
+        Calls func(*args) and returns its result.
+
+        Errors of the given types are retried with backoff while the retry policy
+        and is_retryable allow it, after calling on_retry(error). The last error is
+        re-raised when no more retries are allowed. Other errors are raised straight away.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_send()
+            try:
+                result = func(*args)
+            except errors as e:
+                self.breaker.record_failure()
+                delay = self.retry_policy.get_delay(attempt) if self.is_retryable(e) else None
+                if delay is None:
+                    raise
+                logging.warning("{0} : {1}. Retrying in {2:.2f}s.".format(
+                    e.__class__.__name__, str(e), delay))
+                if on_retry is not None:
+                    on_retry(e)
+                time.sleep(delay)
+                attempt += 1
+                self.retries += 1
+            else:
+                self.breaker.record_success()
+                return result
+
+
+class DeadLetterWriter():
+
+    """
+    Writes replay messages which could not be delivered to a SfbReplay scenario file.
+
+    Messages are written with their scheduled (possibly rewritten) timestamps, so
+    the file can be replayed later with sfbreplay. The file is only created when
+    the first message is written. Thread-safe.
+    """
+
+    def __init__(self, path, max_delay=0):
+        """
+        path        -   Path of the dead-letter scenario file.
+        max_delay   -   MaxDelay written to the scenario configuration.
+        """
+        self.path = path
+        self.max_delay = max_delay if max_delay is not None else 0
+        self.count = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, msg):
+        """
+        Appends the replay message to the dead-letter file.
+        """
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, mode="wb")
+                self._file.write(self._header().encode("utf-8"))
+            self._file.write(msg.tobytes())
+            self._file.write(b"\n")
+            self._file.flush()
+            self.count += 1
+
+    def _header(self):
+        return ('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<SfbReplay xmlns="{0}">\n'
+                '<Description>Undelivered messages.</Description>\n'
+                '<ReplayConfiguration>\n'
+                '    <MaxDelay>{1}</MaxDelay>\n'
+                '    <RealTime>true</RealTime>\n'
+                '    <CurrentTime>false</CurrentTime>\n'
+                '</ReplayConfiguration>\n'
+                '<ReplayMessages>\n').format(DEAD_LETTER_NS, self.max_delay)
+
+    def close(self):
+        """
+        Completes and closes the dead-letter file, if one was created.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.write(b"</ReplayMessages>\n</SfbReplay>\n")
+                self._file.close()
+                self._file = None
+                logging.warning("{0} undelivered messages written to {1}.".format(
+                    self.count, self.path))
+
+    def __str__(self):
+        return "DeadLetterWriter ::: path - {0} : messages - {1}".format(self.path, self.count)
@@ -0,0 +1,134 @@
+from array import array
+import asyncio
+import math
+import time
+from .timeline import NS_PER_SECOND
+
+NS_PER_MILLISECOND = 1000000
+
+
+def percentile(sorted_values, pct):
+    """
+    Returns the nearest-rank percentile of an already sorted sequence.
+    Returns None if the sequence is empty.
+
+    sorted_values   -   sequence of numbers in ascending order.
+    pct             -   percentile between 0 and 100.
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class ReplayScheduler():
+
+    """
+    Paces replay messages against absolute target times.
+
+    Targets are offsets (nanoseconds) from the start of the replay, measured on
+    time.monotonic. Since every wait is relative to the start rather than the
+    previous send, the time spent sending does not accumulate as drift.
+    The lateness of each send (actual minus target time) is recorded.
+    """
+
+    # Remaining time (ns) that is busy-waited rather than slept, to hit
+    # targets with millisecond precision on platforms with coarse sleeps.
+    SPIN_NS = NS_PER_MILLISECOND
+
+    def __init__(self):
+        self._start_ns = None
+        self.lateness = array('q')
+
+    def start(self, start_ns=None):
+        """
+        Starts the schedule clock.
+
+        start_ns    -   time.monotonic_ns value to use as the start of the replay.
+                        Defaults to now.
+        """
+        self._start_ns = time.monotonic_ns() if start_ns is None else start_ns
+        self.lateness = array('q')
+
+    @property
+    def start_ns(self):
+        """
+        The time.monotonic_ns value of the start of the replay, None if not started.
+        """
+        return self._start_ns
+
+    def elapsed(self):
+        """
+        Returns the nanoseconds elapsed since the schedule was started.
+        """
+        return time.monotonic_ns() - self._start_ns
+
+    def wait_until(self, offset_ns):
+        """
+        Sleeps until offset_ns nanoseconds after the start of the schedule, then records
+        and returns the lateness of the send in nanoseconds.
+        Returns immediately if the target has already passed.
+        """
+        if self._start_ns is None:
+            raise ValueError("Scheduler must be started before waiting.")
+        target = self._start_ns + offset_ns
+        remaining = target - time.monotonic_ns()
+        while remaining > self.SPIN_NS:
+            time.sleep((remaining - self.SPIN_NS) / NS_PER_SECOND)
+            remaining = target - time.monotonic_ns()
+        while time.monotonic_ns() < target:
+            pass
+        lateness = time.monotonic_ns() - target
+        self.lateness.append(lateness)
+        return lateness
+
+    async def wait_until_async(self, offset_ns):
+        """
+        Coroutine version of wait_until, which yields to the event loop while waiting.
+        The last SPIN_NS are also waited by yielding, rather than busy-waiting, so the
+        other lanes of the event loop keep sending.
+        """
+        if self._start_ns is None:
+            raise ValueError("Scheduler must be started before waiting.")
+        target = self._start_ns + offset_ns
+        remaining = target - time.monotonic_ns()
+        while remaining > self.SPIN_NS:
+            await asyncio.sleep((remaining - self.SPIN_NS) / NS_PER_SECOND)
+            remaining = target - time.monotonic_ns()
+        while time.monotonic_ns() < target:
+            await asyncio.sleep(0)
+        lateness = time.monotonic_ns() - target
+        self.lateness.append(lateness)
+        return lateness
+
+    def jitter_summary(self):
+        """
+        Returns a dictionary of the send lateness statistics in milliseconds.
+
+        Returned keys - values (types)
+
+        count   -   number of sends recorded (int)
+        p50     -   median lateness (float)
+        p99     -   99th percentile lateness (float)
+        max     -   maximum lateness (float)
+        """
+        ordered = sorted(self.lateness)
+        summary = {'count': len(ordered)}
+        for key, pct in (('p50', 50), ('p99', 99), ('max', 100)):
+            value = percentile(ordered, pct)
+            summary[key] = value / NS_PER_MILLISECOND if value is not None else None
+        return summary
+
+    def report(self, summary=None):
+        """
+        Returns a readable summary of the send jitter.
+
+        summary -   jitter summary to report, e.g. of a SoakMonitor.
+                    Defaults to jitter_summary. [Optional]
+        """
+        if summary is None:
+            summary = self.jitter_summary()
+        if not summary['count']:
+            return "Replay Jitter ::: no messages sent"
+        return "Replay Jitter ::: messages - {count} : p50 - {p50:.3f}ms : " \
+            "p99 - {p99:.3f}ms : max - {max:.3f}ms".format(**summary)
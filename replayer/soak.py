@@ -0,0 +1,162 @@
+from .scheduler import NS_PER_MILLISECOND
+from .timeline import NS_PER_SECOND
+from array import array
+from collections import Counter
+import math
+import time
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported
+    resource = None
+
+
+def get_peak_rss_kb():
+    """
+    Returns the peak resident memory of the process in kilobytes, or None if it
+    cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def round_significant(value, digits=3):
+    """
+    Rounds a non-negative integer down to the given number of significant digits.
+    """
+    if value <= 0:
+        return 0
+    scale = 10 ** max(len(str(value)) - digits, 0)
+    return value // scale * scale
+
+
+def histogram_percentile(histogram, pct):
+    """
+    Returns the pct percentile of a Counter of values, or None if it is empty.
+    """
+    rank = max(math.ceil(pct / 100 * sum(histogram.values())), 1)
+    for value in sorted(histogram):
+        rank -= histogram[value]
+        if rank <= 0:
+            return value
+    return None
+
+
+class SoakMonitor():
+
+    """
+    Rolling statistics of a long running replay.
+
+    Every interval seconds a report is printed of the send rate and the failed
+    sends within the interval, along with the running totals and the send jitter
+    of the interval. The jitter samples of the scheduler are cleared after each
+    report, so they do not grow with the length of the replay. They are kept in a
+    cumulative histogram of the lateness, to three significant digits, for the
+    summary of the whole replay.
+    """
+
+    def __init__(self, scheduler, mockers, interval=60, clock=time.monotonic_ns, jitter=True):
+        """
+        scheduler   -   ReplayScheduler pacing the replay.
+        mockers     -   list of mockers whose failures are counted.
+        interval    -   seconds between reports.
+        clock       -   function returning the current time in nanoseconds.
+        jitter      -   report the send jitter. False in MaxRate mode, where every
+                        message is due at the start and the lateness is the elapsed time.
+        """
+        if interval <= 0:
+            raise ValueError("Stats interval must be greater than 0.")
+        self.scheduler = scheduler
+        self.mockers = [mocker for mocker in mockers if mocker is not None]
+        self.interval_ns = int(interval * NS_PER_SECOND)
+        self.clock = clock
+        self.jitter = jitter
+        self.lateness = Counter()
+        self.max_lateness = None
+        self.iteration = 0
+        self.sent = 0
+        self.reports = 0
+        self._started = None
+        self._window_start = None
+        self._window_sent = 0
+        self._window_failures = 0
+
+    def get_failures(self):
+        return sum(mocker.failures for mocker in self.mockers)
+
+    def start(self):
+        self._started = self._window_start = self.clock()
+        self.lateness = Counter()
+        self.max_lateness = None
+        self._window_sent = 0
+        self._window_failures = self.get_failures()
+
+    def record(self, count=1):
+        """
+        Records sent messages, and prints a report if the interval has passed.
+        Returns the report, or None if no report was due.
+        """
+        if self._started is None:
+            self.start()
+        self.sent += count
+        if self.clock() - self._window_start >= self.interval_ns:
+            report = self.report()
+            print(report)
+            return report
+        return None
+
+    def report(self):
+        """
+        Returns a readable summary of the current interval, and starts a new one.
+        """
+        now = self.clock()
+        failures = self.get_failures()
+        elapsed_s = max(now - self._window_start, 1) / NS_PER_SECOND
+        sent = self.sent - self._window_sent
+        summary = self.scheduler.jitter_summary()
+        template = "Soak Stats ::: elapsed - {0:.0f}s : iteration - {1} : " \
+            "rate - {2:.1f} msg/s : failures - {3} : total sent - {4} : " \
+            "total failures - {5}".format((now - self._started) / NS_PER_SECOND,
+                                          self.iteration, sent / elapsed_s,
+                                          failures - self._window_failures,
+                                          self.sent, failures)
+        if self.jitter and summary['count']:
+            template += " : jitter p99 - {0:.3f}ms".format(summary['p99'])
+        peak_rss = get_peak_rss_kb()
+        if peak_rss is not None:
+            template += " : peak rss - {0}KB".format(peak_rss)
+        self.lateness.update(round_significant(value) for value in self.scheduler.lateness)
+        self.max_lateness = self.get_max_lateness()
+        self.scheduler.lateness = array('q')
+        self._window_start = now
+        self._window_sent = self.sent
+        self._window_failures = failures
+        self.reports += 1
+        return template
+
+    def get_max_lateness(self):
+        """
+        Returns the maximum lateness (nanoseconds) of the whole replay, or None.
+        """
+        lateness = list(self.scheduler.lateness)
+        if self.max_lateness is not None:
+            lateness.append(self.max_lateness)
+        return max(lateness, default=None)
+
+    def jitter_summary(self):
+        """
+        Returns the send lateness statistics in milliseconds of the whole replay, with
+        the same keys as ReplayScheduler.jitter_summary. Percentiles are accurate to
+        three significant digits.
+        """
+        # Samples of the current interval are not yet in the histogram
+        histogram = self.lateness + Counter(round_significant(value)
+                                            for value in self.scheduler.lateness)
+        max_lateness = self.get_max_lateness()
+        summary = {'count': sum(histogram.values())}
+        for key, pct in (('p50', 50), ('p99', 99)):
+            value = histogram_percentile(histogram, pct)
+            summary[key] = value / NS_PER_MILLISECOND if value is not None else None
+        summary['max'] = max_lateness / NS_PER_MILLISECOND if max_lateness is not None else None
+        return summary
@@ -0,0 +1,105 @@
+from .xmlmessage import SdnMessage
+from .xmlmessage import SqlQueryMessage
+from lxml import etree as ET
+import copy
+import logging
+
+
+class ScenarioStream():
+
+    """
+    Reads the messages of a SfbReplay scenario file one at a time with iterparse.
+
+    The ReplayConfiguration is read first, without reaching the messages. Messages
+    are then parsed as they are iterated. Each message is given a copy of its
+    element, and the parsed elements are cleared from the document, so a message
+    is freed as soon as it has been sent. Memory stays flat regardless of the
+    length of the scenario.
+
+    The stream can be iterated more than once, each iteration reads the file again.
+    """
+
+    REPLAY_CONFIG_TAG = "ReplayConfiguration"
+    REPLAY_MSGS_TAG = "ReplayMessages"
+    REPLAY_BARRIER_TAG = "ReplayBarrier"
+
+    def __init__(self, path):
+        """
+        path    -   Path of the SfbReplay scenario file.
+        """
+        self.path = path
+        self.default_ns = ''
+        # XMLSchema the scenario is validated against while it is read, and a
+        # function called once the whole scenario has been read and validated
+        self.schema = None
+        self.on_valid = None
+        # Indexes of the messages read so far which are preceded by a ReplayBarrier
+        self.barriers = set()
+
+    def _iterparse(self, **kwargs):
+        return ET.iterparse(self.path, huge_tree=True, schema=self.schema, **kwargs)
+
+    def read_configuration(self):
+        """
+        Returns an ElementTree of the scenario without its ReplayMessages, which
+        holds the ReplayConfiguration.
+        Raises ValueError if the file is not valid XML.
+        """
+        root = None
+        try:
+            for event, elem in ET.iterparse(self.path, events=('start',), huge_tree=True):
+                if root is None:
+                    root = elem
+                    self.default_ns = root.nsmap.get(None, '')
+                    if self.default_ns != '':
+                        self.default_ns = "{{{0}}}".format(self.default_ns)
+                elif elem.tag == self.default_ns + self.REPLAY_MSGS_TAG:
+                    root.remove(elem)
+                    break
+        except ET.XMLSyntaxError as e:
+            logging.error("ParseError whilst parsing SfbReplay Scenario file : " + str(e))
+            raise ValueError("Invalid Sfb Replay Test XML Format.")
+        return ET.ElementTree(root)
+
+    def __iter__(self):
+        """
+        Yields a SdnMessage or SqlQueryMessage for every message in the scenario.
+        Raises ValueError if the scenario is not valid XML, or not valid against
+        the schema, when the invalid part is reached.
+        """
+        sdn_message_tag = self.default_ns + SdnMessage.get_root_tag()
+        sql_query_tag = self.default_ns + SqlQueryMessage.get_root_tag()
+        barrier_tag = self.default_ns + self.REPLAY_BARRIER_TAG
+        replay_messages_tag = self.default_ns + self.REPLAY_MSGS_TAG
+        self.barriers.clear()
+        index = 0
+        try:
+            for event, elem in self._iterparse(events=('end',),
+                                               tag=(sdn_message_tag, sql_query_tag, barrier_tag)):
+                parent = elem.getparent()
+                if parent is None or parent.tag != replay_messages_tag:
+                    continue
+                if elem.tag == barrier_tag:
+                    self.barriers.add(index)
+                    msg = None
+                elif elem.tag == sdn_message_tag:
+                    msg = SdnMessage(copy.deepcopy(elem))
+                else:
+                    msg = SqlQueryMessage(copy.deepcopy(elem))
+                # Copies keep their namespaces, elements removed from the document
+                # would not. Clear the parsed elements from the document.
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+                if msg is not None:
+                    index += 1
+                    yield msg
+            if self.schema is not None and self.on_valid is not None:
+                self.on_valid()
+        except ET.XMLSyntaxError as e:
+            logging.error("Error whilst streaming SfbReplay Scenario file : " + str(e))
+            raise ValueError(
+                "Failed SfbReplayer Test Validation. Check the SDN Version or error log.")
+
+    def __str__(self):
+        return "ScenarioStream ::: path - {0}".format(self.path)
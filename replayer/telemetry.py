@@ -0,0 +1,224 @@
+from .scheduler import NS_PER_MILLISECOND
+from .soak import histogram_percentile
+from .soak import round_significant
+from .timeline import NS_PER_SECOND
+from collections import Counter
+import json
+import logging
+import struct
+import threading
+import time
+
+TELEMETRY_FORMATS = ('csv', 'jsonl', 'binary')
+TELEMETRY_FIELDS = ('scheduled_ns', 'actual_ns', 'lane', 'target', 'status', 'latency_ns',
+                    'bytes')
+
+# Binary logs are the magic, the length of a JSON header naming the targets, the
+# header and fixed size records of the fields above. Lanes and targets are stored
+# as their index.
+TELEMETRY_MAGIC = b"SFBTEL\x02\x00"
+_HEADER_LENGTH = struct.Struct("<I")
+_RECORD = struct.Struct("<qqBBiqI")
+LANES = ('sdn', 'sql')
+# Target index of targets which are not in the header
+UNKNOWN_TARGET = 255
+
+# Status of a send which raised an error without a response status
+STATUS_ERROR = -1
+# Status of a SQL message which was added to a batch that is not yet committed
+STATUS_PENDING = -2
+
+# Size of the write buffer of the telemetry file
+BUFFER_SIZE = 1 << 20
+
+
+def is_error(status):
+    return status == STATUS_ERROR or status >= 400
+
+
+class LaneStats():
+
+    """
+    Running statistics of the sends of one lane.
+
+    Latencies are kept in a histogram to three significant digits, so the memory
+    used does not grow with the number of sends. The maximum latency is exact.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.first_ns = None
+        self.last_ns = None
+        self.max_latency = None
+        self.latencies = Counter()
+
+    def add(self, actual_ns, status, latency_ns, size):
+        self.count += 1
+        self.bytes += size
+        if is_error(status):
+            self.errors += 1
+        if self.first_ns is None:
+            self.first_ns = actual_ns
+        self.last_ns = actual_ns + latency_ns
+        self.latencies[round_significant(latency_ns)] += 1
+        if self.max_latency is None or latency_ns > self.max_latency:
+            self.max_latency = latency_ns
+
+    def summary(self):
+        """
+        Returns a dictionary of the lane statistics, with latencies in milliseconds.
+        """
+        duration_s = (self.last_ns - self.first_ns) / NS_PER_SECOND if self.count else 0
+        summary = {'count': self.count,
+                   'errors': self.errors,
+                   'bytes': self.bytes,
+                   'throughput': self.count / duration_s if duration_s > 0 else None}
+        for key, pct in (('p50', 50), ('p90', 90), ('p99', 99)):
+            value = histogram_percentile(self.latencies, pct)
+            summary[key] = value / NS_PER_MILLISECOND if value is not None else None
+        summary['max'] = self.max_latency / NS_PER_MILLISECOND \
+            if self.max_latency is not None else None
+        return summary
+
+
+class TelemetrySink():
+
+    """
+    Records one row per send of the replay: when it was scheduled and actually
+    sent (nanoseconds from the start of the replay), its lane and target (the name
+    of the mocker, when the replay is mirrored to several), the response status
+    (HTTP status, or the number of rows for SQL messages), the send latency and
+    the payload size. Batched SQL messages are recorded once per committed batch.
+
+    Rows are written through a large buffer to a CSV, JSON lines or compact
+    binary file, and per target statistics are kept for the end of run summary.
+    Thread-safe, mockers of the async engine record from their worker threads.
+    """
+
+    def __init__(self, path=None, format='csv', targets=None):
+        """
+        path    -   Path of the telemetry log. Only the summary is kept if None.
+        format  -   'csv', 'jsonl' or 'binary'.
+        targets -   names of the targets, stored in the header of binary logs.
+                    [Optional]
+        """
+        if format not in TELEMETRY_FORMATS:
+            raise ValueError("Telemetry format must be one of " + ", ".join(TELEMETRY_FORMATS))
+        self.path = path
+        self.format = format
+        self.targets = list(targets or ())
+        self.lanes = {}
+        self.start_ns = None
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            if format == 'binary':
+                self._file = open(path, mode="wb", buffering=BUFFER_SIZE)
+                header = json.dumps({'targets': self.targets}).encode("utf-8")
+                self._file.write(TELEMETRY_MAGIC)
+                self._file.write(_HEADER_LENGTH.pack(len(header)))
+                self._file.write(header)
+            else:
+                self._file = open(path, mode="w", buffering=BUFFER_SIZE, newline="")
+                if format == 'csv':
+                    self._file.write(",".join(TELEMETRY_FIELDS) + "\n")
+
+    def start(self, start_ns=None):
+        """
+        Sets the time.monotonic_ns value of the start of the replay, which every
+        time is recorded relative to.
+        """
+        self.start_ns = time.monotonic_ns() if start_ns is None else start_ns
+
+    def record(self, lane, scheduled_ns, started_ns, status, latency_ns, size, target=None):
+        """
+        Records a send.
+
+        lane            -   'sdn' or 'sql'.
+        target          -   name of the mocker which sent the message. Defaults to the lane.
+        scheduled_ns    -   scheduled send offset from the start of the replay, or None.
+        started_ns      -   time.monotonic_ns value when the send started.
+        status          -   response status, number of rows, or STATUS_ERROR.
+        latency_ns      -   time taken by the send, including retries.
+        size            -   payload size in bytes.
+        """
+        actual_ns = started_ns - self.start_ns if self.start_ns is not None else started_ns
+        if scheduled_ns is None:
+            scheduled_ns = actual_ns
+        if target is None:
+            target = lane
+        with self._lock:
+            stats = self.lanes.get(target)
+            if stats is None:
+                stats = self.lanes[target] = LaneStats()
+            stats.add(actual_ns, status, latency_ns, size)
+            if self._file is None:
+                return
+            if self.format == 'binary':
+                index = self.targets.index(target) if target in self.targets else UNKNOWN_TARGET
+                self._file.write(_RECORD.pack(scheduled_ns, actual_ns, LANES.index(lane),
+                                              index, status, latency_ns, size))
+            elif self.format == 'csv':
+                self._file.write("{0},{1},{2},{3},{4},{5},{6}\n".format(
+                    scheduled_ns, actual_ns, lane, target, status, latency_ns, size))
+            else:
+                self._file.write(json.dumps(dict(zip(TELEMETRY_FIELDS, (
+                    scheduled_ns, actual_ns, lane, target, status, latency_ns,
+                    size)))) + "\n")
+
+    def summary(self):
+        """
+        Returns a dictionary of the statistics of each target, see LaneStats.summary.
+        """
+        with self._lock:
+            return {lane: stats.summary() for lane, stats in sorted(self.lanes.items())}
+
+    def report(self):
+        """
+        Returns a readable summary of the throughput and latency of each target.
+        """
+        lines = []
+        for target, summary in self.summary().items():
+            template = "Telemetry {0} ::: sends - {1} : errors - {2} : bytes - {3}".format(
+                target, summary['count'], summary['errors'], summary['bytes'])
+            if summary['throughput'] is not None:
+                template += " : throughput - {0:.1f} msg/s".format(summary['throughput'])
+            template += " : latency p50 - {p50:.3f}ms : p90 - {p90:.3f}ms : " \
+                "p99 - {p99:.3f}ms : max - {max:.3f}ms".format(**summary)
+            lines.append(template)
+        if not lines:
+            return "Telemetry ::: no messages sent"
+        return '\n'.join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_binary_telemetry(path):
+    """
+    Yields a dictionary of the fields of every record of a binary telemetry log.
+    Raises ValueError if the file is not a telemetry log.
+    """
+    with open(path, mode="rb") as infile:
+        if infile.read(len(TELEMETRY_MAGIC)) != TELEMETRY_MAGIC:
+            raise ValueError("Not a SfbReplay telemetry log : " + path)
+        try:
+            (header_length,) = _HEADER_LENGTH.unpack(infile.read(_HEADER_LENGTH.size))
+            targets = json.loads(infile.read(header_length).decode("utf-8"))['targets']
+        except (struct.error, UnicodeDecodeError, ValueError, KeyError) as e:
+            logging.error("{0} raised : {1}".format(e.__class__, str(e)))
+            raise ValueError("Corrupt SfbReplay telemetry log : " + path)
+        while True:
+            data = infile.read(_RECORD.size)
+            if len(data) < _RECORD.size:
+                return
+            record = dict(zip(TELEMETRY_FIELDS, _RECORD.unpack(data)))
+            record['lane'] = LANES[record['lane']]
+            index = record['target']
+            record['target'] = targets[index] if index < len(targets) else record['lane']
+            yield record
@@ -0,0 +1,199 @@
+from array import array
+import itertools
+import datetime as DT
+
+NS_PER_SECOND = 1000000000
+NS_PER_MICROSECOND = 1000
+
+_EPOCH = DT.datetime(1970, 1, 1, tzinfo=DT.timezone.utc)
+
+
+def datetime_to_ns(timestamp_dt):
+    """
+    Converts a datetime object with a utcoffset to integer nanoseconds since the UTC epoch.
+    Raises ValueError if the datetime has no timezone information.
+    """
+    if timestamp_dt.utcoffset() is None:
+        raise ValueError("Timestamp did not contain UTC offset information.")
+    return ((timestamp_dt - _EPOCH) // DT.timedelta(microseconds=1)) * NS_PER_MICROSECOND
+
+
+def scale_delay(delay_ns, max_ns=None, speed=1):
+    """
+    Divides a delay (nanoseconds) by speed, then clamps it between 0 and max_ns.
+    A max_ns of None means unbounded.
+    """
+    if speed != 1:
+        delay_ns = int(delay_ns / speed)
+    if max_ns is not None:
+        delay_ns = min(delay_ns, max_ns)
+    return max(delay_ns, 0)
+
+
+def ns_to_datetime(timestamp_ns):
+    """
+    Converts integer nanoseconds since the UTC epoch to a UTC datetime object.
+    Precision is truncated to microseconds.
+    """
+    return _EPOCH + DT.timedelta(microseconds=timestamp_ns // NS_PER_MICROSECOND)
+
+
+class ReplayTimeline():
+
+    """
+    Timing information for a list of replay messages.
+
+    The original message timestamps are parsed once and held in a compact int64
+    array of nanoseconds since the UTC epoch. Delays, send offsets and rebased
+    timestamps are all derived from this array, so the messages themselves are
+    only touched when a rebased timestamp is written back at send time.
+    """
+
+    def __init__(self, timestamps_ns):
+        """
+        timestamps_ns   -   iterable of message timestamps in nanoseconds since the UTC epoch.
+        """
+        self.timestamps = array('q', timestamps_ns)
+        self.rebased = None
+
+    @classmethod
+    def frommessages(cls, messages):
+        """
+        Builds the timeline from the timestamps of the given replay messages.
+        Each timestamp is parsed exactly once.
+        """
+        return cls(datetime_to_ns(msg.get_timestamp()) for msg in messages)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def intervals(self):
+        """
+        Returns an array of the nanoseconds elapsed since the previous message.
+        The interval of the first message is always 0.
+        """
+        ts = self.timestamps
+        return array('q', itertools.chain((0,) if ts else (),
+                                          map(int.__sub__, ts[1:], ts[:-1])))
+
+    def delays(self, max_delay=None, realtime=True, speed=1):
+        """
+        Returns an array of the delays (nanoseconds) applied before each message is sent.
+
+        max_delay   -   maximum delay in seconds. None means unbounded.
+        realtime    -   use the original intervals between messages, otherwise every
+                        delay is max_delay.
+        speed       -   factor the delays are divided by. MaxDelay still applies to
+                        the scaled delays.
+        """
+        max_ns = max_delay * NS_PER_SECOND if max_delay is not None else None
+        if realtime:
+            delays = self.intervals()
+        else:
+            delays = array('q', itertools.repeat(max_ns or 0, len(self.timestamps)))
+        return array('q', (scale_delay(d, max_ns, speed) for d in delays))
+
+    def offsets(self, **kwargs):
+        """
+        Returns an array of the send times of each message (nanoseconds) relative to the
+        start of the replay. Takes the same keyword arguments as delays.
+        """
+        return array('q', itertools.accumulate(self.delays(**kwargs)))
+
+    def rebase(self, start_ns, speed=1):
+        """
+        Rebases the timeline so the first message is stamped with start_ns, keeping the
+        original intervals (divided by speed) between messages.
+        """
+        if not self.timestamps:
+            self.rebased = array('q')
+            return
+        first = self.timestamps[0]
+        if speed == 1:
+            self.rebased = array('q', (start_ns + (ts - first) for ts in self.timestamps))
+        else:
+            self.rebased = array('q', (start_ns + int((ts - first) / speed)
+                                       for ts in self.timestamps))
+
+    def get_rebased_timestamp(self, index):
+        """
+        Returns the rebased timestamp for the message at index as a UTC datetime,
+        or None if the timeline has not been rebased.
+        """
+        if self.rebased is None:
+            return None
+        return ns_to_datetime(self.rebased[index])
+
+
+class StreamingTimeline():
+
+    """
+    Timing information computed one message at a time, for scenarios which are
+    streamed rather than loaded.
+
+    Gives the same offsets and rebased timestamps as ReplayTimeline, but only
+    holds the first and the current message timestamps, so memory does not grow
+    with the length of the scenario.
+    """
+
+    def __init__(self, max_delay=None, realtime=True, speed=1):
+        """
+        Takes the same timing parameters as ReplayTimeline.delays.
+        """
+        self.max_ns = max_delay * NS_PER_SECOND if max_delay is not None else None
+        self.realtime = realtime
+        self.speed = speed
+        self.count = 0
+        self.offset = 0
+        # Rebased timestamp of the current message, once the timeline is rebased
+        self.rebased = None
+        self._first = None
+        self._previous = None
+        self._rebase = None
+
+    def __len__(self):
+        return self.count
+
+    def advance(self, timestamp_ns):
+        """
+        Adds the timestamp of the next message, and returns the send time of the
+        message (nanoseconds) relative to the start of the replay.
+        """
+        if self.realtime:
+            interval = timestamp_ns - self._previous if self._previous is not None else 0
+        else:
+            interval = self.max_ns or 0
+        self.offset += scale_delay(interval, self.max_ns, self.speed)
+        if self._first is None:
+            self._first = timestamp_ns
+        self._previous = timestamp_ns
+        self.count += 1
+        if self._rebase is not None:
+            start_ns, speed = self._rebase
+            elapsed = timestamp_ns - self._first
+            if speed != 1:
+                elapsed = int(elapsed / speed)
+            self.rebased = start_ns + elapsed
+        return self.offset
+
+    def rebase(self, start_ns, speed=1):
+        """
+        Rebases the timeline so the first message is stamped with start_ns, keeping the
+        original intervals (divided by speed) between messages.
+        Must be called before the first message is added.
+        """
+        if self.count:
+            raise ValueError("Streaming timeline must be rebased before it is advanced.")
+        self._rebase = (start_ns, speed)
+
+    def get_rebased_timestamp(self, index):
+        """
+        Returns the rebased timestamp for the current message as a UTC datetime,
+        or None if the timeline has not been rebased.
+        Raises IndexError for any message but the current one.
+        """
+        if self.rebased is None:
+            return None
+        if index != self.count - 1:
+            raise IndexError("Only the rebased timestamp of the current message is held.")
+        return ns_to_datetime(self.rebased)
@@ -0,0 +1,122 @@
+import logging
+import unittest
+from sfbtools.receiver.receiver import LatencyModel
+from sfbtools.receiver.receiver import SdnReceiver
+from sfbtools.replayer.adaptive import AdaptiveRate
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.telemetry import STATUS_ERROR
+from sfbtools.replayer.timeline import NS_PER_SECOND
+from sfbtools.replayer.unit_tests.test_distributed import XML_1
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+MS = NS_PER_SECOND // 1000
+
+
+def run_window(controller, second, count, latency_ns=10 * MS, errors=0):
+    """
+    Records count sends within the window ending at second, and starts the next.
+    """
+    for i in range(count):
+        controller.record(STATUS_ERROR if i < errors else 200, latency_ns)
+    controller.reserve(second * NS_PER_SECOND)
+    return controller.windows[-1]
+
+
+class TestAdaptiveRate(unittest.TestCase):
+
+    def test_aimd(self):
+        controller = AdaptiveRate(0.1, rate=10, increase=10, interval=1)
+        controller.start()
+        self.assertTrue(run_window(controller, 1, 10)['healthy'])
+        self.assertEqual(20, controller.rate, "Should raise the rate below the target.")
+        self.assertTrue(run_window(controller, 2, 20)['healthy'])
+        self.assertEqual(30, controller.rate)
+        window = run_window(controller, 3, 30, errors=1)
+        self.assertFalse(window['healthy'])
+        self.assertEqual(15, controller.rate, "Should back off on errors.")
+        run_window(controller, 4, 15, latency_ns=200 * MS)
+        self.assertEqual(7.5, controller.rate, "Should back off above the target latency.")
+        run_window(controller, 5, 3)
+        self.assertEqual(7.5, controller.rate, "Should hold the rate if the replay falls behind.")
+        self.assertEqual(20, controller.sustained_max())
+        report = controller.report()
+        self.assertIn("Sustained maximum rate ::: 20.0 msg/s", report)
+        self.assertIn("errors - 1 : backed off", report)
+
+    def test_limits(self):
+        controller = AdaptiveRate(0.1, rate=10, increase=10, min_rate=8, max_rate=15,
+                                  interval=1)
+        controller.start()
+        run_window(controller, 1, 10)
+        self.assertEqual(15, controller.rate)
+        run_window(controller, 2, 15, errors=15)
+        run_window(controller, 3, 8, errors=8)
+        self.assertEqual(8, controller.rate)
+        self.assertEqual(10, controller.sustained_max())
+        controller.finish(int(3.5 * NS_PER_SECOND))
+        self.assertEqual(3, len(controller.windows), "Should not add an empty last window.")
+
+    def test_stalled(self):
+        controller = AdaptiveRate(0.1, rate=40, interval=1)
+        controller.start()
+        controller.add_in_flight(1)
+        window = run_window(controller, 1, 0)
+        self.assertFalse(window['healthy'], "Should back off when no send completes.")
+        self.assertEqual(20, controller.rate)
+        controller.add_in_flight(-1)
+        self.assertTrue(run_window(controller, 2, 0)['healthy'],
+                        "Should not back off when nothing was sent.")
+
+    def test_token_bucket(self):
+        controller = AdaptiveRate(0.1, rate=100, interval=10)
+        controller.start()
+        offsets = [controller.reserve(0)]
+        for _ in range(3):
+            offsets.append(controller.reserve(offsets[-1]))
+        self.assertEqual([0, 10 * MS, 20 * MS, 30 * MS], offsets)
+
+    def test_config(self):
+        self.assertIsNone(AdaptiveRate.fromconfig(None))
+        controller = AdaptiveRate.fromconfig({'target_latency': '0.25', 'rate': 50})
+        self.assertEqual((0.25, 50), (controller.target_latency, controller.rate))
+        for config in ({'rate': 10}, {'target_latency': 0}, {'target_latency': 1, 'decrease': 2},
+                       {'target_latency': 1, 'rate': 1, 'min_rate': 2},
+                       {'target_latency': 1, 'speed': 2}):
+            with self.assertRaises(ValueError, msg="Should raise ValueError for " + str(config)):
+                AdaptiveRate.fromconfig(config)
+        with self.assertRaises(ValueError, msg="Should not allow a load shape as well."):
+            SfbReplayer.fromstring(XML_1, validate=False, sdn_config={'mocker': 'null'},
+                                   load_shape="plateau:1:10", adaptive={'target_latency': 1})
+
+
+class TestAdaptiveReplay(unittest.TestCase):
+
+    def test_capacity(self):
+        # Sending one message at a time, 20ms responses allow at most 50 msg/s
+        with SdnReceiver(latency=LatencyModel(0.02)) as receiver:
+            replayer = SfbReplayer.fromstring(XML_1, validate=False, loop=True, duration=2,
+                                              sdn_config={'receiver': receiver.url},
+                                              adaptive={'target_latency': 0.1, 'rate': 10,
+                                                        'increase': 20, 'interval': 0.25})
+            replayer.run()
+        sustained = replayer.adaptive.sustained_max()
+        self.assertGreater(sustained, 25)
+        self.assertLess(sustained, 55)
+        self.assertLess(replayer.adaptive.rate, 80, "Should not raise the rate past capacity.")
+
+    def test_errors(self):
+        with SdnReceiver(error_rate=1) as receiver:
+            replayer = SfbReplayer.fromstring(XML_1, validate=False, loop=True, duration=1,
+                                              sdn_config={'receiver': receiver.url},
+                                              adaptive={'target_latency': 1, 'rate': 40,
+                                                        'min_rate': 5, 'interval': 0.2})
+            replayer.run_async()
+        self.assertEqual(5, replayer.adaptive.rate, "Should back off to the minimum rate.")
+        self.assertIsNone(replayer.adaptive.sustained_max())
+        self.assertIn("Adaptive Rate ::: target p95 - 1000ms", str(replayer))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+from sfbtools.replayer.backends import DbApiBackend
+from sfbtools.replayer.backends import Sqlite3Backend
+from sfbtools.replayer.backends import get_backend
+from sfbtools.replayer.mocker import OdbcMocker
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.unit_tests.test_odbc_mocker import sql_message
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+XML_1 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>false</RealTime>
+    <CurrentTime>false</CurrentTime>
+    <MaxRate>true</MaxRate>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      <Query>create table tbl (a text, b text)</Query>
+    </SqlQueryMessage>{0}
+  </ReplayMessages>
+</SfbReplay>
+"""
+INSERT = """
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:51.0000000Z</TimeStamp>
+      <Query>insert into tbl values (?, ?)</Query>
+      <Parameters>
+        <Parameter>{0}</Parameter>
+        <Parameter>b</Parameter>
+      </Parameters>
+    </SqlQueryMessage>"""
+
+
+class TestBackends(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as database:
+            pass
+        self.database = database.name
+
+    def tearDown(self):
+        os.remove(self.database)
+
+    def count(self):
+        with sqlite3.connect(self.database) as connection:
+            return connection.execute("select count(*) from tbl").fetchone()[0]
+
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend({'backend': 'sqlite3'}), Sqlite3Backend)
+        backend = get_backend({'backend': 'sqlite3', 'database': ':memory:'})
+        self.assertEqual((sqlite3.Error,), backend.errors)
+        with self.assertRaises(ValueError, msg="Should raise ValueError for missing modules."):
+            get_backend({'backend': 'no_such_dbapi_module'})
+        with self.assertRaises(ValueError, msg="Should raise ValueError for non DB-API modules."):
+            get_backend({'backend': 'json'})
+
+    def test_sqlite3_mocker(self):
+        mocker = OdbcMocker(backend='sqlite3', database=self.database, batch_size=2)
+        mocker.open()
+        mocker.send("create table tbl (a text, b text)")
+        for i in range(3):
+            mocker.send_message(sql_message(0, i))
+        mocker.close()
+        self.assertEqual(3, self.count())
+        self.assertIn("backend - sqlite3", str(mocker))
+
+    def test_sqlite3_retryable(self):
+        backend = get_backend({'backend': 'sqlite3'})
+        self.assertTrue(backend.is_retryable(sqlite3.OperationalError("database is locked")))
+        self.assertFalse(backend.is_retryable(sqlite3.OperationalError("no such table: tbl")),
+                         "Should not retry invalid SQL.")
+
+    def test_dbapi_backend(self):
+        backend = DbApiBackend({'dsn': self.database, 'connect_args': {'timeout': 1}},
+                               module='sqlite3')
+        connection = backend.connect()
+        connection.execute("create table tbl (a text, b text)")
+        connection.close()
+        self.assertEqual(0, self.count())
+        self.assertEqual("sqlite3", str(backend))
+
+    def test_replay(self):
+        scenario = XML_1.format(''.join(INSERT.format(i) for i in range(5)))
+        replayer = SfbReplayer.fromstring(scenario, validate=False,
+                                          odbc_config={'backend': 'sqlite3',
+                                                       'database': self.database,
+                                                       'batch_size': 10})
+        replayer.run()
+        self.assertEqual(5, self.count())
+        self.assertEqual(0, replayer.get_stats()['failures'])
+
+    def test_barrier(self):
+        scenario = XML_1.format(INSERT.format(0) + INSERT.format(1) + "<ReplayBarrier/>" +
+                                INSERT.format(2))
+        for run in ('run', 'run_async'):
+            replayer = SfbReplayer.fromstring(scenario, validate=False,
+                                              odbc_config={'backend': 'sqlite3',
+                                                           'database': self.database,
+                                                           'batch_size': 10})
+            committed = []
+            send_message = replayer.odbc_mocker.send_message
+
+            def spy(msg, **kwargs):
+                try:
+                    committed.append(self.count())
+                except sqlite3.OperationalError:
+                    committed.append(0)
+                send_message(msg, **kwargs)
+            replayer.odbc_mocker.send_message = spy
+            getattr(replayer, run)()
+            self.assertEqual([0, 0, 0, 2], committed,
+                             "Should commit the open batch at a barrier in " + run)
+            self.assertEqual(3, self.count())
+            with sqlite3.connect(self.database) as connection:
+                connection.execute("drop table tbl")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from lxml import etree as ET
+from sfbtools.replayer.batch import BatchRunner
+from sfbtools.replayer.batch import find_scenarios
+from sfbtools.replayer.batch import get_targets
+from sfbtools.replayer.batch import load_scenario_options
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.unit_tests.test_connectionpool import RecordingHandler
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# A call of two messages 1 second apart
+XML_1 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>{0}</CallId>
+        <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Invite/>
+    </LyncDiagnostics>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>{0}</CallId>
+        <TimeStamp>2015-08-04T13:27:51.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Bye/>
+    </LyncDiagnostics>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+def crash_scenario(*args):
+    # Kills the worker process, as a crash in a native module would
+    os._exit(1)
+
+
+class RejectingHandler(RecordingHandler):
+
+    """
+    Accepts the empty request of a mocker opening, and rejects every message.
+    """
+
+    def do_POST(self):
+        if self.headers.get('Content-Length', '0') == '0':
+            self.server.status = 200
+        else:
+            self.server.status = 400
+        super().do_POST()
+
+
+class TestBatchRunner(ReceiverTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.mkdtemp()
+        self.options = {'validate': False, 'speed': 4, 'sdn_config': {'receiver': self.url}}
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, mode="w") as outfile:
+            outfile.write(content)
+        return path
+
+    def test_find_scenarios(self):
+        paths = [self.write(name, XML_1.format(name)) for name in ("b.xml", "a.xml")]
+        self.write("a.json", "{}")
+        self.assertEqual(sorted(paths), find_scenarios([self.dir]))
+        self.assertEqual([paths[0]], find_scenarios([os.path.join(self.dir, "b*")]))
+
+    def test_scenario_options(self):
+        path = self.write("a.xml", XML_1.format("a"))
+        self.write("a.json", '{"sdn_config": {"receiver": "http://other"}, "speed": 2}')
+        options = load_scenario_options(path, self.options)
+        self.assertEqual({'receiver': "http://other"}, options['sdn_config'])
+        self.assertEqual(2, options['speed'])
+        self.assertFalse(options['validate'])
+        self.assertEqual({('sdn', "http://other")}, get_targets(options))
+        options['sdn_config'] = [{'receiver': "http://a"}, {'receiver': "http://b"}]
+        self.assertEqual({('sdn', "http://a"), ('sdn', "http://b")}, get_targets(options))
+
+    def test_run(self):
+        paths = [self.write("call{0}.xml".format(i), XML_1.format("call{0}".format(i)))
+                 for i in range(3)]
+        paths.append(self.write("broken.xml", "<SfbReplay>"))
+        report = BatchRunner(jobs=2).run(paths, **self.options)
+        self.assertEqual(['passed', 'passed', 'passed', 'error'],
+                         [result.status for result in report.results])
+        self.assertEqual([2, 2, 2, 0], [result.sent for result in report.results])
+        self.assertEqual(2, report.results[0].jitter['count'])
+        self.assertFalse(report.passed)
+        self.assertIn("scenarios - 4 : passed - 3 : failed - 0 : errors - 1", str(report))
+
+        json_path = os.path.join(self.dir, "report.json")
+        report.write_json(json_path)
+        with open(json_path) as infile:
+            summary = json.load(infile)
+        self.assertEqual(6, summary['sent'])
+        self.assertEqual(paths[0], summary['results'][0]['scenario'])
+
+        junit_path = os.path.join(self.dir, "report.xml")
+        report.write_junit(junit_path)
+        suite = ET.parse(junit_path).getroot()
+        self.assertEqual(("4", "0", "1"), (suite.get("tests"), suite.get("failures"),
+                                           suite.get("errors")))
+        self.assertIsNotNone(suite.find("./testcase[4]/error"))
+
+    def test_failed(self):
+        self.server.RequestHandlerClass = RejectingHandler
+        path = self.write("a.xml", XML_1.format("a"))
+        report = BatchRunner(jobs=1, log_dir=os.path.join(self.dir, "logs")).run(
+            [path], **self.options)
+        self.assertEqual('failed', report.results[0].status)
+        self.assertEqual(2, report.results[0].failures)
+        self.assertEqual(1, len(os.listdir(os.path.join(self.dir, "logs"))),
+                         "Should write the output of each scenario to the log directory.")
+        suite = report.tojunit()
+        self.assertIsNotNone(suite.find("./testcase/failure"))
+
+    def test_dead_port(self):
+        path = self.write("a.xml", XML_1.format("a"))
+        options = dict(self.options, sdn_config={'receiver': "http://127.0.0.1:1/", 'timeout': 1})
+        result = BatchRunner(jobs=1).run([path], **options).results[0]
+        self.assertEqual('failed', result.status, "Should fail when nothing is delivered.")
+        self.assertEqual((0, 2), (result.delivered, result.scheduled))
+        self.assertIn("failed to open", result.error)
+        self.assertIn("delivered - 0/2", str(result))
+
+    def test_worker_crash(self):
+        paths = [self.write("call{0}.xml".format(i), XML_1.format("call{0}".format(i)))
+                 for i in range(3)]
+        with mock.patch('sfbtools.replayer.batch.run_scenario', crash_scenario):
+            report = BatchRunner(jobs=1).run(paths, **self.options)
+        self.assertEqual(['error'] * 3, [result.status for result in report.results],
+                         "Should report every scenario when a worker process crashes.")
+        self.assertIn("BrokenProcessPool", report.results[0].error)
+
+    def test_serialise_targets(self):
+        paths = [self.write("call{0}.xml".format(i), XML_1.format("call{0}".format(i)))
+                 for i in range(2)]
+        report = BatchRunner(jobs=2, serialise_targets=True).run(paths, **self.options)
+        self.assertTrue(report.passed)
+        self.assertGreaterEqual(report.duration, 0.5,
+                                "Should not replay scenarios with the same receiver at once.")
+
+
+if __name__ == '__main__':
+    unittest.main()
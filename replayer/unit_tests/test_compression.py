@@ -0,0 +1,87 @@
+import gzip
+import logging
+import unittest
+import zlib
+from sfbtools.receiver.receiver import SdnReceiver
+from sfbtools.replayer.compression import PayloadCompressor
+from sfbtools.replayer.compression import decompress
+from sfbtools.replayer.mocker import SdnMocker
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.xmlmessage import SdnMessage
+from sfbtools.receiver.unit_tests.test_receiver import VALID
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+PAYLOAD = b"<MediaLine><Quality>0.5</Quality></MediaLine>" * 100
+
+
+class TestPayloadCompressor(unittest.TestCase):
+
+    def test_compress(self):
+        compressor = PayloadCompressor('gzip', threshold=100, level=9)
+        compressed = compressor.compress(PAYLOAD)
+        self.assertEqual(PAYLOAD, gzip.decompress(compressed))
+        self.assertLess(len(compressed), len(PAYLOAD) / 10)
+        self.assertIsNone(compressor.compress(b"<a/>"), "Should not compress small bodies.")
+        compressor = PayloadCompressor('deflate', threshold=0)
+        self.assertEqual(PAYLOAD, zlib.decompress(compressor.compress(PAYLOAD)))
+
+    def test_totals(self):
+        compressor = PayloadCompressor('gzip', threshold=10)
+        first = compressor.compress(PAYLOAD)
+        self.assertEqual(first, compressor.compress(bytearray(PAYLOAD)),
+                         "Should compress identical bodies identically.")
+        compressor.compress(b"a")
+        self.assertEqual(2 * len(PAYLOAD), compressor.bytes_in,
+                         "Should only count compressed bodies.")
+        self.assertEqual(2 * len(first), compressor.bytes_out)
+
+    def test_config(self):
+        self.assertIsNone(PayloadCompressor.fromconfig({}))
+        compressor = PayloadCompressor.fromconfig({'compression': 'deflate',
+                                                   'compression_level': '1'})
+        self.assertEqual(('deflate', 1, 1024), (compressor.encoding, compressor.level,
+                                                 compressor.threshold))
+        for config in ({'compression': 'br'}, {'compression': 'gzip', 'compression_level': 10},
+                       {'compression': 'gzip', 'compression_threshold': 'big'}):
+            with self.assertRaises(ValueError):
+                PayloadCompressor.fromconfig(config)
+
+    def test_decompress(self):
+        self.assertEqual(PAYLOAD, decompress(gzip.compress(PAYLOAD), 'GZIP'))
+        self.assertEqual(PAYLOAD, decompress(PAYLOAD, None))
+        with self.assertRaises(ValueError):
+            decompress(PAYLOAD, 'gzip')
+        with self.assertRaises(ValueError):
+            decompress(PAYLOAD, 'br')
+
+
+class TestCompressedSend(ReceiverTestCase):
+
+    def test_send(self):
+        mocker = SdnMocker(receiver=self.url, version="2.1.1", compression='gzip',
+                           compression_threshold=100)
+        mocker.open()
+        mocker.send(PAYLOAD)
+        mocker.send(b"<a/>")
+        mocker.close()
+        bodies = [body for _, body in self.server.requests if body]
+        self.assertEqual(PAYLOAD, gzip.decompress(bodies[0]))
+        self.assertEqual(b"<a/>", bodies[1])
+        self.assertIn("compression - gzip", str(mocker))
+
+    def test_receiver(self):
+        with SdnReceiver(validate=True) as receiver:
+            mocker = SdnMocker(receiver=receiver.url, version="2.1.1",
+                               compression='deflate', compression_threshold=0)
+            mocker.open()
+            mocker.send_message(SdnMessage.fromstring(VALID))
+            mocker.close()
+        self.assertEqual(0, mocker.failures)
+        self.assertEqual({200: 1}, dict(receiver.statuses),
+                         "Should validate the decompressed message.")
+
+
+if __name__ == '__main__':
+    unittest.main()
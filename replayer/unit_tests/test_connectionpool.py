@@ -0,0 +1,160 @@
+import logging
+import socket
+import time
+import unittest
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.error import URLError
+from sfbtools.replayer.connectionpool import HTTPConnectionPool
+from sfbtools.replayer.mocker import SdnMocker
+from sfbtools.replayer.resilience import CircuitBreaker
+from sfbtools.replayer.xmlmessage import SdnMessage
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+SDN_MESSAGE = "<LyncDiagnostics><ConnectionInfo><TimeStamp>2015-08-04T13:27:50.0000000Z" \
+    "</TimeStamp></ConnectionInfo></LyncDiagnostics>"
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+
+    """
+    Keep-alive handler recording the client port of every request.
+    Responds with the status set on the server, and closes the connection
+    after each response if the server is configured to drop connections.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append((self.client_address[1], body))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.close_connection = self.server.drop_connections
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReceiverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.requests = []
+        self.server.status = 200
+        self.server.drop_connections = False
+        self.url = "http://127.0.0.1:{0}/SdnApiReceiver/site".format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHTTPConnectionPool(ReceiverTestCase):
+
+    def test_keep_alive(self):
+        pool = HTTPConnectionPool(self.url)
+        for i in range(5):
+            self.assertEqual(200, pool.post(b'<a/>'))
+        pool.close()
+        ports = set(port for port, _ in self.server.requests)
+        self.assertEqual(5, len(self.server.requests))
+        self.assertEqual(1, len(ports), "Should reuse a single connection.")
+        self.assertEqual(1, pool.connections_made)
+
+    def test_stale_reconnect(self):
+        self.server.drop_connections = True
+        pool = HTTPConnectionPool(self.url)
+        for i in range(3):
+            self.assertEqual(200, pool.post(b'<a/>'))
+        pool.close()
+        self.assertEqual(3, len(self.server.requests),
+                         "Should transparently reconnect stale connections.")
+
+    def test_error_status(self):
+        self.server.status = 503
+        pool = HTTPConnectionPool(self.url)
+        with self.assertRaises(HTTPError, msg="Should raise HTTPError for error responses."):
+            pool.post(b'<a/>')
+        pool.close()
+
+    def test_unreachable(self):
+        pool = HTTPConnectionPool("http://127.0.0.1:1/", timeout=1)
+        with self.assertRaises(URLError, msg="Should raise URLError for unreachable hosts."):
+            pool.post(b'<a/>')
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError, msg="Should only accept http and https URLs."):
+            HTTPConnectionPool("ftp://127.0.0.1/")
+        with self.assertRaises(ValueError, msg="Should raise ValueError for empty pools."):
+            HTTPConnectionPool(self.url, size=0)
+
+
+class TestSdnMocker(ReceiverTestCase):
+
+    def test_open_and_send(self):
+        mocker = SdnMocker(receiver=self.url, version='2.2', pool_size=2)
+        self.assertTrue(mocker.open())
+        self.assertTrue(mocker.send(b'<LyncDiagnostics/>'))
+        mocker.close()
+        self.assertEqual([b'', b'<LyncDiagnostics/>'],
+                         [body for _, body in self.server.requests])
+        self.assertEqual(1, len(set(port for port, _ in self.server.requests)),
+                         "Should reuse the connection opened by the probe.")
+
+    def test_closed(self):
+        mocker = SdnMocker(receiver=self.url, version='2.2')
+        with self.assertRaises(URLError, msg="Should not send while closed."):
+            mocker.send(b'<LyncDiagnostics/>')
+        mocker.dead_letter = mock.Mock()
+        mocker.send_message(SdnMessage.fromstring(SDN_MESSAGE))
+        self.assertEqual(1, mocker.failures, "Should count messages dropped while closed.")
+        self.assertEqual(1, mocker.dead_letter.write.call_count)
+        self.assertEqual([], self.server.requests)
+
+    def test_receiver_down(self):
+        self.server.status = 503
+        mocker = SdnMocker(receiver=self.url, version='2.2', retries=2, backoff=0,
+                           breaker_threshold=3, breaker_reset=60)
+        self.assertFalse(mocker.open())
+        self.assertEqual(3, len(self.server.requests), "Should retry a failed probe.")
+        self.assertEqual(CircuitBreaker.OPEN, mocker.guard.breaker.state)
+        mocker.close()
+
+    def test_receiver_recovers(self):
+        self.server.status = 503
+        mocker = SdnMocker(receiver=self.url, version='2.2')
+        self.assertFalse(mocker.open())
+        self.server.status = 200
+        mocker.send_message(SdnMessage.fromstring(SDN_MESSAGE))
+        mocker.close()
+        self.assertEqual(0, mocker.failures)
+        self.assertEqual([b'', b'', SDN_MESSAGE.encode('utf-8')],
+                         [body for _, body in self.server.requests],
+                         "Should probe the receiver again before sending.")
+
+    def test_receiver_unresponsive(self):
+        with socket.socket() as blackhole:
+            # Connections are queued by the kernel but never answered
+            blackhole.bind(('127.0.0.1', 0))
+            blackhole.listen()
+            mocker = SdnMocker(receiver="http://127.0.0.1:{0}/".format(
+                blackhole.getsockname()[1]), version='2.2')
+            mocker.PROBE_TIMEOUT = 0.2
+            started = time.monotonic()
+            self.assertFalse(mocker.open())
+            self.assertLess(time.monotonic() - started, 2, "Should time out the probe.")
+            mocker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import logging
+import socket
+import unittest
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.partition import get_partition
+from sfbtools.replayer.partition import get_partition_key
+from sfbtools.replayer.distributed import LocalWorkers
+from sfbtools.replayer.distributed import PROTOCOL_VERSION
+from sfbtools.replayer.distributed import ReplayCoordinator
+from sfbtools.replayer.distributed import get_worker_options
+from sfbtools.replayer.distributed import is_loopback
+from sfbtools.replayer.distributed import parse_address
+from sfbtools.replayer.distributed import recv_frame
+from sfbtools.replayer.distributed import send_frame
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+SDN_TEMPLATE = """
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>{0}</CallId>
+        {1}
+        <TimeStamp>2015-08-04T13:27:5{2}.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Invite/>
+    </LyncDiagnostics>"""
+SQL_MESSAGE = """
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:55.0000000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>"""
+SCENARIO_TEMPLATE = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>{0}
+  </ReplayMessages>
+</SfbReplay>
+"""
+# Two calls of a conference, and eight other calls
+XML_1 = SCENARIO_TEMPLATE.format(
+    SDN_TEMPLATE.format("aaaa", "<ConferenceId>CONF01</ConferenceId>", 0) +
+    SDN_TEMPLATE.format("bbbb", "<ConferenceId>CONF01</ConferenceId>", 0) +
+    ''.join(SDN_TEMPLATE.format("call{0}".format(i), "", i) for i in range(8)))
+XML_2 = SCENARIO_TEMPLATE.format(SDN_TEMPLATE.format("aaaa", "", 0) + SQL_MESSAGE)
+XML_3 = SCENARIO_TEMPLATE.format(SDN_TEMPLATE.format("aaaa", "", 0))
+
+
+class TestProtocol(unittest.TestCase):
+
+    def test_frames(self):
+        left, right = socket.socketpair()
+        with left, right:
+            send_frame(left, {'type': 'replay', 'partition': [0, 2]}, b"<SfbReplay/>")
+            send_frame(left, {'type': 'start'})
+            self.assertEqual(({'type': 'replay', 'partition': [0, 2]}, b"<SfbReplay/>"),
+                             recv_frame(right))
+            self.assertEqual(({'type': 'start'}, b""), recv_frame(right))
+            left.close()
+            with self.assertRaises(ConnectionError):
+                recv_frame(right)
+
+    def test_parse_address(self):
+        self.assertEqual((socket.AF_INET, ("10.0.0.1", 7100)), parse_address("10.0.0.1:7100"))
+        self.assertEqual((socket.AF_UNIX, "/tmp/worker.sock"),
+                         parse_address("unix:/tmp/worker.sock"))
+        with self.assertRaises(ValueError):
+            parse_address("10.0.0.1")
+
+    def test_worker_options(self):
+        options = {'speed': 10, 'sdn_config': [{'receiver': 'http://host/'}],
+                   'odbc_config': {'backend': 'pyodbc', 'database': 'db'}}
+        self.assertEqual(options, get_worker_options(options))
+        for options in ({'telemetry': '/tmp/telemetry.csv'}, {'dead_letter': 'dead.xml'},
+                        {'validation_cache': 'cache'}, {'partition': [0, 1]},
+                        {'sdn_config': 'http://host/'},
+                        {'sdn_config': {'mocker': 'record', 'path': 'out.rec'}},
+                        {'odbc_config': [{'path': 'out.rec'}]},
+                        {'odbc_config': {'backend': 'sqlite3', 'database': '/etc/db'}},
+                        {'odbc_config': {'backend': 'os'}}, ['speed'],
+                        {'odbc_config': {'driver': '/tmp/libdriver.so', 'database': 'db'}},
+                        {'odbc_config': {'driver': '{libdriver.SO}', 'database': 'db'}},
+                        {'odbc_config': {'driver': 'SQL Server', 'database': 'db;Driver=x'}}):
+            with self.assertRaises(ValueError, msg="Should reject " + str(options)):
+                get_worker_options(options)
+
+
+class TestPartition(unittest.TestCase):
+
+    def create_replayers(self, xml, count, **kwargs):
+        return [SfbReplayer.fromstring(xml, validate=False, partition=(index, count), **kwargs)
+                for index in range(count)]
+
+    def test_partition_key(self):
+        msgs = SfbReplayer.fromstring(XML_1, validate=False).replay_messages
+        self.assertEqual("conf01", get_partition_key(msgs[0]))
+        self.assertEqual(get_partition(msgs[0], 5), get_partition(msgs[1], 5),
+                         "Should send every call of a conference from one partition.")
+        self.assertEqual("call0", get_partition_key(msgs[2]))
+        self.assertEqual(msgs[0].get_ordering_key(), get_partition_key(msgs[0]),
+                         "Should partition by the key the lanes order by.")
+        sql = SfbReplayer.fromstring(XML_2, validate=False).replay_messages[1]
+        self.assertEqual(0, get_partition(sql, 5))
+
+    def test_schedule(self):
+        full = [(index, offset) for index, _, offset in
+                SfbReplayer.fromstring(XML_1, validate=False).schedule()]
+        partitions = [[(index, offset) for index, _, offset in replayer.schedule()]
+                      for replayer in self.create_replayers(XML_1, 3)]
+        self.assertEqual(full, sorted(sum(partitions, [])),
+                         "Should replay every message in one partition at its offset.")
+        self.assertTrue(all(partitions))
+
+    def test_clones(self):
+        replayers = self.create_replayers(XML_2, 2, clones=5)
+        self.assertEqual([6, 4], [len(list(replayer.replay_messages)) for replayer in replayers],
+                         "Should partition clones by number.")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            SfbReplayer.fromstring(XML_1, validate=False, partition=(2, 2))
+
+
+class TestDistributedReplay(ReceiverTestCase):
+
+    def get_messages(self):
+        # Mockers post an empty body when they open
+        return [body for _, body in self.server.requests if body]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workers = LocalWorkers(2).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workers.stop()
+
+    def test_replay(self):
+        coordinator = ReplayCoordinator(self.workers.addresses, start_delay=0.2)
+        report = coordinator.run(XML_1.encode(), validate=False, speed=1000,
+                                 sdn_config={'receiver': self.url})
+        self.assertEqual([], report.errors)
+        self.assertEqual(2, len(report.results))
+        self.assertEqual(10, report.sent)
+        self.assertEqual(0, report.failures)
+        self.assertEqual(10, len(self.get_messages()))
+        self.assertEqual(10, report.jitter_summary()['count'])
+        self.assertIn("Distributed Replay ::: workers - 2 : sent - 10", str(report))
+
+    def test_async_engine(self):
+        coordinator = ReplayCoordinator(self.workers.addresses, start_delay=0.2,
+                                        engine='async')
+        report = coordinator.run(XML_3.encode(), validate=False, max_rate=True, clones=4,
+                                 sdn_config={'receiver': self.url})
+        self.assertEqual(4, report.sent)
+        self.assertEqual(4, len(self.get_messages()))
+
+    def test_worker_error(self):
+        coordinator = ReplayCoordinator(self.workers.addresses, start_delay=0.2)
+        report = coordinator.run(b"<SfbReplay>", validate=False)
+        self.assertEqual(2, len(report.errors), "Should report the workers which failed.")
+        self.assertEqual(0, report.sent)
+        self.assertEqual(0, len(self.server.requests))
+
+    def test_rejected_options(self):
+        coordinator = ReplayCoordinator(self.workers.addresses)
+        with self.assertRaises(ValueError):
+            coordinator.run(XML_1.encode(), telemetry="telemetry.csv")
+        # Options sent by other peers are checked by the worker
+        with coordinator.connect(self.workers.addresses[0]) as conn:
+            send_frame(conn, {'type': 'replay', 'version': PROTOCOL_VERSION,
+                              'partition': [0, 1],
+                              'options': {'validate': False, 'dead_letter': 'dead.xml'}},
+                       XML_1.encode())
+            header, _ = recv_frame(conn)
+        self.assertEqual('error', header['type'])
+        self.assertIn("dead_letter", header['error'])
+
+    def test_token(self):
+        self.assertTrue(is_loopback("127.0.0.1:7100"))
+        self.assertFalse(is_loopback("0.0.0.0:7100"))
+        with LocalWorkers(1, token="secret") as workers:
+            report = ReplayCoordinator(workers.addresses, start_delay=0.2).run(
+                XML_3.encode(), validate=False, sdn_config={'receiver': self.url})
+            self.assertEqual(1, len(report.errors), "Should reject coordinators without the token.")
+            self.assertIn("token", report.errors[0][1])
+            report = ReplayCoordinator(workers.addresses, start_delay=0.2, token="secret").run(
+                XML_3.encode(), validate=False, max_rate=True, sdn_config={'receiver': self.url})
+            self.assertEqual(1, report.sent)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import logging
+import unittest
+import threading
+import time
+import asyncio
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.engine import ReplayLane
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# SDN messages at 0ms, 50ms and 100ms, with a SQL message at 10ms
+XML_1 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      </ConnectionInfo>
+    </LyncDiagnostics>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0100000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <TimeStamp>2015-08-04T13:27:50.0500000Z</TimeStamp>
+      </ConnectionInfo>
+    </LyncDiagnostics>
+    {barrier}
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <TimeStamp>2015-08-04T13:27:50.1000000Z</TimeStamp>
+      </ConnectionInfo>
+    </LyncDiagnostics>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+class FakeMocker():
+
+    """
+    Records the time each message is sent, after an optional send latency.
+    """
+
+    batching = False
+    name = None
+
+    def __init__(self, latency=0, max_in_flight=1):
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        self.sent = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_message(self, msg, delay=0, scheduled_ns=None):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+            self.sent.append((time.monotonic(), msg))
+
+
+class TestAsyncReplayEngine(unittest.TestCase):
+
+    def create_replayer(self, barrier=''):
+        replayer = SfbReplayer.fromstring(XML_1.format(barrier=barrier), validate=False)
+        replayer.sdn_mocker = FakeMocker()
+        replayer.odbc_mocker = FakeMocker(latency=0.3)
+        return replayer
+
+    def test_extract_barriers(self):
+        replayer = self.create_replayer(barrier='<ReplayBarrier/>')
+        self.assertEqual({3}, replayer.replay_barriers)
+        self.assertEqual(4, len(replayer.replay_messages))
+
+    def test_independent_lanes(self):
+        replayer = self.create_replayer()
+        start = time.monotonic()
+        replayer.run_async()
+        sdn_times = [t - start for t, _ in replayer.sdn_mocker.sent]
+        self.assertEqual(3, len(sdn_times))
+        self.assertEqual(1, len(replayer.odbc_mocker.sent))
+        self.assertLess(sdn_times[-1], 0.25,
+                        "A slow SQL lane should not delay SDN messages.")
+        self.assertEqual(4, len(replayer.scheduler.lateness))
+
+    def test_lane_order(self):
+        replayer = self.create_replayer()
+        replayer.run_async()
+        sent = [msg for _, msg in replayer.sdn_mocker.sent]
+        sdn_msgs = [msg for msg in replayer.replay_messages
+                    if msg in sent]
+        self.assertEqual(sdn_msgs, sent, "Should preserve message order within a lane.")
+
+    def test_barrier(self):
+        replayer = self.create_replayer(barrier='<ReplayBarrier/>')
+        replayer.run_async()
+        sql_time = replayer.odbc_mocker.sent[0][0]
+        last_sdn_time = replayer.sdn_mocker.sent[-1][0]
+        self.assertGreaterEqual(last_sdn_time, sql_time,
+                                "Should wait for every lane before crossing a barrier.")
+
+    def test_lane_error(self):
+        replayer = self.create_replayer()
+
+        def fail(msg, delay=0, scheduled_ns=None):
+            raise RuntimeError("send failed")
+        replayer.odbc_mocker.send_message = fail
+        with self.assertRaises(RuntimeError, msg="Should re-raise errors from a lane."):
+            replayer.run_async()
+
+
+class KeyedMessage():
+
+    def __init__(self, key, seq):
+        self.key = key
+        self.seq = seq
+
+    def get_ordering_key(self):
+        return self.key
+
+
+class TestReplayLaneWindow(unittest.TestCase):
+
+    def send_all(self, mocker, msgs, max_queued=None):
+        lane = ReplayLane(mocker, max_queued=max_queued)
+        pending = []
+
+        async def run():
+            for msg in msgs:
+                await lane.submit(msg)
+                pending.append(len(lane._pending))
+            await lane.drain()
+        try:
+            asyncio.run(run())
+        finally:
+            lane.close()
+        return pending
+
+    def test_concurrent_keys(self):
+        mocker = FakeMocker(latency=0.1, max_in_flight=4)
+        msgs = [KeyedMessage(key, 0) for key in 'abcd']
+        start = time.monotonic()
+        self.send_all(mocker, msgs)
+        self.assertLess(time.monotonic() - start, 0.3,
+                        "Should send different keys concurrently.")
+        self.assertEqual(4, mocker.peak_in_flight)
+
+    def test_window_bound(self):
+        mocker = FakeMocker(latency=0.02, max_in_flight=3)
+        msgs = [KeyedMessage(i, 0) for i in range(12)]
+        self.send_all(mocker, msgs)
+        self.assertEqual(12, len(mocker.sent))
+        self.assertLessEqual(mocker.peak_in_flight, 3,
+                             "Should never exceed max_in_flight.")
+
+    def test_queue_bound(self):
+        mocker = FakeMocker(latency=0.005, max_in_flight=2)
+        msgs = [KeyedMessage(None, seq) for seq in range(20)]
+        pending = self.send_all(mocker, msgs, max_queued=4)
+        self.assertEqual(list(range(20)), [msg.seq for _, msg in mocker.sent])
+        self.assertLessEqual(max(pending), 4, "Should wait while the lane is full.")
+
+    def test_key_fifo(self):
+        mocker = FakeMocker(latency=0.01, max_in_flight=4)
+        msgs = [KeyedMessage(key, seq) for seq in range(5) for key in 'ab']
+        self.send_all(mocker, msgs)
+        for key in 'ab':
+            sent = [msg.seq for _, msg in mocker.sent if msg.key == key]
+            self.assertEqual(list(range(5)), sent, "Should keep FIFO order within a key.")
+        self.assertLessEqual(mocker.peak_in_flight, 2,
+                             "Should send one message per key at a time.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import logging
+import unittest
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.loadgen import LoadGenerator
+from sfbtools.replayer.loadgen import derive_id
+from sfbtools.replayer.timeline import NS_PER_SECOND
+from sfbtools.replayer.timeline import datetime_to_ns
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# A 2 second call with a SQL message referencing the call id
+XML_1 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>e62b032e60f343a7a2ec7edd8cc627eb</CallId>
+        <ConferenceId>YSS9F2TL</ConferenceId>
+        <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Invite>
+        <Caller>
+          <Id>e9958b02ba</Id>
+          <URI>sip:user@lync2013.local</URI>
+        </Caller>
+        <Callee>
+          <URI>sip:user@lync2013.local;gruu;opaque=app:conf:audio-video:id:YSS9F2TL</URI>
+        </Callee>
+      </Invite>
+    </LyncDiagnostics>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:51.0000000Z</TimeStamp>
+      <Query>insert into tbl values ('e62b032e60f343a7a2ec7edd8cc627eb');</Query>
+    </SqlQueryMessage>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>E62B032E60F343A7A2EC7EDD8CC627EB</CallId>
+        <TimeStamp>2015-08-04T13:27:52.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Bye/>
+    </LyncDiagnostics>
+  </ReplayMessages>
+</SfbReplay>
+"""
+CALL_ID = "e62b032e60f343a7a2ec7edd8cc627eb"
+
+
+class TestDeriveId(unittest.TestCase):
+
+    def test_shape(self):
+        for original in (CALL_ID, "YSS9F2TL", "AdDbyzDtDq4T8szoRUOJL6Bn/jAG/g=="):
+            new_id = derive_id(original, 1, 0)
+            self.assertEqual(len(original), len(new_id))
+            self.assertNotEqual(original, new_id)
+        self.assertTrue(all(c in "0123456789abcdef" for c in derive_id(CALL_ID, 1, 0)))
+        new_id = derive_id("AdDb/g==", 1, 0)
+        self.assertEqual(("/", "=="), (new_id[4], new_id[6:]), "Should keep punctuation.")
+
+    def test_deterministic(self):
+        self.assertEqual(derive_id(CALL_ID, 1, 2), derive_id(CALL_ID.upper(), 1, 2).lower())
+        self.assertNotEqual(derive_id(CALL_ID, 1, 2), derive_id(CALL_ID, 1, 3))
+        self.assertNotEqual(derive_id(CALL_ID, 1, 2), derive_id(CALL_ID, 2, 2))
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def create_replayer(self, **kwargs):
+        return SfbReplayer.fromstring(XML_1, validate=False, **kwargs)
+
+    def test_clones(self):
+        replayer = self.create_replayer(clones=3, arrival_interval=1)
+        generator = replayer.load_generator
+        msgs = list(replayer.replay_messages)
+        self.assertEqual(9, len(msgs))
+        timestamps = [datetime_to_ns(msg.get_timestamp()) for msg in msgs]
+        self.assertEqual(sorted(timestamps), timestamps, "Should merge clones in time order.")
+        self.assertEqual(timestamps[0] + 4 * NS_PER_SECOND, timestamps[-1])
+        self.assertEqual(3, generator.peak_active)
+
+        sdn_keys = [msg.get_ordering_key() for msg in msgs if msg.lane == 'sdn']
+        self.assertEqual(6, len(set(sdn_keys)),
+                         "Should give each clone its own ConferenceId and CallId.")
+        self.assertNotIn(CALL_ID, sdn_keys)
+
+        first = generator.clone_message(1, 0, 0)
+        conference_id = derive_id("YSS9F2TL", 0, 1)
+        self.assertTrue(first.contains_conf_id(conference_id))
+        self.assertIn(b":id:" + conference_id.encode(), first.tobytes())
+        self.assertIn(derive_id("e9958b02ba", 0, 1).encode(), first.tobytes())
+        query = generator.clone_message(1, 1, 0).get_query()
+        self.assertIn(derive_id(CALL_ID, 0, 1), query, "Should rewrite ids in SQL queries.")
+        bye = generator.clone_message(1, 2, 0)
+        self.assertEqual(derive_id(CALL_ID, 0, 1), bye.get_ordering_key(),
+                         "Should rewrite ids consistently regardless of case.")
+
+    def test_active_clones(self):
+        generator = self.create_replayer(clones=50, arrival_interval=10).load_generator
+        self.assertEqual(150, len(list(generator)))
+        self.assertEqual(1, generator.peak_active,
+                         "Should only track clones between their first and last message.")
+
+    def test_arrivals(self):
+        generator = LoadGenerator([], [], 5, interval=2, arrival='poisson', seed=7)
+        arrivals = list(generator.arrivals())
+        self.assertEqual(arrivals, list(generator.arrivals()), "Should be seeded.")
+        self.assertEqual(sorted(arrivals), arrivals)
+        fixed = LoadGenerator([], [], 3, interval=2)
+        self.assertEqual([0, 2 * NS_PER_SECOND, 4 * NS_PER_SECOND], list(fixed.arrivals()))
+        with self.assertRaises(ValueError):
+            LoadGenerator([], [], 3, arrival='burst')
+
+    def test_schedule(self):
+        replayer = self.create_replayer(clones=2, arrival_interval=0.5, speed=2)
+        offsets = [offset for _, _, offset in replayer.schedule()]
+        self.assertEqual([0, 250000000, 500000000, 750000000, 1000000000, 1250000000],
+                         offsets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import logging
+import unittest
+from sfbtools.replayer.loadshape import LoadShape
+from sfbtools.replayer.loadshape import get_segments
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.timeline import NS_PER_SECOND
+from sfbtools.replayer.unit_tests.test_distributed import XML_1
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+SQL_MESSAGE = """
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:{0:02d}.0000000Z</TimeStamp>
+      <Query>insert into tbl values ({0});</Query>
+    </SqlQueryMessage>"""
+SHAPED_XML = """<?xml version="1.0"?>
+<SfbReplay xmlns="http://www.ir.com/SfbReplay">
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+    <LoadShape Burst="1" Interval="0.25">
+      <!-- 20, 10 and 20 messages in the three intervals -->
+      <Plateau Duration="0.25" Rate="80"/>
+      <Step Duration="0.5" From="40" To="80" Steps="2"/>
+    </LoadShape>
+  </ReplayConfiguration>
+  <ReplayMessages>{0}
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+def get_offsets(shape, elapsed_ns=0):
+    """
+    Returns the offsets of every message the shape allows, for a replay which
+    sends each message on time.
+    """
+    offsets = []
+    shape.start()
+    offset = shape.reserve(elapsed_ns)
+    while offset is not None:
+        offsets.append(offset)
+        offset = shape.reserve(offset)
+    return offsets
+
+
+class TestLoadShape(unittest.TestCase):
+
+    def test_parse(self):
+        stages = LoadShape.parse("ramp:600:10:2000, plateau:300:2000,STEP:300:2000:4000:3")
+        self.assertEqual({'kind': 'ramp', 'duration': 600, 'from': 10, 'to': 2000}, stages[0])
+        self.assertEqual('step', stages[2]['kind'])
+        shape = LoadShape(stages)
+        self.assertEqual(1200, shape.duration)
+        self.assertEqual("ramp:600:10:2000,plateau:300:2000,step:300:2000:4000:3", str(shape))
+        for spec in ("ramp:600:10", "surge:10:10", "plateau:ten:10", "plateau:10:-1",
+                     "step:10:1:2:1", "plateau:0:10", ""):
+            with self.assertRaises(ValueError, msg="Should raise ValueError for " + spec):
+                LoadShape.parse(spec)
+
+    def test_segments(self):
+        self.assertEqual([(2, 10, 10), (2, 20, 20), (2, 30, 30)],
+                         get_segments({'kind': 'step', 'duration': 6, 'from': 10, 'to': 30,
+                                       'steps': 3}))
+        self.assertEqual([(1, 500, 500), (9, 100, 100)],
+                         get_segments({'kind': 'spike', 'duration': 10, 'rate': 100,
+                                       'peak': 500, 'width': 1}))
+
+    def test_rate(self):
+        shape = LoadShape(LoadShape.parse("ramp:10:0:100,plateau:10:100"))
+        self.assertEqual(50, shape.rate(5))
+        self.assertEqual(100, shape.rate(15))
+        self.assertEqual(0, shape.rate(20))
+        self.assertAlmostEqual(125, shape.tokens(5))
+        self.assertAlmostEqual(1500, shape.tokens(20))
+        for t in (0.5, 5, 10, 12.5):
+            self.assertAlmostEqual(t, shape.time_at(shape.tokens(t)))
+        self.assertIsNone(shape.time_at(1501))
+
+    def test_token_bucket(self):
+        shape = LoadShape(LoadShape.parse("plateau:1:100"))
+        offsets = get_offsets(shape)
+        self.assertEqual(100, len(offsets))
+        self.assertEqual([0, NS_PER_SECOND // 100, 2 * NS_PER_SECOND // 100], offsets[:3])
+        # A late replay is only allowed burst messages straight away
+        shape = LoadShape(LoadShape.parse("plateau:1:100"), burst=5)
+        shape.start()
+        late = NS_PER_SECOND // 2
+        self.assertEqual([late] * 5, [shape.reserve(late) for _ in range(5)])
+        self.assertEqual(late + NS_PER_SECOND // 100, shape.reserve(late))
+
+    def test_ramp(self):
+        offsets = get_offsets(LoadShape(LoadShape.parse("ramp:2:10:90")))
+        self.assertIn(len(offsets), (100, 101))
+        gaps = [b - a for a, b in zip(offsets, offsets[1:])]
+        self.assertGreater(gaps[0], 5 * gaps[-1], "Should send faster as the rate ramps up.")
+
+    def test_summary(self):
+        shape = LoadShape(LoadShape.parse("plateau:1:10,plateau:1:20"), interval=1)
+        shape.start()
+        for i in range(10):
+            shape.record('sdn', i * NS_PER_SECOND // 10)
+        shape.record('sdn', 3 * NS_PER_SECOND // 2)
+        summary = shape.summary()
+        self.assertEqual([10, 20], [row['target'] for row in summary])
+        self.assertEqual([{'sdn': 10}, {'sdn': 1}], [row['achieved'] for row in summary])
+        report = shape.report()
+        self.assertIn("target - 20.0 msg/s : sdn - 1.0 msg/s (5%)", report)
+
+    def test_partial_interval(self):
+        shape = LoadShape(LoadShape.parse("plateau:1:40"))
+        shape.start()
+        for i in range(17):
+            shape.record('sdn', i * NS_PER_SECOND // 40)
+        shape.finish(NS_PER_SECOND * 17 // 40)
+        summary = shape.summary()
+        self.assertEqual(1, len(summary))
+        self.assertEqual(0.425, summary[0]['end'], "Should end the interval with the replay.")
+        self.assertAlmostEqual(40, summary[0]['target'])
+        self.assertAlmostEqual(40, summary[0]['achieved']['sdn'])
+        shape.finish(5 * NS_PER_SECOND)
+        self.assertEqual(1, shape.summary()[0]['end'], "Should end the interval with the shape.")
+
+    def test_scaled(self):
+        shape = LoadShape(LoadShape.parse("ramp:10:10:100,spike:10:50:200:2"), burst=2)
+        half = shape.scaled(0.5)
+        self.assertEqual("ramp:10:5:50,spike:10:25:100:2", str(half))
+        self.assertEqual(2, half.burst)
+
+
+class TestShapedReplay(unittest.TestCase):
+
+    def test_scenario(self):
+        scenario = SHAPED_XML.format("".join(SQL_MESSAGE.format(i) for i in range(60)))
+        replayer = SfbReplayer.fromstring(scenario, odbc_config={'mocker': 'null'})
+        self.assertEqual({'stages': [{'kind': 'plateau', 'duration': 0.25, 'rate': 80},
+                                     {'kind': 'step', 'duration': 0.5, 'from': 40, 'to': 80,
+                                      'steps': 2}],
+                          'burst': 1, 'interval': 0.25},
+                         replayer.replay_config['load_shape'])
+        replayer.run()
+        self.assertEqual(50, replayer.odbc_mocker.count,
+                         "Should stop sending when the load shape ends.")
+        summary = replayer.load_shape.summary()
+        self.assertEqual(3, len(summary))
+        for target, row in zip([80, 40, 80], summary):
+            self.assertAlmostEqual(target, row['target'])
+            self.assertAlmostEqual(row['target'], row['achieved']['sql'], delta=8)
+
+    def test_override(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, sdn_config={'mocker': 'null'},
+                                          load_shape="plateau:0.2:100", load_burst=10)
+        self.assertEqual(10, replayer.load_shape.burst)
+        self.assertIn("Load Shape ::: plateau:0.2:100", str(replayer))
+        replayer.run_async()
+        self.assertEqual(10, replayer.sdn_mocker.count, "Should stop when the messages run out.")
+        self.assertAlmostEqual(10, sum(row['achieved']['sdn'] * (row['end'] - row['start'])
+                                       for row in replayer.load_shape.summary()))
+
+    def test_max_rate(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, sdn_config={'mocker': 'null'},
+                                          load_shape="plateau:0.2:100", max_rate=True)
+        self.assertTrue(replayer.measures_jitter(),
+                        "Should measure the lateness against the load shape.")
+        replayer.run()
+        self.assertEqual(10, replayer.get_stats()['jitter']['count'])
+
+    def test_soak(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, sdn_config={'mocker': 'null'},
+                                          load_shape="plateau:0.3:100", loop=True)
+        replayer.run()
+        self.assertIn(replayer.sdn_mocker.count, range(28, 32),
+                      "Should end a soak when the load shape ends.")
+
+    def test_partition(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, sdn_config={'mocker': 'null'},
+                                          load_shape="ramp:10:10:100", partition=(0, 2))
+        self.assertEqual("ramp:10:5:50", str(replayer.load_shape))
+
+
+if __name__ == '__main__':
+    unittest.main()
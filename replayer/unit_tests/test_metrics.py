@@ -0,0 +1,104 @@
+import logging
+import threading
+import unittest
+import urllib.request
+from urllib.error import HTTPError
+from sfbtools.replayer.metrics import ERRORS
+from sfbtools.replayer.metrics import IN_FLIGHT
+from sfbtools.replayer.metrics import LATENCY
+from sfbtools.replayer.metrics import MetricsServer
+from sfbtools.replayer.metrics import ReplayMetrics
+from sfbtools.replayer.metrics import SENT
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.telemetry import STATUS_ERROR
+from sfbtools.replayer.unit_tests.test_batch import RejectingHandler
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.unit_tests.test_distributed import XML_1
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+NS_PER_MS = 1000000
+
+
+class TestReplayMetrics(unittest.TestCase):
+
+    def test_shards(self):
+        metrics = ReplayMetrics()
+
+        def send():
+            for i in range(1000):
+                metrics.record_send('sdn', 200 if i % 10 else 500, NS_PER_MS)
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counters, histograms = metrics.collect()
+        self.assertEqual(4000, counters[(SENT, 'sdn')], "Should sum the shard of every thread.")
+        self.assertEqual(400, counters[(ERRORS, 'sdn')])
+        self.assertEqual(4000, histograms[(LATENCY, 'sdn')][-2])
+        self.assertEqual(4, len(metrics._shards))
+
+    def test_histogram(self):
+        metrics = ReplayMetrics(buckets=(0.001, 0.01))
+        for latency in (NS_PER_MS // 2, NS_PER_MS, 5 * NS_PER_MS, 20 * NS_PER_MS):
+            metrics.observe(LATENCY, latency, 'sql')
+        _, histograms = metrics.collect()
+        self.assertEqual([2, 3, 4, 26500000], histograms[(LATENCY, 'sql')],
+                         "Should count values equal to the bound in its bucket.")
+
+    def test_render(self):
+        metrics = ReplayMetrics(buckets=(0.001, 0.01))
+        metrics.record_send('sdn', 200, 2 * NS_PER_MS)
+        metrics.record_send('sql', STATUS_ERROR, 2 * NS_PER_MS)
+        metrics.inc(IN_FLIGHT, 'sdn')
+        metrics.add_collector('sfbreplay_send_retries', lambda: {'sdn': 3})
+        text = metrics.render()
+        self.assertIn("# TYPE sfbreplay_messages_sent counter\n", text)
+        self.assertIn('sfbreplay_messages_sent_total{lane="sdn"} 1\n', text)
+        self.assertIn('sfbreplay_send_errors_total{lane="sql"} 1\n', text)
+        self.assertIn('sfbreplay_send_retries_total{lane="sdn"} 3\n', text)
+        self.assertIn('sfbreplay_in_flight{lane="sdn"} 1\n', text)
+        self.assertIn('sfbreplay_send_latency_seconds_bucket{lane="sdn",le="0.001"} 0\n', text)
+        self.assertIn('sfbreplay_send_latency_seconds_bucket{lane="sdn",le="0.01"} 1\n', text)
+        self.assertIn('sfbreplay_send_latency_seconds_bucket{lane="sdn",le="+Inf"} 1\n', text)
+        self.assertIn('sfbreplay_send_latency_seconds_sum{lane="sdn"} 0.002\n', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+
+class TestMetricsReplay(ReceiverTestCase):
+
+    def scrape(self, server, path="/metrics"):
+        with urllib.request.urlopen(server.url.replace("/metrics", path), timeout=5) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith(
+                "application/openmetrics-text"))
+            return response.read().decode("utf-8")
+
+    def test_server(self):
+        metrics = ReplayMetrics()
+        with MetricsServer(metrics, host="127.0.0.1", port=0) as server:
+            self.assertIn("# EOF", self.scrape(server))
+            with self.assertRaises(HTTPError):
+                self.scrape(server, "/other")
+
+    def test_replay(self):
+        self.server.RequestHandlerClass = RejectingHandler
+        metrics = ReplayMetrics()
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, max_rate=True,
+                                          metrics=metrics,
+                                          sdn_config={'receiver': self.url})
+        with MetricsServer(metrics, host="127.0.0.1", port=0) as server:
+            replayer.run_async()
+            text = self.scrape(server)
+        self.assertIn('sfbreplay_messages_sent_total{lane="sdn"} 10\n', text)
+        self.assertIn('sfbreplay_send_errors_total{lane="sdn"} 10\n', text)
+        self.assertIn('sfbreplay_send_retries_total{lane="sdn"} 0\n', text)
+        self.assertIn('sfbreplay_in_flight{lane="sdn"} 0\n', text)
+        self.assertIn('sfbreplay_queue_depth{lane="sdn"} 0\n', text)
+        self.assertIn('sfbreplay_schedule_lateness_seconds_count 10\n', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import csv
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from sfbtools.receiver.receiver import LatencyModel
+from sfbtools.receiver.receiver import SdnReceiver
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.xmlmessage import SerialisedMessage
+from sfbtools.replayer.unit_tests.test_backends import INSERT
+from sfbtools.replayer.unit_tests.test_backends import XML_1 as SQL_XML
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.unit_tests.test_distributed import XML_1
+from sfbtools.replayer.unit_tests.test_odbc_mocker import sql_message
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+NS_PER_SECOND = 1000000000
+
+
+class TestMirror(ReceiverTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as telemetry:
+            pass
+        self.path = telemetry.name
+
+    def tearDown(self):
+        super().tearDown()
+        os.remove(self.path)
+
+    def read(self):
+        with open(self.path, newline="") as infile:
+            return list(csv.DictReader(infile))
+
+    def test_sdn(self):
+        with SdnReceiver() as receiver:
+            replayer = SfbReplayer.fromstring(XML_1, validate=False, max_rate=True,
+                                              telemetry=self.path,
+                                              sdn_config=[{'receiver': self.url},
+                                                          {'receiver': receiver.url,
+                                                           'name': 'new'}])
+            replayer.run()
+        bodies = [body for _, body in self.server.requests if body]
+        self.assertEqual(10, len(bodies))
+        self.assertEqual(10, len(receiver.arrivals))
+        self.assertEqual(sum(len(body) for body in bodies),
+                         sum(arrival.size for arrival in receiver.arrivals),
+                         "Should send the same payloads to every receiver.")
+        self.assertEqual(['sdn-1', 'new'], [mocker.name for mocker in replayer.mockers])
+        self.assertEqual({'sdn-1': 10, 'new': 10},
+                         {name: summary['count']
+                          for name, summary in replayer.telemetry.summary().items()})
+
+    def test_slow_target(self):
+        with SdnReceiver(latency=LatencyModel(0.1)) as receiver:
+            replayer = SfbReplayer.fromstring(XML_1, validate=False, max_rate=True,
+                                              telemetry=self.path,
+                                              sdn_config=[{'receiver': receiver.url,
+                                                           'name': 'slow'},
+                                                          {'receiver': self.url,
+                                                           'name': 'fast'}])
+            replayer.run_async()
+        finished = {}
+        for row in self.read():
+            done = int(row['actual_ns']) + int(row['latency_ns'])
+            finished[row['target']] = max(finished.get(row['target'], 0), done)
+        self.assertGreater(finished['slow'], NS_PER_SECOND * 0.9)
+        self.assertLess(finished['fast'], NS_PER_SECOND * 0.5,
+                        "A slow target should not delay the other targets.")
+
+    def test_odbc(self):
+        databases = []
+        for _ in range(2):
+            with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as database:
+                databases.append(database.name)
+        try:
+            scenario = SQL_XML.format(''.join(INSERT.format(i) for i in range(3)))
+            replayer = SfbReplayer.fromstring(scenario, validate=False,
+                                              odbc_config=[{'backend': 'sqlite3',
+                                                            'database': database}
+                                                           for database in databases])
+            replayer.run_async()
+            for database in databases:
+                with sqlite3.connect(database) as connection:
+                    self.assertEqual(3, connection.execute(
+                        "select count(*) from tbl").fetchone()[0])
+        finally:
+            for database in databases:
+                os.remove(database)
+
+    def test_barrier(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False,
+                                          odbc_config=[{'backend': 'sqlite3', 'batch_size': 10},
+                                                       {'backend': 'sqlite3', 'batch_size': 10}])
+        for mocker in replayer.odbc_mockers:
+            mocker.flush = mock.Mock()
+        replayer.flush_mockers()
+        for mocker in replayer.odbc_mockers:
+            mocker.flush.assert_called_once_with()
+
+    def test_names(self):
+        with self.assertRaises(ValueError, msg="Should raise ValueError for duplicate names."):
+            SfbReplayer.fromstring(XML_1, validate=False,
+                                   sdn_config=[{'receiver': self.url, 'name': 'a'},
+                                               {'mocker': 'null', 'name': 'a'}])
+        replayer = SfbReplayer.fromstring(XML_1, validate=False,
+                                          sdn_config={'receiver': self.url})
+        self.assertEqual('sdn', replayer.sdn_mocker.name)
+        self.assertEqual([replayer.sdn_mocker], replayer.mockers)
+
+
+class TestSerialisedMessage(unittest.TestCase):
+
+    def test_wrapper(self):
+        msg = sql_message(0, 1)
+        serialised = SerialisedMessage(msg)
+        self.assertEqual(msg.tobytes(), serialised.tobytes())
+        self.assertIs(serialised.tobytes(), serialised.tobytes(), "Should serialise once.")
+        self.assertEqual('sql', serialised.lane)
+        self.assertEqual(msg.get_query(), serialised.get_query())
+        self.assertEqual(str(msg), str(serialised))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import logging
+import unittest
+import sqlite3
+from unittest import mock
+from sfbtools.replayer.mocker import OdbcMocker
+from sfbtools.replayer.xmlmessage import SqlQueryMessage
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+SQL_TEMPLATE = """
+<SqlQueryMessage>
+  <TimeStamp>{0}</TimeStamp>
+  <Query>insert into tbl values (?, ?)</Query>
+  <Parameters>
+    <Parameter>{1}</Parameter>
+    <Parameter>b</Parameter>
+  </Parameters>
+</SqlQueryMessage>
+"""
+
+# The batching tests run on the sqlite3 backend, so they do not need an ODBC driver
+ODBC_CONFIG = {'backend': 'sqlite3'}
+
+
+class CountingConnection():
+
+    """
+    Wraps a sqlite3 connection and counts commits.
+    """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute("create table tbl (a text, b text)")
+        self.commits = 0
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def commit(self):
+        self.commits += 1
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        pass
+
+    def count(self):
+        return self.connection.execute("select count(*) from tbl").fetchone()[0]
+
+
+def sql_message(seconds, value=1):
+    timestamp = "2015-08-04T13:27:{0:02d}.0000000Z".format(seconds)
+    return SqlQueryMessage.fromstring(SQL_TEMPLATE.format(timestamp, value))
+
+
+class TestOdbcMockerBatching(unittest.TestCase):
+
+    def open_mocker(self, **kwargs):
+        config = dict(ODBC_CONFIG, **kwargs)
+        mocker = OdbcMocker(**config)
+        self.connection = CountingConnection()
+        with mock.patch.object(mocker.backend, 'connect', return_value=self.connection):
+            mocker.open()
+        return mocker
+
+    def test_per_message(self):
+        mocker = self.open_mocker()
+        self.assertFalse(mocker.batching)
+        for i in range(3):
+            mocker.send_message(sql_message(i, i))
+        self.assertEqual(3, self.connection.commits, "Should commit every message.")
+        self.assertEqual(3, self.connection.count())
+        mocker.close()
+
+    def test_batch_size(self):
+        mocker = self.open_mocker(batch_size=2)
+        for i in range(5):
+            mocker.send_message(sql_message(0, i))
+        self.assertEqual(2, self.connection.commits, "Should commit every 2 messages.")
+        self.assertEqual(4, self.connection.count())
+        mocker.close()
+        self.assertEqual(3, self.connection.commits, "Should commit the open batch on close.")
+        self.assertEqual(5, self.connection.count())
+
+    def test_batch_window(self):
+        mocker = self.open_mocker(batch_size=100, batch_window=1)
+        mocker.send_message(sql_message(0))
+        mocker.send_message(sql_message(1))
+        self.assertEqual(0, self.connection.commits)
+        mocker.send_message(sql_message(5))
+        self.assertEqual(1, self.connection.commits,
+                         "Should commit when a message is outside the window.")
+        mocker.idle(0.5)
+        self.assertEqual(1, self.connection.commits,
+                         "Should keep the batch open for waits within the window.")
+        mocker.idle(2)
+        self.assertEqual(2, self.connection.commits,
+                         "Should commit when idle for longer than the window.")
+        mocker.close()
+
+    def test_idle_without_window(self):
+        mocker = self.open_mocker(batch_size=100)
+        mocker.send_message(sql_message(0))
+        mocker.idle(0.001)
+        self.assertEqual(1, self.connection.commits, "Should commit on any idle time.")
+        mocker.close()
+
+    def test_executemany(self):
+        mocker = self.open_mocker(batch_size=100)
+        with mock.patch.object(mocker, '_cursor') as cursor:
+            for i in range(3):
+                mocker.send_message(sql_message(0, i))
+            mocker.send("delete from tbl")
+            self.assertEqual(0, cursor.executemany.call_count,
+                             "Should not execute before the batch is flushed.")
+            mocker.flush()
+            self.assertEqual(1, cursor.executemany.call_count,
+                             "Should group rows of the same query.")
+            self.assertEqual([('0', 'b'), ('1', 'b'), ('2', 'b')],
+                             cursor.executemany.call_args[0][1])
+            cursor.execute.assert_called_with("delete from tbl")
+
+    def test_retry_deadlock(self):
+        mocker = self.open_mocker(retries=2, backoff=0)
+        commit = self.connection.commit
+        failures = [mocker.backend.module.Error('40001', 'deadlock')]
+
+        def flaky_commit():
+            if failures:
+                raise failures.pop()
+            commit()
+        self.connection.commit = flaky_commit
+        mocker.send_message(sql_message(0))
+        self.assertEqual(1, self.connection.commits, "Should retry the transaction.")
+        self.assertEqual(1, self.connection.count(), "Should not insert the row twice.")
+        self.assertEqual(1, mocker.guard.retries)
+        self.assertEqual(0, mocker.failures)
+        mocker.close()
+
+    def test_dead_letter(self):
+        mocker = self.open_mocker(batch_size=2, retries=1, backoff=0)
+        mocker.dead_letter = mock.Mock()
+
+        def failing_commit():
+            raise mocker.backend.module.Error('42000', 'syntax error')
+        self.connection.commit = failing_commit
+        msgs = [sql_message(0, 1), sql_message(0, 2)]
+        for msg in msgs:
+            mocker.send_message(msg)
+        self.assertEqual(2, mocker.failures, "Should fail every message of the batch.")
+        self.assertEqual(0, mocker.guard.retries, "Should not retry non-transient errors.")
+        self.assertEqual(msgs, [c[0][0] for c in mocker.dead_letter.write.call_args_list])
+        self.assertEqual(0, self.connection.count(), "Should roll back the batch.")
+        mocker.close()
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError, msg="Should raise ValueError for batch_size < 1."):
+            OdbcMocker(**dict(ODBC_CONFIG, batch_size=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
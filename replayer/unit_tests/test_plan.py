@@ -0,0 +1,125 @@
+import logging
+import os
+import tempfile
+import unittest
+import datetime as DT
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.plan import ReplayPlan
+from sfbtools.replayer.timeline import datetime_to_ns
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+XML_1 = """
+<SfbReplay xmlns="http://www.ir.com/SfbReplay">
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>{currenttime}</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <StartTime>2015-08-04T13:27:50.0000000Z</StartTime>
+        <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+        <CallId>CALL-1</CallId>
+      </ConnectionInfo>
+    </LyncDiagnostics>
+    <ReplayBarrier/>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T14:27:51.5000000+01:00</TimeStamp>
+      <Query>insert into tbl values (?, ?)</Query>
+      <Parameters>
+        <Parameter>a</Parameter>
+        <Parameter>b</Parameter>
+      </Parameters>
+    </SqlQueryMessage>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+class TestReplayPlan(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".plan")
+        os.close(fd)
+        self.plans = []
+
+    def tearDown(self):
+        for plan in self.plans:
+            plan.close()
+        os.remove(self.path)
+
+    def compile(self, currenttime='false'):
+        replayer = SfbReplayer.fromstring(XML_1.format(currenttime=currenttime),
+                                          validate=False)
+        self.assertEqual(2, replayer.compile(self.path))
+        planned = SfbReplayer.fromfile(self.path)
+        self.plans.append(planned.plan)
+        return replayer, planned
+
+    def test_isplan(self):
+        self.compile()
+        self.assertTrue(ReplayPlan.isplan(self.path))
+        with open(self.path, mode="w") as plan_file:
+            plan_file.write(XML_1)
+        self.assertFalse(ReplayPlan.isplan(self.path))
+        with self.assertRaises(ValueError):
+            ReplayPlan(self.path)
+
+    def test_configuration(self):
+        replayer, planned = self.compile()
+        self.assertEqual(replayer.replay_config, planned.replay_config)
+        self.assertEqual({1}, planned.replay_barriers)
+        self.assertEqual(list(replayer.timeline.timestamps),
+                         list(planned.timeline.timestamps))
+
+    def test_messages(self):
+        replayer, planned = self.compile()
+        sdn, sql = planned.replay_messages
+        self.assertIs(replayer.sdn_mocker, planned.get_mocker(sdn))
+        self.assertEqual("sdn", sdn.lane)
+        self.assertEqual("sql", sql.lane)
+        self.assertEqual(replayer.replay_messages[0].tobytes(), sdn.tobytes())
+        self.assertEqual("call-1", sdn.get_ordering_key())
+        self.assertEqual("insert into tbl values (?, ?)", sql.get_query())
+        self.assertEqual(("a", "b"), sql.get_parameters())
+        self.assertEqual(replayer.replay_messages[1].get_timestamp(), sql.get_timestamp())
+        self.assertIn(b"<TimeStamp>2015-08-04T13:27:51.5000000Z</TimeStamp>", sql.tobytes(),
+                      "Should normalise timestamps to UTC.")
+
+    def test_close(self):
+        self.compile()
+        replayer = SfbReplayer.fromfile(self.path, sdn_config={'mocker': 'null'},
+                                        odbc_config={'mocker': 'null'})
+        replayer.run()
+        self.assertEqual(2, replayer.get_stats()['sent'])
+        self.assertTrue(replayer.plan._mmap.closed, "Should close the plan after the replay.")
+
+    def test_version(self):
+        SfbReplayer.fromstring(XML_1.format(currenttime='false'), validate=False,
+                               sdn_config={'mocker': 'null', 'version': '2.2'}).compile(self.path)
+        with self.assertRaises(ValueError, msg="Should not replay a plan for another schema."):
+            SfbReplayer.fromfile(self.path)
+        planned = SfbReplayer.fromfile(self.path, sdn_config={'mocker': 'null', 'version': '2.2'})
+        self.plans.append(planned.plan)
+
+    def test_set_timestamp(self):
+        _, planned = self.compile(currenttime='true')
+        now = DT.datetime.now(DT.timezone.utc)
+        self.assertLess(abs(datetime_to_ns(now) - planned.timeline.rebased[0]), 5 * 10 ** 9,
+                        "Should rebase the plan timeline to the current time.")
+        sdn = planned.replay_messages[0]
+        planned.write_timestamp(0, sdn)
+        stamp = sdn.get_timestamp()
+        self.assertEqual(planned.timeline.get_rebased_timestamp(0), stamp)
+        payload = sdn.tobytes()
+        self.assertIn("<TimeStamp>{0:%Y-%m-%dT%H:%M:%S.%f}0Z</TimeStamp>".format(stamp).encode(),
+                      payload)
+        self.assertIn(b"<StartTime>2015-08-04T13:27:50.0000000Z</StartTime>", payload,
+                      "Should only patch the TimeStamp field.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import logging
+import os
+import tempfile
+import unittest
+from sfbtools.replayer.mocker import NullMocker
+from sfbtools.replayer.mocker import RecordingMocker
+from sfbtools.replayer.mocker import SdnMocker
+from sfbtools.replayer.mocker import create_mocker
+from sfbtools.replayer.recording import MessageRecorder
+from sfbtools.replayer.recording import MessageRecording
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.unit_tests.test_distributed import XML_1
+from sfbtools.replayer.unit_tests.test_distributed import XML_2
+from sfbtools.replayer.unit_tests.test_odbc_mocker import sql_message
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+
+class TestSinkMockers(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(suffix=".rec", delete=False) as recording:
+            pass
+        self.path = recording.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_create_mocker(self):
+        self.assertIsInstance(create_mocker({'mocker': 'null'}, SdnMocker), NullMocker)
+        self.assertIsInstance(create_mocker({'receiver': "http://localhost/", 'version': "2.1.1"},
+                                            SdnMocker), SdnMocker)
+        with self.assertRaises(ValueError):
+            create_mocker({'mocker': 'file'}, SdnMocker)
+        with self.assertRaises(ValueError, msg="Should raise ValueError without a path."):
+            create_mocker({'mocker': 'record'}, SdnMocker)
+
+    def test_null(self):
+        mocker = NullMocker()
+        msg = sql_message(0, 1)
+        mocker.send_message(msg)
+        self.assertEqual(0, mocker.count, "Should not accept messages when closed.")
+        mocker.open()
+        mocker.send_message(msg)
+        mocker.send_message(msg)
+        mocker.close()
+        self.assertEqual(2, mocker.count)
+        self.assertEqual(2 * len(msg.tobytes()), mocker.bytes)
+        self.assertIn("messages - 2", str(mocker))
+
+    def test_recording(self):
+        mocker = RecordingMocker(path=self.path, max_delay=5)
+        mocker.open()
+        for i in range(3):
+            mocker.send_message(sql_message(0, i), scheduled_ns=(3 - i) * 1000)
+        mocker.close()
+        recording = MessageRecording(self.path)
+        self.assertEqual(5, recording.max_delay)
+        records = list(recording.records())
+        self.assertEqual([3000, 2000, 1000], [record[0] for record in records])
+        self.assertEqual({'sql'}, set(record[1] for record in records))
+        self.assertEqual(sql_message(0, 2).tobytes(), records[2][2])
+        self.assertTrue(MessageRecording.isrecording(self.path))
+        self.assertFalse(MessageRecording.isrecording(__file__))
+
+    def test_truncated(self):
+        recorder = MessageRecorder(self.path)
+        recorder.write('sdn', 0, b"<a/>")
+        recorder.close()
+        with open(self.path, mode="r+b") as recording:
+            recording.truncate(os.path.getsize(self.path) - 1)
+        with self.assertRaises(ValueError):
+            list(MessageRecording(self.path).records())
+        with self.assertRaises(ValueError):
+            MessageRecording(__file__)
+
+
+class TestRecordingReplay(ReceiverTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with tempfile.NamedTemporaryFile(suffix=".rec", delete=False) as recording:
+            pass
+        self.path = recording.name
+
+    def tearDown(self):
+        super().tearDown()
+        os.remove(self.path)
+
+    def test_null_replay(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, max_rate=True,
+                                          sdn_config={'mocker': 'null'})
+        replayer.run_async()
+        self.assertEqual(10, replayer.sdn_mocker.count)
+        self.assertEqual(10, replayer.get_stats()['delivered'])
+        self.assertEqual([], self.server.requests)
+
+    def test_capture_replay(self):
+        replayer = SfbReplayer.fromstring(XML_2, validate=False, speed=10,
+                                          sdn_config={'mocker': 'record', 'path': self.path},
+                                          odbc_config={'mocker': 'record', 'path': self.path})
+        replayer.run()
+        self.assertIs(replayer.sdn_mocker.recorder, replayer.odbc_mocker.recorder,
+                      "Should share the recording of both lanes.")
+        records = list(MessageRecording(self.path).records())
+        self.assertEqual(['sdn', 'sql'], [record[1] for record in records])
+        self.assertEqual(10, MessageRecording(self.path).max_delay)
+
+        replayer = SfbReplayer.fromfile(self.path, validate=False, max_rate=True,
+                                        sdn_config={'receiver': self.url},
+                                        odbc_config={'mocker': 'null'})
+        replayer.run()
+        bodies = [body for _, body in self.server.requests if body]
+        self.assertEqual([records[0][2]], bodies, "Should replay the recorded payload.")
+        self.assertEqual(1, replayer.odbc_mocker.count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import logging
 import unittest
+import datetime as DT
 from sfbtools import sfbreplay
 from sfbtools.replayer.replayer import SfbReplayer
 
@@ -30,6 +31,48 @@ XML_3 = """
   </ReplayConfiguration>
 </SfbReplay>
 """
+XML_4 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>true</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:52.5000000Z</TimeStamp>
+      <Query>insert into tbl values (2);</Query>
+    </SqlQueryMessage>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+XML_5 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+    <Speed>2.5</Speed>
+    <MaxRate>false</MaxRate>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:52.5000000Z</TimeStamp>
+      <Query>insert into tbl values (2);</Query>
+    </SqlQueryMessage>
+  </ReplayMessages>
+</SfbReplay>
+"""
 
 
 class TestArgumentParsing(unittest.TestCase):
@@ -63,6 +106,16 @@ class TestArgumentParsing(unittest.TestCase):
         with self.assertRaises(ValueError, msg="Should raise ValueError for incorrect syntax."):
             sfbreplay.process_dict_arg(test_in)
 
+    def test_process_config_arg(self):
+        self.assertEqual({'a': 1}, sfbreplay.process_config_arg("{'a': 1}"))
+        self.assertEqual([{'a': 1}, {'b': 2}],
+                         sfbreplay.process_config_arg(" [{'a': 1}, {'b': 2}]"))
+        for test_in in ("[]", "[{'a': 1}, 2]", "[{'a': 1}"):
+            with self.assertRaises(ValueError, msg="Should raise ValueError for " + test_in):
+                sfbreplay.process_config_arg(test_in)
+        self.assertEqual([{'a': 1, 'mocker': 'null'}, {'mocker': 'null'}],
+                         sfbreplay.get_mocker_config([{'a': 1}, {}], 'null'))
+
 
 class TestGetters(unittest.TestCase):
 
@@ -75,14 +128,20 @@ class TestGetters(unittest.TestCase):
         self.assertEqual(self.msg_1.replay_config,
                          {'max_delay': 100,
                           'realtime': True,
-                          'currenttime': False},
+                          'currenttime': False,
+                          'speed': None,
+                          'max_rate': None,
+                          'load_shape': None},
                          "Should return a dictionary of configurations.")
 
     def test_extract_replay_config_empty(self):
         self.assertEqual(self.msg_2.replay_config,
                          {'max_delay': None,
                           'realtime': None,
-                          'currenttime': None},
+                          'currenttime': None,
+                          'speed': None,
+                          'max_rate': None,
+                          'load_shape': None},
                          "Should return a dictionary of configurations with None values.")
 
     def test_extract_replay_invalid(self):
@@ -90,5 +149,67 @@ class TestGetters(unittest.TestCase):
                                msg="Should raise ValueError for incorrect element content."):
             SfbReplayer.fromstring(XML_3, validate=False)
 
+
+class TestTimingModes(unittest.TestCase):
+
+    def test_speed_from_scenario(self):
+        replayer = SfbReplayer.fromstring(XML_5, validate=False)
+        self.assertEqual(replayer.replay_config['speed'], 2.5)
+        self.assertEqual(replayer.replay_config['max_rate'], False)
+        self.assertEqual([0, 1000000000], list(replayer.calculate_offsets()),
+                         "Should divide the intervals by the speed.")
+
+    def test_speed_override(self):
+        replayer = SfbReplayer.fromstring(XML_5, validate=False, speed=5)
+        self.assertEqual([0, 500000000], list(replayer.calculate_offsets()),
+                         "Keyword parameters should override the scenario.")
+
+    def test_invalid_speed(self):
+        with self.assertRaises(ValueError, msg="Should raise ValueError for speed <= 0."):
+            SfbReplayer.fromstring(XML_5, validate=False, speed=0)
+
+    def test_max_rate(self):
+        replayer = SfbReplayer.fromstring(XML_4, validate=False, max_rate=True)
+        self.assertEqual([0, 0], list(replayer.calculate_offsets()),
+                         "Should send messages back to back.")
+        self.assertFalse(replayer.measures_jitter(), "Should not report elapsed time as jitter.")
+        self.assertIsNone(replayer.get_stats()['jitter'])
+        msg_1, msg_2 = replayer.replay_messages
+        replayer.write_timestamp(0, msg_1)
+        replayer.write_timestamp(1, msg_2)
+        self.assertLessEqual(msg_1.get_timestamp(), msg_2.get_timestamp(),
+                             "Should stamp messages with their send time.")
+        self.assertLess(DT.datetime.now(DT.timezone.utc) - msg_2.get_timestamp(),
+                        DT.timedelta(seconds=10))
+
+    def test_speed_timestamps(self):
+        replayer = SfbReplayer.fromstring(XML_4, validate=False, speed=5)
+        msg_1, msg_2 = replayer.replay_messages
+        replayer.write_timestamp(0, msg_1)
+        replayer.write_timestamp(1, msg_2)
+        self.assertEqual(msg_2.get_timestamp() - msg_1.get_timestamp(),
+                         DT.timedelta(seconds=0.5),
+                         "Should compress the updated timestamps by the speed.")
+
+
+class TestUpdateTimestamps(unittest.TestCase):
+
+    def setUp(self):
+        self.replayer = SfbReplayer.fromstring(XML_4, validate=False)
+
+    def test_lazy_write_back(self):
+        msg_1, msg_2 = self.replayer.replay_messages
+        original = msg_1.get_timestamp()
+        self.assertEqual(len(self.replayer.timeline), 2)
+        self.assertEqual(original, DT.datetime(2015, 8, 4, 13, 27, 50, 0, DT.timezone.utc),
+                         "Should not write timestamps before the message is sent.")
+        self.replayer.write_timestamp(0, msg_1)
+        self.replayer.write_timestamp(1, msg_2)
+        self.assertGreater(msg_1.get_timestamp(), original,
+                           "Should write the rebased timestamp.")
+        self.assertEqual(msg_2.get_timestamp() - msg_1.get_timestamp(),
+                         DT.timedelta(seconds=2.5),
+                         "Should preserve the interval between messages.")
+
 if __name__ == '__main__':
     unittest.main()
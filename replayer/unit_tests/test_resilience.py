@@ -0,0 +1,141 @@
+import logging
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.resilience import CircuitBreaker
+from sfbtools.replayer.resilience import DeadLetterWriter
+from sfbtools.replayer.resilience import RetryPolicy
+from sfbtools.replayer.resilience import SendGuard
+from sfbtools.replayer.xmlmessage import SqlQueryMessage
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+SQL_TEMPLATE = """
+<SqlQueryMessage>
+  <TimeStamp>2015-08-04T13:27:5{0}.0000000Z</TimeStamp>
+  <Query>insert into tbl values ({0});</Query>
+</SqlQueryMessage>
+"""
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_no_retries(self):
+        self.assertIsNone(RetryPolicy().get_delay(0), "Should not retry by default.")
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(retries=4, backoff=1, max_backoff=3, rng=random.Random(1))
+        for attempt, full in enumerate([1, 2, 3, 3]):
+            delay = policy.get_delay(attempt)
+            self.assertTrue(full / 2 <= delay <= full,
+                            "Delay {0} should be within [{1}, {2}].".format(delay, full / 2, full))
+        self.assertIsNone(policy.get_delay(4), "Should stop after the configured retries.")
+
+    def test_negative(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(retries=-1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_disabled(self):
+        breaker = CircuitBreaker()
+        for _ in range(10):
+            breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_open_half_open_close(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertEqual(1, breaker.trips)
+        breaker.before_send()
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state, "Failed trial should reopen.")
+        breaker.before_send()
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        self.assertEqual(0, breaker.failures)
+
+
+class TestSendGuard(unittest.TestCase):
+
+    def test_retry_then_succeed(self):
+        guard = SendGuard(RetryPolicy(retries=2, backoff=0))
+        func = mock.Mock(side_effect=[OSError("reset"), "ok"])
+        self.assertEqual("ok", guard.call(func, 1, errors=(OSError,)))
+        self.assertEqual(2, func.call_count)
+        self.assertEqual(1, guard.retries)
+
+    def test_retries_exhausted(self):
+        on_retry = mock.Mock()
+        guard = SendGuard(RetryPolicy(retries=2, backoff=0))
+        func = mock.Mock(side_effect=OSError("reset"))
+        with self.assertRaises(OSError):
+            guard.call(func, errors=(OSError,), on_retry=on_retry)
+        self.assertEqual(3, func.call_count)
+        self.assertEqual(2, on_retry.call_count)
+
+    def test_not_retryable(self):
+        guard = SendGuard(RetryPolicy(retries=2, backoff=0), is_retryable=lambda e: False)
+        func = mock.Mock(side_effect=OSError("rejected"))
+        with self.assertRaises(OSError):
+            guard.call(func, errors=(OSError,))
+        self.assertEqual(1, func.call_count)
+
+    def test_other_errors(self):
+        guard = SendGuard(RetryPolicy(retries=2, backoff=0))
+        func = mock.Mock(side_effect=KeyError("bug"))
+        with self.assertRaises(KeyError):
+            guard.call(func, errors=(OSError,))
+        self.assertEqual(1, func.call_count, "Should not retry unexpected errors.")
+
+    def test_fromconfig(self):
+        guard = SendGuard.fromconfig({'retries': '3', 'backoff': 0.1,
+                                      'breaker_threshold': 5, 'breaker_reset': 2})
+        self.assertEqual(3, guard.retry_policy.retries)
+        self.assertEqual(0.1, guard.retry_policy.backoff)
+        self.assertEqual(5, guard.breaker.threshold)
+        self.assertEqual(2, guard.breaker.reset_timeout)
+        with self.assertRaises(ValueError):
+            SendGuard.fromconfig({'retries': 'many'})
+
+
+class TestDeadLetterWriter(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xml")
+        os.close(fd)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_no_file_without_messages(self):
+        writer = DeadLetterWriter(self.path)
+        writer.close()
+        self.assertFalse(os.path.exists(self.path), "Should only create the file on write.")
+
+    def test_replayable(self):
+        writer = DeadLetterWriter(self.path, max_delay=5)
+        for i in range(3):
+            writer.write(SqlQueryMessage.fromstring(SQL_TEMPLATE.format(i)))
+        writer.close()
+        self.assertEqual(3, writer.count)
+        replayer = SfbReplayer.fromfile(self.path, validate=False)
+        self.assertEqual(3, len(replayer.replay_messages))
+        self.assertEqual(5, replayer.replay_config['max_delay'])
+        self.assertEqual("insert into tbl values (2);",
+                         replayer.replay_messages[2].get_query())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import unittest
+import time
+from sfbtools.replayer.scheduler import ReplayScheduler
+from sfbtools.replayer.scheduler import percentile
+from sfbtools.replayer.scheduler import NS_PER_MILLISECOND
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(1, percentile(values, 0))
+
+    def test_single(self):
+        self.assertEqual(7, percentile([7], 99))
+
+    def test_empty(self):
+        self.assertIsNone(percentile([], 50))
+
+
+class TestReplayScheduler(unittest.TestCase):
+
+    def test_not_started(self):
+        with self.assertRaises(ValueError, msg="Should raise ValueError if not started."):
+            ReplayScheduler().wait_until(0)
+
+    def test_absolute_targets(self):
+        scheduler = ReplayScheduler()
+        scheduler.start()
+        for offset in (10, 20, 30):
+            scheduler.wait_until(offset * NS_PER_MILLISECOND)
+        elapsed = scheduler.elapsed()
+        self.assertGreaterEqual(elapsed, 30 * NS_PER_MILLISECOND,
+                                "Should not send before the target.")
+        self.assertEqual(3, len(scheduler.lateness))
+        self.assertTrue(all(x >= 0 for x in scheduler.lateness))
+
+    def test_no_drift(self):
+        scheduler = ReplayScheduler()
+        scheduler.start()
+        scheduler.wait_until(5 * NS_PER_MILLISECOND)
+        # Simulate a slow send, the next target is still relative to the start
+        time.sleep(0.02)
+        scheduler.wait_until(10 * NS_PER_MILLISECOND)
+        self.assertGreater(scheduler.lateness[1], 10 * NS_PER_MILLISECOND,
+                           "Should record lateness when the target has passed.")
+        scheduler.wait_until(40 * NS_PER_MILLISECOND)
+        self.assertLess(scheduler.elapsed(), 60 * NS_PER_MILLISECOND,
+                        "Should not accumulate the slow send as drift.")
+
+    def test_async_yields(self):
+        scheduler = ReplayScheduler()
+        ticks = []
+
+        async def count_ticks():
+            while True:
+                ticks.append(time.monotonic_ns())
+                await asyncio.sleep(0)
+
+        async def wait():
+            ticker = asyncio.ensure_future(count_ticks())
+            scheduler.start()
+            await scheduler.wait_until_async(ReplayScheduler.SPIN_NS // 2)
+            ticker.cancel()
+
+        asyncio.run(wait())
+        self.assertGreaterEqual(scheduler.elapsed(), ReplayScheduler.SPIN_NS // 2)
+        self.assertGreater(len(ticks), 1, "Should let other coroutines run while waiting.")
+
+    def test_jitter_summary(self):
+        scheduler = ReplayScheduler()
+        scheduler.start()
+        scheduler.lateness.extend([NS_PER_MILLISECOND, 2 * NS_PER_MILLISECOND,
+                                   3 * NS_PER_MILLISECOND])
+        summary = scheduler.jitter_summary()
+        self.assertEqual({'count': 3, 'p50': 2.0, 'p99': 3.0, 'max': 3.0}, summary)
+
+    def test_empty_report(self):
+        scheduler = ReplayScheduler()
+        self.assertEqual({'count': 0, 'p50': None, 'p99': None, 'max': None},
+                         scheduler.jitter_summary())
+        self.assertIn("no messages", scheduler.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,6 +34,16 @@ XML_3 = """
 """
 
 
+XML_4 = """
+<LyncDiagnostics>
+    <ConnectionInfo>
+        <ConferenceId>Conf1234</ConferenceId>
+        <TimeStamp>2015-08-04T09:11:10.8226250-04:00</TimeStamp>
+    </ConnectionInfo>
+</LyncDiagnostics>
+"""
+
+
 class TestSdnMessageInit(unittest.TestCase):
 
     def test_valid_xml(self):
@@ -166,6 +176,27 @@ class TestContainsConfId(unittest.TestCase):
         self.assertFalse(self.msg_funcs['incorrect_tree'](*conf_ids))
 
 
+class TestGetOrderingKey(unittest.TestCase):
+
+    def test_call_id(self):
+        msg = SdnMessage.fromstring(XML_1)
+        self.assertEqual("hello1234@", msg.get_ordering_key(),
+                         "Should return the lower case id.")
+        msg.root.find(msg.qualify_xpath("./ConnectionInfo/ConferenceId")).text = " "
+        msg.root.find(msg.qualify_xpath("./ConnectionInfo/CallId")).text = " Call1234 "
+        self.assertEqual("call1234", msg.get_ordering_key(),
+                         "Should fall back to the stripped CallId.")
+
+    def test_conference_id(self):
+        msg = SdnMessage.fromstring(XML_4)
+        self.assertEqual("conf1234", msg.get_ordering_key(),
+                         "Should key every call of a conference by the ConferenceId.")
+
+    def test_no_element(self):
+        msg = SdnMessage.fromstring(XML_2)
+        self.assertIsNone(msg.get_ordering_key())
+
+
 class TestGetTimestamp(unittest.TestCase):
 
     @classmethod
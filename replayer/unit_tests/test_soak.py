@@ -0,0 +1,163 @@
+import datetime as DT
+import itertools
+import logging
+import unittest
+from unittest import mock
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.scheduler import ReplayScheduler
+from sfbtools.replayer.soak import SoakMonitor
+from sfbtools.replayer.timeline import NS_PER_SECOND
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# A 2 second call
+XML_1 = """
+<SfbReplay>
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>e62b032e60f343a7a2ec7edd8cc627eb</CallId>
+        <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Invite/>
+    </LyncDiagnostics>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:51.0000000Z</TimeStamp>
+      <Query>insert into tbl values ('e62b032e60f343a7a2ec7edd8cc627eb');</Query>
+    </SqlQueryMessage>
+    <LyncDiagnostics>
+      <ConnectionInfo>
+        <CallId>e62b032e60f343a7a2ec7edd8cc627eb</CallId>
+        <TimeStamp>2015-08-04T13:27:52.0000000Z</TimeStamp>
+      </ConnectionInfo>
+      <Bye/>
+    </LyncDiagnostics>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+class TestSoakSchedule(unittest.TestCase):
+
+    def create_replayer(self, **kwargs):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, **kwargs)
+        replayer.scheduler.start()
+        return replayer
+
+    def test_iterations(self):
+        replayer = self.create_replayer(duration=7)
+        schedule = list(replayer.schedule())
+        self.assertEqual([0, 1, 2, 0, 1, 2, 0], [index for index, _, _ in schedule])
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6],
+                         [offset // NS_PER_SECOND for _, _, offset in schedule],
+                         "Should start each iteration a mean message delay after the last.")
+        self.assertEqual(2, replayer.soak_monitor.iteration)
+        call_ids = [msg.get_ordering_key() for _, msg, _ in schedule if msg.lane == 'sdn']
+        self.assertEqual(call_ids[0], call_ids[1])
+        self.assertEqual(3, len(set(call_ids)), "Should rewrite the ids in each iteration.")
+        self.assertNotIn(replayer.replay_messages[0].get_ordering_key(), call_ids)
+        self.assertIn(call_ids[2], schedule[4][1].get_query())
+
+    def test_single_message(self):
+        replayer = self.create_replayer(loop=True)
+        self.assertEqual(10 * NS_PER_SECOND, replayer.get_iteration_gap([0]),
+                         "Should wait MaxDelay between iterations of a single message.")
+        self.assertEqual(0, self.create_replayer(loop=True, max_rate=True).get_iteration_gap([0]))
+
+    def test_timestamps(self):
+        replayer = self.create_replayer(loop=True)
+        now = DT.datetime.now(DT.timezone.utc)
+        for index, msg, _ in itertools.islice(replayer.schedule(), 4):
+            replayer.write_timestamp(index, msg)
+            self.assertLess(abs(msg.get_timestamp() - now), DT.timedelta(seconds=10),
+                            "Should stamp every iteration with the current time.")
+        self.assertEqual(2015, replayer.replay_messages[0].get_timestamp().year,
+                         "Should not modify the scenario messages.")
+
+    def test_max_rate_duration(self):
+        replayer = self.create_replayer(duration=0.05, max_rate=True)
+        count = sum(1 for _ in replayer.schedule())
+        self.assertGreater(count, 3, "Should loop until the duration has passed.")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.create_replayer(loop=True, clones=2)
+        with self.assertRaises(ValueError):
+            self.create_replayer(duration=0)
+
+
+class TestSoakMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.scheduler = ReplayScheduler()
+        self.mocker = mock.Mock(failures=0)
+        self.monitor = SoakMonitor(self.scheduler, [self.mocker, None], interval=10,
+                                   clock=lambda: self.now)
+
+    def test_report(self):
+        self.monitor.start()
+        self.scheduler.lateness.extend([1000000, 2000000])
+        self.assertIsNone(self.monitor.record(5))
+        self.mocker.failures = 2
+        self.now = 10 * NS_PER_SECOND
+        report = self.monitor.record(15)
+        self.assertIn("rate - 2.0 msg/s : failures - 2 : total sent - 20", report)
+        self.assertIn("jitter p99 - 2.000ms", report)
+        self.assertEqual(0, len(self.scheduler.lateness), "Should clear the jitter samples.")
+
+        self.now = 15 * NS_PER_SECOND
+        self.monitor.record(5)
+        self.assertIn("rate - 1.0 msg/s : failures - 0 : total sent - 25 : "
+                      "total failures - 2", self.monitor.report())
+        self.assertEqual(2, self.monitor.reports)
+
+    def test_jitter_summary(self):
+        self.monitor.start()
+        self.scheduler.lateness.extend([1000000, 2000000])
+        self.now = 10 * NS_PER_SECOND
+        self.monitor.record()
+        self.scheduler.lateness.extend([3001234, 4000000])
+        self.assertEqual({'count': 4, 'p50': 2.0, 'p99': 4.0, 'max': 4.0},
+                         self.monitor.jitter_summary(),
+                         "Should summarise every interval of the replay.")
+        self.monitor.report()
+        self.assertEqual(0, len(self.scheduler.lateness))
+        self.assertEqual({'count': 4, 'p50': 2.0, 'p99': 4.0, 'max': 4.0},
+                         self.monitor.jitter_summary())
+
+    def test_max_rate(self):
+        monitor = SoakMonitor(self.scheduler, [self.mocker], interval=10,
+                              clock=lambda: self.now, jitter=False)
+        monitor.start()
+        self.scheduler.lateness.append(5 * NS_PER_SECOND)
+        self.assertNotIn("jitter", monitor.report(), "Should not report elapsed time as jitter.")
+
+
+class TestSoakReplay(unittest.TestCase):
+
+    def test_summary(self):
+        replayer = SfbReplayer.fromstring(XML_1, validate=False, duration=0.3, speed=20,
+                                          stats_interval=0.02, sdn_config={'mocker': 'null'},
+                                          odbc_config={'mocker': 'null'})
+        with mock.patch('builtins.print') as printed:
+            replayer.run()
+        output = [call[0][0] for call in printed.call_args_list]
+        stats = replayer.get_stats()
+        self.assertGreater(stats['sent'], 3)
+        self.assertEqual(stats['sent'], stats['jitter']['count'])
+        self.assertIn("Replay Jitter ::: messages - {0}".format(stats['sent']),
+                      "\n".join(output))
+        self.assertEqual(replayer.soak_monitor.reports,
+                         sum(1 for line in output if line.startswith("Soak Stats")),
+                         "Should print every report once.")
+
+
+if __name__ == '__main__':
+    unittest.main()
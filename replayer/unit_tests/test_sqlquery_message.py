@@ -26,6 +26,19 @@ XML_3 = """
 """
 
 
+XML_4 = """
+<SqlQueryMessage>
+  <TimeStamp>2015-08-04T13:27:54.4519455Z</TimeStamp>
+  <Query>insert into tbl values (?, ?, ?);</Query>
+  <Parameters>
+    <Parameter>1</Parameter>
+    <Parameter></Parameter>
+    <Parameter>abc</Parameter>
+  </Parameters>
+</SqlQueryMessage>
+"""
+
+
 class TestSqlQueryMessage(unittest.TestCase):
 
     def test_valid_xml(self):
@@ -73,3 +86,15 @@ class TestGetQuery(unittest.TestCase):
         actual = self.msg_3.get_query()
         expected = None
         self.assertEqual(actual, expected, "Should return None if element doesn't exist.")
+
+
+class TestGetParameters(unittest.TestCase):
+
+    def test_parameters(self):
+        msg = SqlQueryMessage.fromstring(XML_4)
+        self.assertEqual(msg.get_parameters(), ('1', '', 'abc'),
+                         "Should return every parameter as a string.")
+
+    def test_no_elem(self):
+        msg = SqlQueryMessage.fromstring(XML_1)
+        self.assertIsNone(msg.get_parameters(), "Should return None if element doesn't exist.")
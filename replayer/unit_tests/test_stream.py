@@ -0,0 +1,88 @@
+import logging
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sfbtools.replayer.replayer import SfbReplayer
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+XML_1 = """<?xml version="1.0"?>
+<SfbReplay xmlns="http://www.ir.com/SfbReplay">
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+    <Speed>2</Speed>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>
+    <ReplayBarrier/>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:53.0000000Z</TimeStamp>
+      <Query>insert into tbl values (2);</Query>
+    </SqlQueryMessage>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:28:53.0000000Z</TimeStamp>
+      <{query}>insert into tbl values (3);</{query}>
+    </SqlQueryMessage>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+class TestScenarioStream(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xml")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def create_replayers(self, query="Query", **kwargs):
+        with open(self.path, mode="w") as scenario_file:
+            scenario_file.write(XML_1.format(query=query))
+        return (SfbReplayer.fromfile(self.path, validate=False),
+                SfbReplayer.fromfile(self.path, lazy=True, **kwargs))
+
+    def test_configuration(self):
+        replayer, lazy = self.create_replayers()
+        self.assertEqual(replayer.replay_config, lazy.replay_config)
+        self.assertEqual(set(), lazy.replay_barriers, "Should not read messages up front.")
+
+    def test_schedule(self):
+        replayer, lazy = self.create_replayers()
+        schedule = list(lazy.schedule())
+        self.assertEqual(list(replayer.calculate_offsets()), [o for _, _, o in schedule])
+        self.assertEqual([0, 1, 2], [i for i, _, _ in schedule])
+        self.assertEqual(replayer.replay_barriers, lazy.replay_barriers)
+        self.assertEqual([msg.tobytes().strip() for msg in replayer.replay_messages],
+                         [msg.tobytes().strip() for _, msg, _ in schedule])
+
+    def test_validation(self):
+        _, lazy = self.create_replayers(query="Statement")
+        schedule = lazy.schedule()
+        self.assertEqual(0, next(schedule)[0], "Should replay messages before the error.")
+        with self.assertRaises(ValueError, msg="Should raise ValueError on invalid messages."):
+            list(schedule)
+
+    def test_run(self):
+        _, lazy = self.create_replayers(speed=1000)
+        lazy.odbc_mocker = mock.Mock(batching=False)
+        lazy.run()
+        self.assertEqual(3, lazy.odbc_mocker.send_message.call_count)
+        self.assertEqual(3, len(lazy.timeline))
+
+    def test_compile(self):
+        _, lazy = self.create_replayers()
+        with self.assertRaises(ValueError, msg="Should not compile streamed scenarios."):
+            lazy.compile(self.path + ".plan")
+
+
+if __name__ == '__main__':
+    unittest.main()
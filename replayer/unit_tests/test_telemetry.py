@@ -0,0 +1,173 @@
+import csv
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.telemetry import STATUS_ERROR
+from sfbtools.replayer.telemetry import TELEMETRY_FIELDS
+from sfbtools.replayer.telemetry import TelemetrySink
+from sfbtools.replayer.telemetry import read_binary_telemetry
+from sfbtools.replayer.unit_tests.test_backends import INSERT
+from sfbtools.replayer.unit_tests.test_backends import XML_1 as SQL_XML
+from sfbtools.replayer.unit_tests.test_batch import RejectingHandler
+from sfbtools.replayer.unit_tests.test_connectionpool import ReceiverTestCase
+from sfbtools.replayer.unit_tests.test_distributed import XML_1 as SDN_XML
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+NS_PER_MS = 1000000
+
+
+class TestTelemetrySink(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as telemetry:
+            pass
+        self.path = telemetry.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, format):
+        sink = TelemetrySink(self.path, format=format, targets=['sdn', 'sql', 'old'])
+        sink.start(1000)
+        sink.record('sdn', 0, 1000, 200, 5 * NS_PER_MS, 100)
+        sink.record('sql', None, 2000, 3, 1 * NS_PER_MS, 20)
+        sink.record('sdn', 10, 3000, 503, 7 * NS_PER_MS, 100)
+        sink.record('sdn', 10, 3000, 200, 9 * NS_PER_MS, 100, target='old')
+        sink.close()
+        return sink
+
+    def test_csv(self):
+        self.write('csv')
+        with open(self.path, newline="") as infile:
+            rows = list(csv.reader(infile))
+        self.assertEqual(list(TELEMETRY_FIELDS), rows[0])
+        self.assertEqual(['0', '0', 'sdn', 'sdn', '200', '5000000', '100'], rows[1])
+        self.assertEqual(['10', '2000', 'sdn', 'old', '200', '9000000', '100'], rows[4])
+        self.assertEqual(['1000', '1000', 'sql', 'sql', '3', '1000000', '20'], rows[2],
+                         "Should default the scheduled time to the actual send time.")
+
+    def test_jsonl(self):
+        self.write('jsonl')
+        with open(self.path) as infile:
+            records = [json.loads(line) for line in infile]
+        self.assertEqual(4, len(records))
+        self.assertEqual({'scheduled_ns': 10, 'actual_ns': 2000, 'lane': 'sdn', 'target': 'sdn',
+                          'status': 503, 'latency_ns': 7 * NS_PER_MS, 'bytes': 100}, records[2])
+
+    def test_binary(self):
+        self.write('binary')
+        records = list(read_binary_telemetry(self.path))
+        self.assertEqual(4, len(records))
+        self.assertEqual({'scheduled_ns': 0, 'actual_ns': 0, 'lane': 'sdn', 'target': 'sdn',
+                          'status': 200, 'latency_ns': 5 * NS_PER_MS, 'bytes': 100}, records[0])
+        self.assertEqual('sql', records[1]['lane'])
+        self.assertEqual(('sdn', 'old'), (records[3]['lane'], records[3]['target']))
+        with self.assertRaises(ValueError, msg="Should raise ValueError for other files."):
+            list(read_binary_telemetry(__file__))
+
+    def test_summary(self):
+        summary = self.write('csv').summary()
+        self.assertEqual(['old', 'sdn', 'sql'], list(summary))
+        self.assertEqual(2, summary['sdn']['count'])
+        self.assertEqual(1, summary['sdn']['errors'], "Should count 503 responses as errors.")
+        self.assertEqual(200, summary['sdn']['bytes'])
+        self.assertEqual(7, summary['sdn']['max'])
+        self.assertEqual(1, summary['sql']['p50'])
+        self.assertEqual(1000, summary['sql']['throughput'])
+
+    def test_histogram(self):
+        sink = TelemetrySink()
+        sink.start(0)
+        for i in range(100000):
+            sink.record('sdn', 0, i, 200, NS_PER_MS + i, 10)
+        summary = sink.summary()['sdn']
+        self.assertLessEqual(len(sink.lanes['sdn'].latencies), 1000,
+                             "Should not keep every latency.")
+        self.assertAlmostEqual(1.05, summary['p50'], delta=0.02)
+        self.assertAlmostEqual(1.099999, summary['max'])
+
+    def test_report(self):
+        sink = TelemetrySink()
+        self.assertEqual("Telemetry ::: no messages sent", sink.report())
+        sink.start(0)
+        for i in range(100):
+            sink.record('sdn', None, i * NS_PER_MS, STATUS_ERROR if i < 5 else 200,
+                        (i + 1) * NS_PER_MS, 10)
+        summary = sink.summary()['sdn']
+        self.assertEqual(5, summary['errors'])
+        self.assertEqual((50, 90, 99, 100),
+                         (summary['p50'], summary['p90'], summary['p99'], summary['max']))
+        self.assertAlmostEqual(100 / 0.199, summary['throughput'])
+        self.assertIn("Telemetry sdn ::: sends - 100 : errors - 5", sink.report())
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            TelemetrySink(format='xml')
+
+
+class TestTelemetryReplay(ReceiverTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as telemetry:
+            pass
+        self.path = telemetry.name
+
+    def tearDown(self):
+        super().tearDown()
+        os.remove(self.path)
+
+    def read(self):
+        with open(self.path, newline="") as infile:
+            return list(csv.DictReader(infile))
+
+    def test_sdn(self):
+        self.server.RequestHandlerClass = RejectingHandler
+        replayer = SfbReplayer.fromstring(SDN_XML, validate=False, speed=100,
+                                          telemetry=self.path,
+                                          sdn_config={'receiver': self.url})
+        replayer.run()
+        rows = self.read()
+        self.assertEqual(10, len(rows))
+        self.assertEqual({'400'}, set(row['status'] for row in rows))
+        self.assertEqual(10, replayer.telemetry.summary()['sdn']['errors'])
+        self.assertEqual(sorted(int(row['scheduled_ns']) for row in rows),
+                         [int(row['scheduled_ns']) for row in rows])
+
+    def test_async(self):
+        replayer = SfbReplayer.fromstring(SDN_XML, validate=False, max_rate=True,
+                                          telemetry=self.path,
+                                          sdn_config={'receiver': self.url})
+        replayer.run_async()
+        rows = self.read()
+        self.assertEqual(10, len(rows))
+        self.assertEqual({'200'}, set(row['status'] for row in rows))
+        self.assertTrue(all(int(row['latency_ns']) > 0 for row in rows))
+
+    def test_sql(self):
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as database:
+            pass
+        try:
+            scenario = SQL_XML.format(''.join(INSERT.format(i) for i in range(4)))
+            replayer = SfbReplayer.fromstring(scenario, validate=False, telemetry=self.path,
+                                              odbc_config={'backend': 'sqlite3',
+                                                           'database': database.name,
+                                                           'batch_size': 2})
+            replayer.run()
+            with sqlite3.connect(database.name) as connection:
+                self.assertEqual(4, connection.execute("select count(*) from tbl").fetchone()[0])
+        finally:
+            os.remove(database.name)
+        statuses = [int(row['status']) for row in self.read()]
+        self.assertEqual([1, 2, 1], statuses,
+                         "Should record the rows committed by each batch, including on close.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import logging
+import unittest
+import datetime as DT
+from sfbtools.replayer.timeline import ReplayTimeline
+from sfbtools.replayer.timeline import StreamingTimeline
+from sfbtools.replayer.timeline import datetime_to_ns
+from sfbtools.replayer.timeline import ns_to_datetime
+from sfbtools.replayer.timeline import NS_PER_SECOND
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# Message timestamps 0s, 1.5s, 4s and 100s after the first message
+TIMESTAMPS = [0, int(1.5 * NS_PER_SECOND), 4 * NS_PER_SECOND, 100 * NS_PER_SECOND]
+
+
+class TestConversion(unittest.TestCase):
+
+    def test_round_trip(self):
+        dt_in = DT.datetime(2015, 8, 4, 9, 11, 10, 822625, DT.timezone.utc)
+        output = ns_to_datetime(datetime_to_ns(dt_in))
+        self.assertEqual(dt_in, output, "Should preserve microseconds.")
+
+    def test_tz_offset(self):
+        dt_offset = DT.timezone(-DT.timedelta(hours=4))
+        dt_in = DT.datetime(2015, 8, 4, 9, 11, 10, 0, dt_offset)
+        expected = DT.datetime(2015, 8, 4, 13, 11, 10, 0, DT.timezone.utc)
+        output = ns_to_datetime(datetime_to_ns(dt_in))
+        self.assertEqual(expected, output, "Should convert to UTC.")
+
+    def test_no_tz(self):
+        with self.assertRaises(ValueError, msg="Should raise ValueError for naive datetimes."):
+            datetime_to_ns(DT.datetime(2015, 8, 4))
+
+
+class TestDelays(unittest.TestCase):
+
+    def setUp(self):
+        self.timeline = ReplayTimeline(TIMESTAMPS)
+
+    def test_intervals(self):
+        expected = [0, int(1.5 * NS_PER_SECOND), int(2.5 * NS_PER_SECOND), 96 * NS_PER_SECOND]
+        self.assertEqual(expected, list(self.timeline.intervals()))
+
+    def test_realtime_max_delay(self):
+        expected = [0, int(1.5 * NS_PER_SECOND), int(2.5 * NS_PER_SECOND), 10 * NS_PER_SECOND]
+        output = self.timeline.delays(max_delay=10, realtime=True)
+        self.assertEqual(expected, list(output), "Should clamp delays to max_delay.")
+
+    def test_fixed_delay(self):
+        expected = [2 * NS_PER_SECOND] * 4
+        output = self.timeline.delays(max_delay=2, realtime=False)
+        self.assertEqual(expected, list(output), "Should always delay by max_delay.")
+
+    def test_speed(self):
+        expected = [0, int(0.15 * NS_PER_SECOND), int(0.25 * NS_PER_SECOND),
+                    int(9.6 * NS_PER_SECOND)]
+        output = self.timeline.delays(realtime=True, speed=10)
+        self.assertEqual(expected, list(output), "Should divide intervals by speed.")
+
+    def test_negative_interval(self):
+        timeline = ReplayTimeline([5 * NS_PER_SECOND, NS_PER_SECOND])
+        self.assertEqual([0, 0], list(timeline.delays(max_delay=10)),
+                         "Should not allow negative delays.")
+
+    def test_offsets(self):
+        expected = [0, int(1.5 * NS_PER_SECOND), 4 * NS_PER_SECOND, 14 * NS_PER_SECOND]
+        output = self.timeline.offsets(max_delay=10, realtime=True)
+        self.assertEqual(expected, list(output), "Should accumulate the delays.")
+
+    def test_empty(self):
+        timeline = ReplayTimeline([])
+        self.assertEqual([], list(timeline.delays(max_delay=10)))
+        timeline.rebase(0)
+        self.assertEqual([], list(timeline.rebased))
+
+
+class TestRebase(unittest.TestCase):
+
+    def test_not_rebased(self):
+        timeline = ReplayTimeline(TIMESTAMPS)
+        self.assertIsNone(timeline.get_rebased_timestamp(0))
+
+    def test_rebase(self):
+        start = datetime_to_ns(DT.datetime(2000, 1, 1, tzinfo=DT.timezone.utc))
+        timeline = ReplayTimeline(TIMESTAMPS)
+        timeline.rebase(start)
+        self.assertEqual(DT.datetime(2000, 1, 1, tzinfo=DT.timezone.utc),
+                         timeline.get_rebased_timestamp(0))
+        self.assertEqual(DT.datetime(2000, 1, 1, 0, 0, 1, 500000, DT.timezone.utc),
+                         timeline.get_rebased_timestamp(1))
+
+    def test_rebase_speed(self):
+        timeline = ReplayTimeline(TIMESTAMPS)
+        timeline.rebase(0, speed=2)
+        expected = [0, int(0.75 * NS_PER_SECOND), 2 * NS_PER_SECOND, 50 * NS_PER_SECOND]
+        self.assertEqual(expected, list(timeline.rebased), "Should compress the intervals.")
+
+
+class TestStreamingTimeline(unittest.TestCase):
+
+    def test_offsets(self):
+        for kwargs in ({'max_delay': 10, 'realtime': True},
+                       {'max_delay': 2, 'realtime': False},
+                       {'realtime': True, 'speed': 10}):
+            timeline = StreamingTimeline(**kwargs)
+            expected = list(ReplayTimeline(TIMESTAMPS).offsets(**kwargs))
+            self.assertEqual(expected, [timeline.advance(ts) for ts in TIMESTAMPS],
+                             "Should match ReplayTimeline offsets for {0}.".format(kwargs))
+        self.assertEqual(4, len(timeline))
+
+    def test_rebase(self):
+        timeline = StreamingTimeline()
+        timeline.rebase(0, speed=2)
+        self.assertIsNone(timeline.get_rebased_timestamp(0))
+        rebased = []
+        for ts in TIMESTAMPS:
+            timeline.advance(ts)
+            rebased.append(timeline.rebased)
+        expected = [0, int(0.75 * NS_PER_SECOND), 2 * NS_PER_SECOND, 50 * NS_PER_SECOND]
+        self.assertEqual(expected, rebased, "Should compress the intervals.")
+        self.assertEqual(ns_to_datetime(50 * NS_PER_SECOND), timeline.get_rebased_timestamp(3))
+        with self.assertRaises(IndexError, msg="Should only hold the current message."):
+            timeline.get_rebased_timestamp(0)
+        with self.assertRaises(ValueError, msg="Should not rebase once advanced."):
+            timeline.rebase(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import logging
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sfbtools.replayer.replayer import SfbReplayer
+from sfbtools.replayer.validation import ValidationCache
+from sfbtools.replayer.validation import get_schema
+from sfbtools.replayer.validation import get_schema_digest
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+XML_1 = """<?xml version="1.0"?>
+<SfbReplay xmlns="http://www.ir.com/SfbReplay">
+  <ReplayConfiguration>
+    <MaxDelay>10</MaxDelay>
+    <RealTime>true</RealTime>
+    <CurrentTime>false</CurrentTime>
+  </ReplayConfiguration>
+  <ReplayMessages>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:50.0000000Z</TimeStamp>
+      <Query>insert into tbl values (1);</Query>
+    </SqlQueryMessage>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:51.0000000Z</TimeStamp>
+      <Query>insert into tbl values (2);</Query>
+    </SqlQueryMessage>
+    <SqlQueryMessage>
+      <TimeStamp>2015-08-04T13:27:52.0000000Z</TimeStamp>
+      <{query}>insert into tbl values (3);</{query}>
+    </SqlQueryMessage>
+  </ReplayMessages>
+</SfbReplay>
+"""
+
+
+class TestSchemaCache(unittest.TestCase):
+
+    def test_compiled_once(self):
+        self.assertIs(get_schema('C'), get_schema('C'))
+        self.assertIsNot(get_schema('C'), get_schema('D'))
+
+    def test_digest(self):
+        self.assertEqual(64, len(get_schema_digest('C')))
+        self.assertNotEqual(get_schema_digest('C'), get_schema_digest('D'))
+
+
+class TestValidationCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".cache")
+        os.close(fd)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_persistent(self):
+        cache = ValidationCache(self.path)
+        SfbReplayer.fromstring(XML_1.format(query="Query"), validation_cache=cache)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(1, len(ValidationCache(self.path)), "Should persist entries.")
+
+        with mock.patch('sfbtools.replayer.replayer.get_schema',
+                        side_effect=get_schema) as schema:
+            SfbReplayer.fromstring(XML_1.format(query="Query"), validation_cache=self.path)
+            self.assertFalse(schema.called, "Should not validate cached scenarios.")
+            SfbReplayer.fromstring(XML_1.format(query="Query").replace("(1)", "(4)"),
+                                   validation_cache=self.path)
+            self.assertTrue(schema.called, "Should validate changed scenarios.")
+
+    def test_invalid_not_cached(self):
+        cache = ValidationCache(self.path)
+        with self.assertRaises(ValueError):
+            SfbReplayer.fromstring(XML_1.format(query="Statement"), validation_cache=cache)
+        self.assertEqual(0, len(cache))
+
+    def test_stream(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".xml", delete=False) as scenario:
+            scenario.write(XML_1.format(query="Query"))
+        try:
+            cache = ValidationCache(self.path)
+            replayer = SfbReplayer.fromfile(scenario.name, lazy=True, validation_cache=cache)
+            self.assertEqual(0, len(cache), "Should not cache before the stream is read.")
+            list(replayer.schedule())
+            self.assertEqual(1, len(cache), "Should cache once the stream is validated.")
+        finally:
+            os.remove(scenario.name)
+
+
+class TestIncrementalValidation(unittest.TestCase):
+
+    def create_replayer(self, query):
+        replayer = SfbReplayer.fromstring(XML_1.format(query=query),
+                                          incremental_validation=True)
+        replayer.validator.chunk_size = 2
+        return replayer
+
+    def test_valid(self):
+        replayer = self.create_replayer("Query")
+        on_valid = replayer.validator.on_valid = mock.Mock()
+        self.assertEqual([0, 1, 2], [index for index, _, _ in replayer.schedule()])
+        self.assertEqual(3, replayer.validator.validated)
+        on_valid.assert_called_once_with()
+
+    def test_invalid_message(self):
+        replayer = self.create_replayer("Statement")
+        schedule = replayer.schedule()
+        self.assertEqual([0, 1], [next(schedule)[0], next(schedule)[0]],
+                         "Should schedule the messages before the invalid message.")
+        with self.assertRaises(ValueError):
+            next(schedule)
+
+    def test_current_time_clones(self):
+        scenario = XML_1.format(query="Query").replace("<CurrentTime>false",
+                                                       "<CurrentTime>true")
+        replayer = SfbReplayer.fromstring(scenario, incremental_validation=True, clones=3,
+                                          speed=1000, odbc_config={'mocker': 'null'})
+        replayer.validator.chunk_size = 4
+        stamped = []
+        for index, msg, _ in replayer.schedule():
+            replayer.write_timestamp(index, msg)
+            stamped.append(msg.get_timestamp())
+        self.assertEqual(9, len(stamped), "Should stamp messages the validator read ahead.")
+        self.assertGreater(stamped[0].year, 2015)
+        self.assertEqual(sorted(stamped), stamped)
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError, msg="Should validate the configuration up front."):
+            SfbReplayer.fromstring(XML_1.format(query="Query").replace("MaxDelay", "Delay"),
+                                   incremental_validation=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+from lxml import etree as ET
+import copy
+import hashlib
+import logging
+import os
+import threading
+
+SCHEMA_DIR = os.path.join(os.path.dirname(__file__), 'schemas')
+
+# SfbReplay schema of each schema version. Version C is used for SDN 2.1.1.
+SCHEMA_FILES = {'C': "SfbReplay.Schema.C.xsd",
+                'D': "SfbReplay.Schema.D.xsd"}
+
+_schemas = {}
+_schema_digests = {}
+_schemas_lock = threading.Lock()
+
+
+def get_schema_version(sdn_version):
+    """
+    Returns the schema version (C or D) used for the given SDN version.
+    No SDN version or SDN version 2.1.1 use schema C.
+    """
+    return 'D' if sdn_version == '2.2' else 'C'
+
+
+def get_schema(schema_version):
+    """
+    Returns the compiled XMLSchema for the given schema version.
+    Schemas are compiled once per process and shared.
+    """
+    with _schemas_lock:
+        schema = _schemas.get(schema_version)
+        if schema is None:
+            schema_path = os.path.join(SCHEMA_DIR, SCHEMA_FILES[schema_version])
+            schema = _schemas[schema_version] = ET.XMLSchema(ET.parse(schema_path))
+        return schema
+
+
+def get_schema_digest(schema_version):
+    """
+    Returns a sha256 hex digest of every schema file of the given schema version,
+    including the SDN schema it includes.
+    """
+    with _schemas_lock:
+        digest = _schema_digests.get(schema_version)
+        if digest is None:
+            sha = hashlib.sha256()
+            suffix = ".{0}.xsd".format(schema_version)
+            for name in sorted(os.listdir(SCHEMA_DIR)):
+                if name.endswith(suffix):
+                    sha.update(name.encode("utf-8"))
+                    with open(os.path.join(SCHEMA_DIR, name), mode="rb") as schema_file:
+                        sha.update(schema_file.read())
+            digest = _schema_digests[schema_version] = sha.hexdigest()
+        return digest
+
+
+def get_file_digest(path, chunk_size=1 << 20):
+    """
+    Returns the sha256 hex digest of the file at path, read in chunks.
+    """
+    sha = hashlib.sha256()
+    with open(path, mode="rb") as in_file:
+        for chunk in iter(lambda: in_file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ValidationCache():
+
+    """
+    Persistent record of scenarios which passed validation.
+
+    Each entry is a hash of the scenario and of the schema it was validated
+    against, so a scenario is validated again if either changes. Entries are
+    stored one per line in a text file.
+    """
+
+    def __init__(self, path):
+        """
+        path    -   Path of the cache file. Created when the first entry is added.
+        """
+        self.path = path
+        self._entries = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, mode="r") as cache_file:
+                self._entries.update(line.strip() for line in cache_file if line.strip())
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def get_key(scenario_digest, schema_version):
+        """
+        Returns the cache key of a scenario digest and schema version.
+        """
+        return hashlib.sha256("{0}:{1}".format(
+            scenario_digest, get_schema_digest(schema_version)).encode("utf-8")).hexdigest()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def add(self, key):
+        """
+        Records the key of a scenario which passed validation.
+        """
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries.add(key)
+            with open(self.path, mode="a") as cache_file:
+                cache_file.write(key + "\n")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "ValidationCache ::: path - {0} : entries - {1}".format(self.path, len(self))
+
+
+class IncrementalValidator():
+
+    """
+    Validates the replay messages of a loaded scenario just ahead of the send cursor,
+    instead of validating the whole document before the replay starts.
+
+    The scenario without its messages is validated when the validator is created.
+    Messages are then validated in chunks of chunk_size as the replay reaches them,
+    each chunk in a copy of the scenario holding only those messages. Messages
+    before an invalid message are still sent.
+
+    on_valid is called once every message has been validated. [Optional]
+    """
+
+    def __init__(self, schema, scenario, replay_messages_tag, chunk_size=64):
+        """
+        schema              -   XMLSchema to validate against.
+        scenario            -   ElementTree of the SfbReplay scenario.
+        replay_messages_tag -   Qualified tag of the ReplayMessages element.
+        chunk_size          -   Number of messages validated at a time.
+        Raises ValueError if the scenario without its messages is invalid.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        self.schema = schema
+        self.chunk_size = chunk_size
+        root = scenario.getroot()
+        # Copy of the scenario with an empty ReplayMessages element
+        self._template = root.makeelement(root.tag, root.attrib, nsmap=root.nsmap)
+        for child in root:
+            if child.tag == replay_messages_tag:
+                self._template.append(child.makeelement(child.tag, child.attrib))
+            elif isinstance(child.tag, str):
+                self._template.append(copy.deepcopy(child))
+        self._messages_index = [i for i, child in enumerate(self._template)
+                                if child.tag == replay_messages_tag]
+        self.validated = 0
+        self.on_valid = None
+        self._assert_valid([])
+
+    def _assert_valid(self, elements):
+        """
+        Validates the scenario holding copies of the given message elements.
+        Raises ValueError if it is invalid.
+        """
+        doc = copy.deepcopy(self._template)
+        if self._messages_index:
+            replay_messages = doc[self._messages_index[0]]
+            for elem in elements:
+                replay_messages.append(copy.deepcopy(elem))
+        try:
+            self.schema.assertValid(ET.ElementTree(doc))
+        except ET.DocumentInvalid as e:
+            logging.error("Document Invalid Error: " + str(e))
+            raise ValueError(
+                "Failed SfbReplayer Test Validation. Check the SDN Version or error log.")
+
+    def _validate_chunk(self, chunk):
+        """
+        Validates the chunk of messages. Returns the number of valid messages before
+        the first invalid one, and the ValueError raised for it, or None.
+        """
+        try:
+            self._assert_valid([msg.root for _, msg, _ in chunk])
+            return len(chunk), None
+        except ValueError as error:
+            # Find the first invalid message
+            for count, (_, msg, _) in enumerate(chunk):
+                try:
+                    self._assert_valid([msg.root])
+                except ValueError as msg_error:
+                    return count, msg_error
+            return len(chunk), error
+
+    def check(self, schedule):
+        """
+        Yields the items of a replay schedule of (index, message, offset) tuples,
+        validating the messages a chunk ahead of the items yielded.
+        Raises ValueError when an invalid message is reached.
+        """
+        schedule = iter(schedule)
+        while True:
+            chunk = []
+            for item in schedule:
+                chunk.append(item)
+                if len(chunk) == self.chunk_size:
+                    break
+            if not chunk:
+                if self.on_valid is not None:
+                    self.on_valid()
+                return
+            valid, error = self._validate_chunk(chunk)
+            self.validated += valid
+            yield from chunk[:valid]
+            if error is not None:
+                raise error
@@ -87,6 +87,12 @@ class XmlMessage(metaclass=abc.ABCMeta):
             logging.error("LookupError: " + str(e))
             raise ValueError("Encoding parameter must be either 'us-ascii' or 'unicode'.")
 
+    def tobytes(self):
+        """
+        Returns the us-ascii encoded bytes of the xml element, as sent by the mockers.
+        """
+        return self.tostring(encoding="us-ascii").encode("us-ascii")
+
     @classmethod
     def convert_timestamp(cls, timestamp_str):
         """
@@ -142,6 +148,9 @@ class XmlMessage(metaclass=abc.ABCMeta):
 
 class SdnMessage(XmlMessage):
 
+    # Replay lane (mocker) the message is sent by
+    lane = "sdn"
+
     @classmethod
     def get_root_tag(cls):
         return "LyncDiagnostics"
@@ -171,6 +180,19 @@ class SdnMessage(XmlMessage):
             return True
         return False
 
+    def get_ordering_key(self):
+        """
+        Returns the ConferenceId of the message, or the CallId if there is no
+        ConferenceId, so every call of a conference shares a key. Messages with the
+        same key must be sent in order, and are replayed by the same worker.
+        Returns None if neither exists.
+        """
+        for x_path in ("./ConnectionInfo/ConferenceId", "./ConnectionInfo/CallId"):
+            id_element = self.root.find(self.qualify_xpath(x_path))
+            if id_element is not None and id_element.text and id_element.text.strip():
+                return id_element.text.strip().lower()
+        return None
+
     def get_timestamp(self):
         timestamp_element = self.root.find(
             self.qualify_xpath("./ConnectionInfo/TimeStamp"))
@@ -198,6 +220,9 @@ class SdnMessage(XmlMessage):
 
 class SqlQueryMessage(XmlMessage):
 
+    # Replay lane (mocker) the message is sent by
+    lane = "sql"
+
     @classmethod
     def get_root_tag(cls):
         return "SqlQueryMessage"
@@ -231,11 +256,45 @@ class SqlQueryMessage(XmlMessage):
             return query_element.text
         return None
 
+    def get_parameters(self):
+        """
+        Returns the query parameters as a tuple of strings, or None if the
+        message has no Parameters element.
+        """
+        parameters_element = self.root.find(
+            self.qualify_xpath("./Parameters"))
+        if parameters_element is None:
+            return None
+        return tuple(param.text or '' for param in
+                     parameters_element.findall(self.qualify_xpath("./Parameter")))
+
     def __str__(self):
         desc_template = "<SqlQueryMessage object : Timestamp - {0} : Query {1}>"
         return desc_template.format(str(self.get_timestamp()), str(self.get_query()))
 
 
+class SerialisedMessage():
+
+    """
+    Replay message serialised once, for messages which are sent to several mockers.
+    Every other attribute is read from the wrapped message.
+    """
+
+    def __init__(self, msg):
+        self.msg = msg
+        self.lane = msg.lane
+        self._bytes = msg.tobytes()
+
+    def tobytes(self):
+        return self._bytes
+
+    def __getattr__(self, name):
+        return getattr(self.msg, name)
+
+    def __str__(self):
+        return str(self.msg)
+
+
 class XMLMessageFactory:
 
     def __init__(self, file_obj, xml_wrapper):
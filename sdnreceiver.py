@@ -0,0 +1,106 @@
+import logging
+import logging.config
+from . import logging_conf
+import argparse
+from .receiver.receiver import LATENCY_DISTRIBUTIONS
+from .receiver.receiver import LatencyModel
+from .receiver.receiver import SdnReceiver
+
+
+def main():
+    args = parse_sys_args()
+    receiver = SdnReceiver(host=args.host,
+                           port=args.port,
+                           latency=LatencyModel(mean=args.latency,
+                                                distribution=args.latency_distribution,
+                                                jitter=args.latency_jitter),
+                           error_rate=args.error_rate,
+                           unavailable_rate=args.unavailable_rate,
+                           reset_rate=args.reset_rate,
+                           validate=args.validate,
+                           default_version=args.version,
+                           seed=args.seed,
+                           record_path=args.record)
+    print("Receiving at " + receiver.url)
+    receiver.serve_forever()
+    print(receiver)
+
+
+def parse_sys_args():
+    arg_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                         description="""
+    Skype for Business SDN Receiver Emulator.
+
+    Local stand-in for a SDN receiver, to replay against for benchmarks and tests.
+    Accepts the application/xml POSTs of the Replay Tool on any path, e.g.
+
+        sdnreceiver.py --port 3000 --latency 0.005 --unavailable-rate 0.01
+        sfbreplay.py scenario.xml --sdn-config "{ 'receiver':
+                                      'http://127.0.0.1:3000/SdnApiReceiver/site' }"
+
+    Responses can be delayed, and a share of messages can be answered with 500 or
+    503, or have their connection reset. The empty POST the Replay Tool sends when
+    it connects is always accepted. A summary of the responses is printed when the
+    receiver is interrupted.
+
+    """)
+    arg_parser.add_argument("--host",
+                            default="127.0.0.1",
+                            help="""Address to listen on. Default is 127.0.0.1.""")
+    arg_parser.add_argument("--port",
+                            type=int,
+                            default=3000,
+                            help="""Port to listen on. Default is 3000.""")
+    arg_parser.add_argument("--latency",
+                            metavar="SECONDS",
+                            type=float,
+                            default=0,
+                            help="""Mean response latency in seconds. Default is 0.""")
+    arg_parser.add_argument("--latency-distribution",
+                            choices=LATENCY_DISTRIBUTIONS,
+                            default='fixed',
+                            help="""Distribution of the response latency. Default is fixed.""")
+    arg_parser.add_argument("--latency-jitter",
+                            metavar="SECONDS",
+                            type=float,
+                            default=0,
+                            help="""Spread of the uniform distribution, or standard deviation
+                            of the normal distribution, in seconds.""")
+    arg_parser.add_argument("--error-rate",
+                            metavar="RATE",
+                            type=float,
+                            default=0,
+                            help="""Share of messages answered with 500 (0 to 1).""")
+    arg_parser.add_argument("--unavailable-rate",
+                            metavar="RATE",
+                            type=float,
+                            default=0,
+                            help="""Share of messages answered with 503 (0 to 1).""")
+    arg_parser.add_argument("--reset-rate",
+                            metavar="RATE",
+                            type=float,
+                            default=0,
+                            help="""Share of messages whose connection is reset (0 to 1).""")
+    arg_parser.add_argument("--validate",
+                            action="store_true",
+                            help="""Validate messages against the SDN schema of their Version,
+                            and answer invalid messages with 400.""")
+    arg_parser.add_argument("--version",
+                            choices=['C', 'D', 'c', 'd'],
+                            help="""Schema version for messages without a Version attribute.""")
+    arg_parser.add_argument("--seed",
+                            type=int,
+                            help="""Seed of the latencies and injected faults.""")
+    arg_parser.add_argument("--record",
+                            metavar="PATH",
+                            type=str,
+                            help="""Path of a CSV file the arrival time (ns since the epoch),
+                            size, CallId and response of every message are written to.""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Load logging configurations
+    logging.config.dictConfig(logging_conf.LOGGING_CONFIG)
+    main()
@@ -0,0 +1,52 @@
+import logging
+import logging.config
+from . import logging_conf
+import argparse
+import sys
+from .validator.validator import validate_file
+
+
+def main():
+    args = parse_sys_args()
+    report = validate_file(args.infile,
+                           jobs=args.jobs,
+                           default_version=args.version)
+    print(report)
+    if report.failures:
+        sys.exit(1)
+
+
+def parse_sys_args():
+    arg_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                         description="""
+    Skype for Business SDN Validator Tool.
+
+    Validates every SDN message in a file, such as the output of the SDN Extractor Tool,
+    against the SDN schema of its Version attribute (C for SDN 2.1.1, D for SDN 2.2).
+    Messages are validated in parallel worker processes.
+
+    Reports the byte offset of every invalid message with its errors, and a summary
+    of the number of invalid messages with each error type.
+    Exits with status 1 if any message is invalid.
+
+    """)
+    arg_parser.add_argument("infile",
+                            type=str,
+                            help="Path to the input file containing SDN messages.")
+    arg_parser.add_argument("--jobs",
+                            metavar="N",
+                            type=int,
+                            help="""Number of worker processes.
+                            Default is the number of CPUs.""")
+    arg_parser.add_argument("--version",
+                            choices=['C', 'D', 'c', 'd'],
+                            help="""Schema version for messages without a Version attribute.
+                            Such messages are reported as invalid if not given.""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Load logging configurations
+    logging.config.dictConfig(logging_conf.LOGGING_CONFIG)
+    main()
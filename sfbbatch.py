@@ -0,0 +1,123 @@
+import logging
+import logging.config
+from . import logging_conf
+import argparse
+import sys
+from .sfbreplay import process_config_arg
+from .replayer.batch import BatchRunner
+from .replayer.batch import find_scenarios
+
+
+def main():
+    args = parse_sys_args()
+
+    options = {'sdn_config': None, 'odbc_config': None}
+    if args.sdn_config is not None:
+        options['sdn_config'] = process_config_arg(args.sdn_config)
+    if args.odbc_config is not None:
+        options['odbc_config'] = process_config_arg(args.odbc_config)
+    if args.speed is not None:
+        options['speed'] = args.speed
+    if args.max_rate is not None:
+        options['max_rate'] = args.max_rate
+    if args.validation_cache is not None:
+        options['validation_cache'] = args.validation_cache
+
+    paths = find_scenarios(args.scenarios)
+    if not paths:
+        print("No scenarios found.")
+        sys.exit(1)
+    runner = BatchRunner(jobs=args.jobs,
+                         engine=args.engine,
+                         serialise_targets=args.serialise_targets,
+                         log_dir=args.log_dir)
+    report = runner.run(paths, **options)
+    print(report)
+    if args.json is not None:
+        report.write_json(args.json)
+    if args.junit is not None:
+        report.write_junit(args.junit)
+    if not report.passed:
+        sys.exit(1)
+
+
+def parse_sys_args():
+    arg_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                         description="""
+    Skype for Business Replay Batch Runner.
+
+    Replays a batch of SfbReplay Scenarios, such as a regression suite, in a pool
+    of worker processes, and reports the duration, messages sent, undelivered
+    messages and send jitter of every scenario.
+
+    The SDN and ODBC configurations are given in the same format as for the
+    Replay Tool. A scenario may override them, or any other replay option, with
+    a JSON file beside it of the same name (e.g. call.json for call.xml).
+
+        e.g. {"sdn_config": {"receiver": "http://10.0.0.2:3000/SdnApiReceiver/site"}}
+
+    A scenario is failed if any of its mockers could not be opened or any of its
+    messages was not delivered, and is an error if it could not be replayed.
+    Exits with status 1 unless every scenario passed.
+
+    """)
+    arg_parser.add_argument("scenarios",
+                            nargs="+",
+                            help="""Directories of scenario .xml files, or glob patterns
+                            of scenario files (e.g. "regression/*.xml").""")
+    arg_parser.add_argument("--jobs",
+                            metavar="N",
+                            type=int,
+                            help="""Number of scenarios replayed at once.
+                            Default is the number of CPUs.""")
+    arg_parser.add_argument("--serialise-targets",
+                            action="store_true",
+                            help="""Never replay two scenarios which send to the same SDN
+                            receiver or database at the same time.""")
+    arg_parser.add_argument("--sdn-config",
+                            metavar="SDN_PARAMS",
+                            type=str,
+                            help="""SDN Configuration parameters in python dictionary format,
+                            or a list of dictionaries to mirror the replay.""")
+    arg_parser.add_argument("--odbc-config",
+                            metavar="ODBC_PARAMS",
+                            type=str,
+                            help="""ODBC Configuration parameters in python dictionary format,
+                            or a list of dictionaries to mirror the replay.""")
+    arg_parser.add_argument("--engine",
+                            choices=['sync', 'async'],
+                            default='sync',
+                            help="""Replay engine. Default is sync.""")
+    arg_parser.add_argument("--speed",
+                            metavar="FACTOR",
+                            type=float,
+                            help="""Replay speed multiplier for every scenario.""")
+    arg_parser.add_argument("--max-rate",
+                            action="store_true",
+                            default=None,
+                            help="""Send the messages of every scenario as fast as possible.""")
+    arg_parser.add_argument("--validation-cache",
+                            metavar="PATH",
+                            type=str,
+                            help="""Path of the validation cache file shared by the scenarios.""")
+    arg_parser.add_argument("--log-dir",
+                            metavar="DIR",
+                            type=str,
+                            help="""Directory the replay output of each scenario is written to.
+                            Output is discarded if not given.""")
+    arg_parser.add_argument("--json",
+                            metavar="PATH",
+                            type=str,
+                            help="""Path to write the JSON report to.""")
+    arg_parser.add_argument("--junit",
+                            metavar="PATH",
+                            type=str,
+                            help="""Path to write the JUnit XML report to.""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Load logging configurations
+    logging.config.dictConfig(logging_conf.LOGGING_CONFIG)
+    main()
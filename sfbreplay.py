@@ -1,4 +1,9 @@
 from .replayer.replayer import SfbReplayer
+from .replayer.distributed import LocalWorkers
+from .replayer.distributed import ReplayCoordinator
+from .replayer.distributed import get_token
+from .replayer.metrics import MetricsServer
+from .replayer.metrics import ReplayMetrics
 import argparse
 import logging
 import logging.config
@@ -12,15 +17,113 @@ def main():
     sdn_config = None
     odbc_config = None
     if args.sdn_config is not None:
-        sdn_config = process_dict_arg(args.sdn_config)
+        sdn_config = process_config_arg(args.sdn_config)
     if args.odbc_config is not None:
-        odbc_config = process_dict_arg(args.odbc_config)
+        odbc_config = process_config_arg(args.odbc_config)
+    sdn_config = get_mocker_config(sdn_config, args.sdn_mocker, args.record)
+    odbc_config = get_mocker_config(odbc_config, args.odbc_mocker, args.record)
+
+    if args.workers is not None or args.local_workers is not None:
+        run_distributed(args, sdn_config=sdn_config,
+                        odbc_config=odbc_config,
+                        speed=args.speed,
+                        max_rate=args.max_rate,
+                        load_shape=args.load_shape,
+                        load_burst=args.load_burst,
+                        load_interval=args.load_interval,
+                        incremental_validation=args.validation == 'incremental',
+                        clones=args.clones,
+                        arrival=args.arrival,
+                        arrival_interval=args.arrival_interval,
+                        seed=args.seed,
+                        loop=args.loop,
+                        duration=args.duration,
+                        stats_interval=args.stats_interval)
+        return
+
+    adaptive = None
+    if args.adaptive is not None:
+        adaptive = process_dict_arg(args.adaptive)
+
+    metrics = None
+    if args.metrics_port is not None and args.compile is None:
+        metrics = ReplayMetrics()
 
     replayer = SfbReplayer.fromfile(args.infile,
                                     sdn_config=sdn_config,
-                                    odbc_config=odbc_config)
+                                    odbc_config=odbc_config,
+                                    speed=args.speed,
+                                    max_rate=args.max_rate,
+                                    load_shape=args.load_shape,
+                                    load_burst=args.load_burst,
+                                    load_interval=args.load_interval,
+                                    adaptive=adaptive,
+                                    dead_letter=args.dead_letter,
+                                    telemetry=args.telemetry,
+                                    telemetry_format=args.telemetry_format,
+                                    metrics=metrics,
+                                    lazy=args.lazy and args.compile is None,
+                                    incremental_validation=(args.validation == 'incremental'
+                                                            and args.compile is None),
+                                    validation_cache=args.validation_cache,
+                                    clones=args.clones,
+                                    arrival=args.arrival,
+                                    arrival_interval=args.arrival_interval,
+                                    seed=args.seed,
+                                    loop=args.loop,
+                                    duration=args.duration,
+                                    stats_interval=args.stats_interval)
+    if args.compile is not None:
+        count = replayer.compile(args.compile)
+        print("Compiled {0} messages to replay plan {1}.".format(count, args.compile))
+        return
     print(replayer)
-    replayer.run()
+    server = None
+    if metrics is not None:
+        server = MetricsServer(metrics, host=args.metrics_host, port=args.metrics_port).start()
+        print("Serving metrics at " + server.url)
+    try:
+        if args.engine == 'async':
+            replayer.run_async()
+        else:
+            replayer.run()
+    finally:
+        if server is not None:
+            server.stop()
+
+
+def run_distributed(args, **options):
+    """
+    Replays the scenario across the worker processes given by --workers,
+    or started locally for --local-workers.
+    """
+    with open(args.infile, mode="rb") as infile:
+        scenario = infile.read()
+    if args.workers is not None:
+        addresses = [address.strip() for address in args.workers.split(',') if address.strip()]
+        coordinator = ReplayCoordinator(addresses, start_delay=args.start_delay,
+                                        engine=args.engine, token=get_token())
+        print(coordinator.run(scenario, **options))
+        return
+    with LocalWorkers(args.local_workers, token=get_token()) as workers:
+        coordinator = ReplayCoordinator(workers.addresses, start_delay=args.start_delay,
+                                        engine=args.engine, token=workers.token)
+        print(coordinator.run(scenario, **options))
+
+
+def get_mocker_config(config, mocker, record_path=None):
+    """
+    Returns the mocker configuration with the mocker selected on the command line.
+    Recording mockers write to record_path.
+    """
+    if mocker is None:
+        return config
+    if isinstance(config, list):
+        return [get_mocker_config(item, mocker, record_path) for item in config]
+    config = dict(config or {}, mocker=mocker)
+    if mocker == 'record':
+        config['path'] = record_path
+    return config
 
 
 def process_dict_arg(arg_str):
@@ -38,6 +141,24 @@ def process_dict_arg(arg_str):
         raise ValueError("Invalid configuration argument.")
 
 
+def process_config_arg(arg_str):
+    """
+    Converts a str representing a python dictionary, or a list of dictionaries, to
+    a dict or list of dicts.
+    Raises ValueError if conversion is not possible.
+    """
+    if arg_str.strip().startswith("["):
+        try:
+            list_arg = ast.literal_eval(arg_str.strip())
+            if not list_arg or not all(isinstance(item, dict) for item in list_arg):
+                raise TypeError
+            return list_arg
+        except (SyntaxError, TypeError, ValueError) as e:
+            logging.error(str(e))
+            raise ValueError("Invalid configuration argument.")
+    return process_dict_arg(arg_str)
+
+
 def parse_sys_args():
     arg_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
                                          description="""
@@ -67,6 +188,8 @@ def parse_sys_args():
             <MaxDelay>....</MaxDelay>
             <RealTime>....</RealTime>
             <CurrentTime>...</CurrentTime>
+            <Speed>...</Speed>
+            <MaxRate>...</MaxRate>
         </ReplayConfiguration>
 
         <ReplayMessages>
@@ -81,7 +204,12 @@ def parse_sys_args():
             <SqlQueryMessage>
                 <TimeStamp>...</TimeStamp>
                 <Query><![CDATA[...]]></Query>
+                <Parameters>
+                    <Parameter>...</Parameter>
+                    ...
+                </Parameters>
             </SqlQueryMessage>
+            <ReplayBarrier/>
             ...
         </ReplayMessages>
 
@@ -117,11 +245,137 @@ def parse_sys_args():
                             true or false.
                             (e.g. true)
 
+    Speed               -   Time compression factor. Intervals between messages are
+                            divided by Speed, and updated timestamps are compressed to
+                            match. The Max Delay time is still respected. [Optional]
+                            Overridden by --speed.
+                            (e.g. 10)
+
+    MaxRate             -   If MaxRate is true, messages are sent back to back as fast as
+                            the receiver accepts them, keeping their order. If CurrentTime
+                            is also true, each message is stamped with its actual send time.
+                            [Optional] Overridden by --max-rate.
+                            true or false.
+                            (e.g. false)
+
+    LoadShape           -   Paces the replay by a target send rate over time, instead of
+                            the timing of the scenario. Contains a sequence of stages :
+                            <Ramp Duration="600" From="10" To="2000"/>
+                                rises linearly from From to To messages per second.
+                            <Plateau Duration="300" Rate="2000"/>
+                                holds Rate messages per second.
+                            <Step Duration="300" From="2000" To="4000" Steps="3"/>
+                                holds Steps equal levels from From to To.
+                            <Spike Duration="60" Rate="2000" Peak="8000" Width="5"/>
+                                holds Peak for the first Width seconds, then Rate.
+                            Durations are in seconds. Messages are sent in order, paced
+                            by a token bucket holding up to Burst messages (default 1),
+                            until the last stage ends or the messages run out. The
+                            achieved rate of every mocker is reported against the target
+                            for every Interval seconds (default 10). If CurrentTime is
+                            true, messages are stamped with their actual send time.
+                            [Optional] Overridden by --load-shape.
+
     ReplayMessages      -   Contains the Messages to replay in chronological order.
                             Messages are either SdnMessages which have 'LyncDiagnostic'
                             as the root, or SqlQueryMessages. All Messages are checked against
                             their relevant schema for validity before execution.
 
+    Parameters          -   Optional parameters for a parameterised SqlQueryMessage Query
+                            (e.g. insert into tbl values (?, ?)). Consecutive messages
+                            with the same Query are executed together with executemany.
+
+    ReplayBarrier       -   Ordering barrier for the async engine. Every message before
+                            the barrier, SDN or SQL, is sent before any message after it.
+                            The sync engine, which is always strictly ordered, commits
+                            the open ODBC batches at each barrier. [Optional]
+
+    ----------------------------Replay Plans ----------------------------------
+
+    Scenarios which are replayed often can be compiled once to a binary replay plan,
+    which holds every message pre-serialised with its timing and configuration.
+    A plan is given as the infile in place of the scenario. The SDN version used to
+    validate the scenario is the one given when it is compiled.
+
+        e.g. sfbreplay.py scenario.xml --compile scenario.plan
+             sfbreplay.py scenario.plan --sdn-config "{ ... }"
+
+
+    ----------------------------Null and Recording Mockers --------------------
+
+    The messages of either lane can be sent to a null mocker, which discards them,
+    or a recording mocker, which appends them with their scheduled send times to
+    the --record file, instead of the receiver or database. Null mockers measure
+    the throughput of the replay tool alone. A recording is given as the infile
+    to replay it, e.g. to a real receiver.
+
+        e.g. sfbreplay.py scenario.xml --sdn-mocker null --odbc-mocker null --max-rate
+             sfbreplay.py scenario.xml --sdn-mocker record --record capture.rec
+             sfbreplay.py capture.rec --sdn-config "{ ... }"
+
+
+    ----------------------------Mirrored Replay -------------------------------
+
+    The SDN and ODBC configurations may each be a list of configurations, to send
+    every message to several receivers or databases at once, e.g. to compare two
+    receiver versions with the same traffic. Each message is serialised once. With
+    the async engine every target has its own lane, so a slow target does not
+    delay the others. Targets are named after the lane, 'sdn-1', 'sdn-2', etc.,
+    or by the name key of their configuration, and the telemetry, metrics and
+    retry reports are given per target.
+
+        e.g. --sdn-config "[{ 'receiver': 'https://old:3000/SdnApiReceiver/site',
+                              'name': 'old' },
+                            { 'receiver': 'https://new:3000/SdnApiReceiver/site',
+                              'name': 'new' }]"
+
+
+    ----------------------------Adaptive Rate ---------------------------------
+
+    The --adaptive option finds the highest rate the SDN receiver sustains. The
+    messages are sent at a rate which is raised by 'increase' msg/s after every
+    'interval' seconds in which the replay kept up, the SDN sends had no errors and
+    their 'pct' percentile latency stayed below 'target_latency' seconds. After an
+    interval with errors or higher latency the rate is multiplied by 'decrease'.
+    The sustained maximum rate, the highest rate achieved in an interval which met
+    the target, is printed with a table of the intervals after the replay. SQL
+    messages are paced with the SDN messages. Combine with --loop and --duration
+    to replay for long enough to find the rate.
+
+    The adaptive configuration must be in python dictionary format :
+        target_latency - Response latency target in seconds.
+        rate        -   Initial rate in msg/s. Optional. Default is 10.
+        increase    -   Rate added after a good interval in msg/s. Optional. Default 10.
+        decrease    -   Factor the rate is multiplied by after a bad interval.
+                        Optional. Default is 0.5.
+        min_rate    -   Lowest rate in msg/s. Optional. Default is 1.
+        max_rate    -   Highest rate in msg/s. Optional. Default is no limit.
+        interval    -   Seconds between rate adjustments. Optional. Default is 5.
+        pct         -   Latency percentile compared with the target. Default is 95.
+        burst       -   Messages sent straight away to catch up when the replay falls
+                        behind. Optional. Default is 1.
+
+        e.g. sfbreplay.py scenario.xml --loop --duration 600 --engine async
+                 --adaptive "{ 'target_latency': 0.2, 'rate': 50, 'increase': 25 }"
+
+
+    ----------------------------Distributed Replay ----------------------------
+
+    A scenario can be replayed across several worker processes, on this machine
+    with --local-workers or on other hosts with --workers. Workers are started on
+    each host with sfbworker.py. Messages are partitioned between the workers by
+    ConferenceId, or CallId, and load generation clones by clone. Every worker
+    starts at the same wall clock time, so host clocks should be synchronised.
+    The --compile, --lazy, --dead-letter, --telemetry, --metrics-port, --adaptive
+    and --validation-cache options, recording mockers, database backends other
+    than pyodbc and ODBC drivers given as a library path are not supported with
+    workers. Workers on other hosts only serve coordinators sending the secret
+    token set in the SFB_WORKER_TOKEN environment variable of both.
+
+        e.g. SFB_WORKER_TOKEN=secret sfbworker.py 0.0.0.0:7100             (on each host)
+             SFB_WORKER_TOKEN=secret sfbreplay.py scenario.xml --workers "host1:7100,host2:7100" ...
+
+
     ----------------------------SDN Configuration -----------------------------
 
     The SDN configuration must be in python dictionary format.
@@ -130,9 +384,23 @@ def parse_sys_args():
         receiver    -   Target URL for the http/https listener
         version     -   The SDN API version of the mock messages.
                         Optional. Default version is 2.1.1
+        max_in_flight - Number of SDN messages sent concurrently by the async engine.
+                        Messages of the same call or conference are always sent in
+                        order. Optional. Default is 1.
+        pool_size   -   Number of persistent keep-alive connections to the receiver.
+                        Optional. Default is max_in_flight.
+        timeout     -   Socket timeout in seconds. Optional.
+        compression -   Content-Encoding of the request bodies, 'gzip' or 'deflate'.
+                        Optional. Default is no compression.
+        compression_threshold - Bodies smaller than this number of bytes are sent
+                        uncompressed. Optional. Default is 1024.
+        compression_level - Compression level from 1 (fastest) to 9 (smallest).
+                        Optional. Default is 6.
 
         e.g. --sdn-config "{ 'receiver': 'https://127.0.0.1:3000/SdnApiReceiver/site',
-                             'version' : '2.2' }"
+                             'version' : '2.2',
+                             'pool_size': 4,
+                             'compression': 'gzip' }"
 
     ----------------------------ODBC Configuration ----------------------------
 
@@ -140,39 +408,325 @@ def parse_sys_args():
     NB: Backslashes must be triple escaped (e.g. \\\\\\\\ for \\)
 
     The following ODBC parameters are supported :
+        backend     -   Database module used for the connection. [Optional]
+                        'pyodbc' connects through an ODBC driver. Default.
+                        'sqlite3' connects to the sqlite database file given as
+                        database, or to an in-memory database.
+                        Any other DB-API 2.0 module name, e.g. 'pymssql', connects
+                        with module.connect(dsn, **connect_args).
+        dsn         -   Connection string for other DB-API modules. [Optional]
+        connect_args -  Dictionary of keyword arguments for other DB-API modules.
+                        [Optional]
         driver      -   Odbc Driver used for the connection.
         server      -   Location of database server.
         database    -   Database name. [Optional]
         uid         -   user id. [Optional]
         pwd         -   user password. [Optional]
+        batch_size  -   Number of SQL messages committed in one transaction.
+                        Default is 1, which commits every message. [Optional]
+        batch_window -  Consecutive SQL messages whose timestamps are within this
+                        many seconds of the first message of a batch share its
+                        transaction. Without a window, a batch is committed whenever
+                        the replay waits between messages. [Optional]
+        batch_interval - Maximum age of a batch in seconds before it is committed.
+                        [Optional]
+        fast_executemany - Enables pyodbc fast_executemany for consecutive SQL messages
+                        with the same Query and Parameters. [Optional]
 
         e.g. --odbc-config "{ 'driver': 'SQL SERVER',
                               'server': '10.102.70.4\\\\\\\\SqlServer',
                               'database': 'LcsCDR',
                               'uid': 'sa',
-                              'pwd': 'C1sc0c1sc0' }" """)
+                              'pwd': 'C1sc0c1sc0' }"
+
+             --odbc-config "{ 'backend': 'sqlite3',
+                              'database': 'LcsCDR.db',
+                              'batch_size': 100 }"
+
+
+    ----------------------------Retry Configuration ---------------------------
+
+    Both the SDN and ODBC configurations support the following parameters :
+        retries     -   Number of retries of a failed send, with exponential backoff
+                        and jitter. Optional. Default is 0.
+        backoff     -   Delay before the first retry in seconds. Optional. Default 0.5.
+        max_backoff -   Maximum delay between retries in seconds. Optional. Default 30.
+        breaker_threshold - Consecutive failures after which sending is paused.
+                        Optional. Default is no circuit breaker.
+        breaker_reset - Seconds sending is paused for before a trial send.
+                        Optional. Default 30.
+
+        e.g. --sdn-config "{ 'receiver': 'https://127.0.0.1:3000/SdnApiReceiver/site',
+                             'retries': 3,
+                             'breaker_threshold': 5 }" """)
 
     arg_parser.add_argument("infile",
                             type=str,
                             help="""
-                            Path to the SfbReplay Scenario XML file.
+                            Path to the SfbReplay Scenario XML file, or to a replay plan
+                            compiled with --compile.
                             See the detailed description above for formatting.""")
 
+    arg_parser.add_argument("--compile",
+                            metavar="PLAN",
+                            type=str,
+                            help="""
+                            Validates the scenario and writes it to a compiled replay plan
+                            at PLAN, instead of replaying it. Replaying the plan skips XML
+                            parsing, validation and serialisation.""")
+
     arg_parser.add_argument("--sdn-config",
                             metavar="SDN_PARAMS",
                             type=str,
                             help="""
-                            SDN Configuration parameters in python dictionary format.
+                            SDN Configuration parameters in python dictionary format, or a list of
+                            dictionaries to mirror the replay.
                             See the detailed description above.""")
 
     arg_parser.add_argument("--odbc-config",
                             metavar="ODBC_PARAMS",
                             type=str,
                             help="""
-                            ODBC Configuration parameters in python dictionary format.
+                            ODBC Configuration parameters in python dictionary format, or a list of
+                            dictionaries to mirror the replay.
                             See the detailed description above.""")
 
-    return arg_parser.parse_args()
+    arg_parser.add_argument("--sdn-mocker",
+                            choices=['http', 'null', 'record'],
+                            help="""
+                            Mocker of the SDN messages. 'http' posts them to the receiver
+                            of the SDN configuration, 'null' discards them and 'record'
+                            writes them to the --record file. Default is http.""")
+
+    arg_parser.add_argument("--odbc-mocker",
+                            choices=['odbc', 'null', 'record'],
+                            help="""
+                            Mocker of the SQL messages. 'odbc' executes them on the
+                            database of the ODBC configuration, 'null' discards them and
+                            'record' writes them to the --record file. Default is odbc.""")
+
+    arg_parser.add_argument("--record",
+                            metavar="PATH",
+                            type=str,
+                            help="""
+                            Path of the recording written by the recording mockers.""")
+
+    arg_parser.add_argument("--dead-letter",
+                            metavar="PATH",
+                            type=str,
+                            help="""
+                            Path of a SfbReplay Scenario file that messages which could not
+                            be delivered are written to, with their scheduled timestamps.
+                            The file can be replayed later.""")
+
+    arg_parser.add_argument("--telemetry",
+                            metavar="PATH",
+                            type=str,
+                            help="""
+                            Path of a log with one record per send, or per committed
+                            batch of SQL messages: the scheduled and actual send time,
+                            lane, response status (rows for SQL messages), latency and
+                            payload size. A per-lane throughput
+                            and latency summary is printed after the replay.""")
+
+    arg_parser.add_argument("--telemetry-format",
+                            choices=['csv', 'jsonl', 'binary'],
+                            default='csv',
+                            help="""
+                            Format of the telemetry log. 'binary' writes compact fixed
+                            size records for long runs. Default is csv.""")
+
+    arg_parser.add_argument("--lazy",
+                            action="store_true",
+                            help="""
+                            Stream the messages from the scenario file as the replay
+                            advances, instead of loading the whole scenario first.
+                            Memory use does not grow with the scenario length. The scenario
+                            is validated as it is read, so an invalid message stops the
+                            replay when it is reached.""")
+
+    arg_parser.add_argument("--validation",
+                            choices=['full', 'incremental'],
+                            default='full',
+                            help="""
+                            'full' validates the whole scenario before the replay starts.
+                            'incremental' validates the messages in chunks as the replay
+                            reaches them, so the replay starts straight away and stops at
+                            the first invalid message. Default is full.""")
+
+    arg_parser.add_argument("--validation-cache",
+                            metavar="PATH",
+                            type=str,
+                            help="""
+                            Path of a file recording the scenarios which passed validation.
+                            Scenarios which are unchanged since they passed, with the same
+                            schema, are not validated again.""")
+
+    arg_parser.add_argument("--clones",
+                            metavar="N",
+                            type=int,
+                            help="""
+                            Load generation. Replays N clones of the scenario, each with
+                            its own seeded CallId, ConferenceId, ConversationId and dialog
+                            ids, starting at staggered arrival times.""")
+
+    arg_parser.add_argument("--arrival",
+                            choices=['fixed', 'uniform', 'poisson'],
+                            default='fixed',
+                            help="""
+                            Distribution of the time between clone arrivals. 'fixed' spaces
+                            clones exactly, 'uniform' draws gaps between 0 and twice the
+                            interval, 'poisson' draws exponential gaps. Default is fixed.""")
+
+    arg_parser.add_argument("--arrival-interval",
+                            metavar="SECONDS",
+                            type=float,
+                            default=1,
+                            help="""
+                            Mean time between clone arrivals in seconds. Default is 1.""")
+
+    arg_parser.add_argument("--seed",
+                            type=int,
+                            default=0,
+                            help="""
+                            Seed of the clone ids and arrival times. Default is 0.""")
+
+    arg_parser.add_argument("--loop",
+                            action="store_true",
+                            help="""
+                            Soak mode. Replays the scenario in a loop until interrupted.
+                            Every iteration is stamped with the current time and has its
+                            call, conference and dialog ids rewritten, so the receiver
+                            sees new calls. Memory use does not grow between iterations.""")
+
+    arg_parser.add_argument("--duration",
+                            metavar="SECONDS",
+                            type=float,
+                            help="""
+                            Soak mode. Replays the scenario in a loop for the given
+                            number of seconds.""")
+
+    arg_parser.add_argument("--stats-interval",
+                            metavar="SECONDS",
+                            type=float,
+                            default=60,
+                            help="""
+                            Seconds between the rolling throughput and error statistics
+                            printed in soak mode. Default is 60.""")
+
+    arg_parser.add_argument("--workers",
+                            metavar="ADDRESSES",
+                            type=str,
+                            help="""
+                            Comma separated addresses of sfbworker.py processes to replay
+                            the scenario across, as host:port or unix:path.""")
+
+    arg_parser.add_argument("--local-workers",
+                            metavar="N",
+                            type=int,
+                            help="""
+                            Replays the scenario across N worker processes started on
+                            this machine.""")
+
+    arg_parser.add_argument("--start-delay",
+                            metavar="SECONDS",
+                            type=float,
+                            default=1,
+                            help="""
+                            Seconds between every worker being ready and the shared
+                            start of a distributed replay. Default is 1.""")
+
+    arg_parser.add_argument("--metrics-port",
+                            metavar="PORT",
+                            type=int,
+                            help="""
+                            Serves live Prometheus/OpenMetrics metrics of the replay on
+                            http://HOST:PORT/metrics while it runs: messages sent, errors,
+                            retries and in-flight sends per lane, queue depth (async
+                            engine), and send latency and schedule lateness histograms.""")
+
+    arg_parser.add_argument("--metrics-host",
+                            metavar="HOST",
+                            default="0.0.0.0",
+                            help="""
+                            Address the metrics endpoint listens on. Default is 0.0.0.0.""")
+
+    arg_parser.add_argument("--engine",
+                            choices=['sync', 'async'],
+                            default='sync',
+                            help="""
+                            Replay engine. 'sync' sends every message in a single loop.
+                            'async' sends SDN and SQL messages in independent lanes, so a
+                            slow backend does not delay the other. Default is sync.""")
+
+    arg_parser.add_argument("--speed",
+                            metavar="FACTOR",
+                            type=float,
+                            help="""
+                            Replay speed multiplier (e.g. 10 or 100). Overrides the
+                            Speed element of the scenario.""")
+
+    arg_parser.add_argument("--load-shape",
+                            metavar="STAGES",
+                            type=str,
+                            help="""
+                            Comma separated load shape stages, each the stage name and its
+                            parameters separated by colons: ramp:DURATION:FROM:TO,
+                            plateau:DURATION:RATE, step:DURATION:FROM:TO[:STEPS] and
+                            spike:DURATION:RATE:PEAK:WIDTH, e.g.
+                            "ramp:600:10:2000,plateau:300:2000". Overrides the LoadShape
+                            element of the scenario, see the detailed description above.
+                            With workers, each worker sends its share of the rate.""")
+
+    arg_parser.add_argument("--load-burst",
+                            metavar="N",
+                            type=int,
+                            help="""
+                            Number of messages the load shape sends straight away to catch
+                            up when the replay falls behind. Default is 1.""")
+
+    arg_parser.add_argument("--load-interval",
+                            metavar="SECONDS",
+                            type=float,
+                            help="""
+                            Seconds covered by each line of the achieved against target
+                            rate report of a load shape. Default is 10.""")
+
+    arg_parser.add_argument("--adaptive",
+                            metavar="ADAPTIVE_PARAMS",
+                            type=str,
+                            help="""
+                            Adaptive rate configuration in python dictionary format.
+                            Raises the send rate while the SDN response latency stays
+                            below a target, and backs off on errors or higher latency,
+                            to find the sustained maximum rate of the receiver.
+                            See the detailed description above.""")
+
+    arg_parser.add_argument("--max-rate",
+                            action="store_true",
+                            default=None,
+                            help="""
+                            Send messages as fast as the receiver accepts them.
+                            Overrides the MaxRate element of the scenario.""")
+
+    args = arg_parser.parse_args()
+    if 'record' in (args.sdn_mocker, args.odbc_mocker) and args.record is None:
+        arg_parser.error("--record is required by the recording mockers.")
+    if args.adaptive is not None and args.load_shape is not None:
+        arg_parser.error("--adaptive and --load-shape cannot be used together.")
+    if args.workers is not None or args.local_workers is not None:
+        unsupported = [flag for flag, value in (("--compile", args.compile),
+                                                ("--lazy", args.lazy or None),
+                                                ("--dead-letter", args.dead_letter),
+                                                ("--telemetry", args.telemetry),
+                                                ("--metrics-port", args.metrics_port),
+                                                ("--adaptive", args.adaptive),
+                                                ("--validation-cache", args.validation_cache),
+                                                ("--record", args.record))
+                       if value is not None]
+        if unsupported:
+            arg_parser.error("{0} cannot be used with workers.".format(", ".join(unsupported)))
+    return args
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+import logging
+import logging.config
+from . import logging_conf
+import argparse
+from .replayer.distributed import ReplayWorker
+from .replayer.distributed import get_token
+from .replayer.distributed import is_loopback
+
+
+def main():
+    args = parse_sys_args()
+    ReplayWorker(args.address, token=get_token()).serve_forever()
+
+
+def parse_sys_args():
+    arg_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                         description="""
+    Skype for Business Replay Worker.
+
+    Replays a partition of a SfbReplay Scenario for a distributed replay, started
+    with the --workers option of the Replay Tool. The worker listens for the
+    coordinator, which sends the scenario, the SDN and ODBC configurations and a
+    shared start time, and collects the send statistics of every worker.
+
+    The worker listens on localhost by default. To listen on another address a
+    secret token must be set in the SFB_WORKER_TOKEN environment variable, of the
+    worker and of the Replay Tool, and only coordinators sending the same token
+    are served. Options which write files or load modules on the worker, such as
+    recording mockers or ODBC drivers given as a library path, are rejected.
+
+        e.g. SFB_WORKER_TOKEN=secret sfbworker.py 0.0.0.0:7100
+
+    """)
+    arg_parser.add_argument("address",
+                            type=str,
+                            nargs="?",
+                            default="127.0.0.1:7100",
+                            help="""Address to listen on, as host:port for TCP
+                            (e.g. 0.0.0.0:7100) or unix:path for a Unix socket.
+                            Default is 127.0.0.1:7100.""")
+
+    args = arg_parser.parse_args()
+    try:
+        loopback = is_loopback(args.address)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    if not loopback and get_token() is None:
+        arg_parser.error("SFB_WORKER_TOKEN must be set to listen on " + args.address)
+    return args
+
+
+if __name__ == '__main__':
+    # Load logging configurations
+    logging.config.dictConfig(logging_conf.LOGGING_CONFIG)
+    main()
@@ -0,0 +1,111 @@
+import logging
+import os
+import tempfile
+import unittest
+from sfbtools.validator.validator import ValidationReport
+from sfbtools.validator.validator import validate_file
+from sfbtools.validator.validator import validate_message
+
+# Disable non-critical logging for Testing
+logging.disable(logging.CRITICAL)
+
+# Reusable XML input strings
+VALID_TEMPLATE = """
+<LyncDiagnostics{0}>
+  <ConnectionInfo>
+    <CallId>6113bbea56224f0db8453ec87260c84e</CallId>
+    <CSEQ>1</CSEQ>
+    <ConversationId>AdD/7RnmLr1beKeSRu2oUSUVdyoDJA==</ConversationId>
+    <TimeStamp>2015-10-06T15:11:58.0133084+11:00</TimeStamp>
+  </ConnectionInfo>
+  <Bye/>
+</LyncDiagnostics>
+"""
+INVALID = """
+<LyncDiagnostics Version="D">
+  <ConnectionInfo>
+    <CallId>6113bbea56224f0db8453ec87260c84e</CallId>
+    <Unknown/>
+  </ConnectionInfo>
+  <Bye/>
+</LyncDiagnostics>
+"""
+MALFORMED = """
+<LyncDiagnostics Version="C">
+  <ConnectionInfo>
+</LyncDiagnostics>
+"""
+
+
+class TestValidateMessage(unittest.TestCase):
+
+    def test_valid(self):
+        for version in ('C', 'D'):
+            msg = VALID_TEMPLATE.format(' Version="{0}"'.format(version)).strip().encode()
+            self.assertEqual((version, []), validate_message(msg))
+
+    def test_default_version(self):
+        msg = VALID_TEMPLATE.format('').strip().encode()
+        self.assertEqual(('C', []), validate_message(msg, default_version='C'))
+        version, errors = validate_message(msg)
+        self.assertEqual('UnknownVersion', errors[0][0],
+                         "Should fail messages without a version or default.")
+
+    def test_schema_error(self):
+        version, errors = validate_message(INVALID.strip().encode())
+        self.assertEqual('D', version)
+        self.assertEqual(['SCHEMAV_ELEMENT_CONTENT'], [error[0] for error in errors])
+        self.assertEqual(4, errors[0][1], "Should report the line of the error.")
+
+    def test_malformed(self):
+        version, errors = validate_message(MALFORMED.strip().encode())
+        self.assertEqual('XMLSyntaxError', errors[0][0])
+
+
+class TestValidateFile(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [VALID_TEMPLATE.format(' Version="C"'), INVALID,
+                         VALID_TEMPLATE.format(' Version="D"'), INVALID]
+        content = "log prefix\n"
+        self.offsets = []
+        for msg in self.messages:
+            self.offsets.append(len(content) + msg.index("<LyncDiagnostics"))
+            content += msg
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".out", delete=False) as infile:
+            infile.write(content)
+        self.path = infile.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def check_report(self, report):
+        self.assertEqual(4, report.total)
+        self.assertEqual(2, report.valid)
+        self.assertEqual([self.offsets[1], self.offsets[3]],
+                         [offset for offset, _, _ in report.failures],
+                         "Should report the byte offsets of invalid messages.")
+        self.assertEqual({'SCHEMAV_ELEMENT_CONTENT': 2}, dict(report.error_counts))
+        self.assertEqual({'C': 1, 'D': 3}, dict(report.versions))
+
+    def test_inline(self):
+        self.check_report(validate_file(self.path, jobs=1))
+
+    def test_process_pool(self):
+        self.check_report(validate_file(self.path, jobs=2, batch_size=1))
+
+    def test_empty(self):
+        with open(self.path, mode="w"):
+            pass
+        self.assertEqual(0, validate_file(self.path, jobs=1).total)
+
+    def test_report_str(self):
+        report = ValidationReport()
+        report.add(10, 'D', [('SCHEMAV_ELEMENT_CONTENT', 3, "Missing child.")])
+        output = str(report)
+        self.assertIn("Offset 10 : Version D : line 3", output)
+        self.assertIn("messages - 1 : valid - 0 : invalid - 1", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
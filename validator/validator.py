@@ -0,0 +1,179 @@
+from ..replayer.validation import SCHEMA_DIR
+from lxml import etree as ET
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from collections import deque
+import re
+import os
+import mmap
+import logging
+
+SDN_NAMESPACE = "http://www.ir.com/SfbReplay"
+
+# SDN schema of each LyncDiagnostics Version
+SDN_SCHEMA_FILES = {'C': "SDNInterface.Schema.C.xsd",
+                    'D': "SDNInterface.Schema.D.xsd"}
+
+SDN_MESSAGE_RX = re.compile(rb"<LyncDiagnostics.*?>.*?</LyncDiagnostics>",
+                            re.DOTALL | re.MULTILINE | re.IGNORECASE)
+START_TAG_RX = re.compile(rb"<LyncDiagnostics[^>]*>", re.IGNORECASE)
+VERSION_RX = re.compile(rb"""\sVersion\s*=\s*["']([^"']*)["']""")
+
+# Schemas compiled once by each worker process
+_schemas = {}
+
+
+def get_sdn_schema(version):
+    """
+    Returns the compiled SDN XMLSchema for a LyncDiagnostics Version (C or D).
+    Schemas are compiled once per process.
+    """
+    schema = _schemas.get(version)
+    if schema is None:
+        schema_path = os.path.join(SCHEMA_DIR, SDN_SCHEMA_FILES[version])
+        schema = _schemas[version] = ET.XMLSchema(ET.parse(schema_path))
+    return schema
+
+
+def init_worker():
+    """
+    Compiles every SDN schema when a worker process starts.
+    """
+    for version in SDN_SCHEMA_FILES:
+        get_sdn_schema(version)
+
+
+def validate_message(msg_bytes, default_version=None):
+    """
+    Validates a single LyncDiagnostics block against the schema of its Version
+    attribute, or default_version if it has none.
+
+    Returns a tuple (version, errors), where errors is a list of
+    (error type, line, message) tuples, empty if the message is valid.
+    """
+    start_tag = START_TAG_RX.match(msg_bytes)
+    version_match = VERSION_RX.search(start_tag.group(0)) if start_tag else None
+    version = version_match.group(1).decode("us-ascii", "replace").upper() \
+        if version_match else default_version
+    if version not in SDN_SCHEMA_FILES:
+        return version, [('UnknownVersion', 1,
+                          "No schema for LyncDiagnostics Version {0}.".format(version))]
+
+    # Extracted messages have no namespace, the schemas use the SfbReplay namespace
+    if start_tag is not None and b"xmlns=" not in start_tag.group(0):
+        msg_bytes = (b'<LyncDiagnostics xmlns="' + SDN_NAMESPACE.encode("us-ascii") + b'"'
+                     + msg_bytes[len(b"<LyncDiagnostics"):])
+    try:
+        root = ET.fromstring(msg_bytes)
+    except ET.XMLSyntaxError as e:
+        return version, [('XMLSyntaxError', e.lineno or 1, str(e))]
+
+    schema = get_sdn_schema(version)
+    if schema.validate(root):
+        return version, []
+    return version, [(error.type_name, error.line, error.message)
+                     for error in schema.error_log]
+
+
+def validate_batch(batch, default_version=None):
+    """
+    Validates a list of (byte offset, message bytes) tuples.
+    Returns a list of (byte offset, version, errors) tuples.
+    """
+    return [(offset,) + validate_message(msg_bytes, default_version)
+            for offset, msg_bytes in batch]
+
+
+def iter_batches(infile_path, batch_size):
+    """
+    Yields lists of up to batch_size (byte offset, message bytes) tuples of the
+    LyncDiagnostics blocks in the file, read through a memory map.
+    """
+    with open(infile_path, mode="rb") as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mmap_in:
+            batch = []
+            for match in SDN_MESSAGE_RX.finditer(mmap_in):
+                batch.append((match.start(), match.group(0)))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+
+class ValidationReport():
+
+    """
+    Results of validating the SDN messages of a file.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.versions = Counter()
+        # List of (byte offset, version, errors) of every invalid message
+        self.failures = []
+        # Number of invalid messages with each error type
+        self.error_counts = Counter()
+
+    def add(self, offset, version, errors):
+        self.total += 1
+        self.versions[version] += 1
+        if errors:
+            self.failures.append((offset, version, errors))
+            self.error_counts.update(set(error_type for error_type, _, _ in errors))
+
+    @property
+    def valid(self):
+        return self.total - len(self.failures)
+
+    def __str__(self):
+        lines = []
+        for offset, version, errors in self.failures:
+            for error_type, line, message in errors:
+                lines.append("Offset {0} : Version {1} : line {2} : {3} : {4}".format(
+                    offset, version, line, error_type, message))
+        lines.append("Validation Summary ::: messages - {0} : valid - {1} : invalid - {2}".format(
+            self.total, self.valid, len(self.failures)))
+        for version, count in sorted(self.versions.items(), key=lambda x: str(x[0])):
+            lines.append("    Version {0} : {1} messages".format(version, count))
+        for error_type, count in self.error_counts.most_common():
+            lines.append("    {0} : {1} messages".format(error_type, count))
+        return '\n'.join(lines)
+
+
+def validate_file(infile_path, jobs=None, default_version=None, batch_size=64):
+    """
+    Validates every LyncDiagnostics block of a file, such as the output of the SDN
+    extractor, against the schema of its Version. Returns a ValidationReport.
+
+    infile_path     -   Path to the input file.
+    jobs            -   Number of worker processes. Defaults to the number of CPUs.
+                        With 1 job the messages are validated in this process.
+    default_version -   Schema version (C or D) of messages without a Version attribute.
+    batch_size      -   Number of messages sent to a worker at a time.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if default_version is not None:
+        default_version = default_version.upper()
+    report = ValidationReport()
+    logging.info("Validating Sdn Messages in {0} with {1} jobs.".format(infile_path, jobs))
+    if jobs == 1:
+        for batch in iter_batches(infile_path, batch_size):
+            for result in validate_batch(batch, default_version):
+                report.add(*result)
+        return report
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as pool:
+        # Bound the batches in flight, so the file is read no faster than validated
+        pending = deque()
+        for batch in iter_batches(infile_path, batch_size):
+            pending.append(pool.submit(validate_batch, batch, default_version))
+            if len(pending) >= jobs * 2:
+                for result in pending.popleft().result():
+                    report.add(*result)
+        while pending:
+            for result in pending.popleft().result():
+                report.add(*result)
+    return report